@@ -1,6 +1,6 @@
 import os
 import yaml
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings
 
@@ -14,6 +14,12 @@ class AppSettings(BaseModel):
 class ServerSettings(BaseModel):
     host: str
     port: int
+    # default deadline of /cckg/build in seconds, None for no deadline
+    request_timeout: Optional[float] = None
+    # default deadline of the /selfqa/build bulk job, None for no deadline
+    selfqa_request_timeout: Optional[float] = None
+    # how often an abandoned (disconnected) request is looked for
+    disconnect_poll_interval: float = 1.0
 
 class LoggingSettings(BaseModel):
     level: str
@@ -25,6 +31,86 @@ class LoggingSettings(BaseModel):
     file_handler_maxBytes: int
     file_handler_backupCount: int
 
+class LLMCacheSettings(BaseModel):
+    enabled: bool = False
+    path: str = "cra/cache/llm_response_cache.sqlite"
+    ttl_seconds: float = 7 * 24 * 3600
+    max_size_mb: int = 512
+    # cache sampled (temperature > 0 and no seed) responses as well
+    cache_nondeterministic: bool = False
+
+class GenerationProfileSettings(BaseModel):
+    max_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+    top_p: Optional[float] = None
+    stop: Optional[List[str]] = None
+
+class LLMReplicaSettings(BaseModel):
+    # several OpenAI compatible replicas (lmdeploy / vLLM) serving model_name, overrides base_url
+    base_urls: List[str]
+    routing: str = "least_outstanding"  # least_outstanding / ewma
+    max_failures: int = 3
+    eject_seconds: float = 30.0
+    health_check_interval: float = 10.0
+
+class LLMConcurrencySettings(BaseModel):
+    enabled: bool = False
+    initial_limit: int = 16
+    min_limit: int = 1
+    max_limit: int = 256
+    decrease_factor: float = 0.5
+    latency_tolerance: float = 2.0
+    # latencies per class whose median is the latency baseline
+    latency_window: int = 256
+    # hand freed slots to queued requests sharing the prompt prefix of the last dispatched one
+    group_by_prefix: bool = False
+    prefix_max_wait: float = 0.5
+    # weighted fair queuing between lanes (interactive / build / bulk), unknown lanes weigh 1
+    lane_weights: Optional[Dict[str, float]] = None
+
+class LLMRecordSettings(BaseModel):
+    # record requests / responses / latency for the replay server (pycra.core.llm_server.replay)
+    enabled: bool = False
+    path: str = "cra/replay/llm_recording.jsonl"
+
+class LLMScoringSettings(BaseModel):
+    # batched logprob scoring: chat (one request per prompt) / completions (several raw prompts per request)
+    endpoint: str = "chat"
+    batch_size: int = 32
+    max_concurrency: int = 16
+
+class LLMHedgingSettings(BaseModel):
+    # send a duplicate of requests slower than the percentile latency of their profile
+    enabled: bool = False
+    percentile: float = 0.95
+    max_extra_load: float = 0.05  # at most 5% more requests
+    min_delay: float = 0.5
+    window: int = 200
+    min_samples: int = 20
+
+class LLMHttpSettings(BaseModel):
+    # one pooled HTTP transport shared by every LLM / embedding client of the process
+    enabled: bool = True
+    max_connections: int = 512
+    max_keepalive_connections: int = 128
+    keepalive_expiry: float = 30.0
+    http2: bool = False  # needs the h2 package
+    connect_timeout: float = 10.0
+    read_timeout: float = 600.0
+    write_timeout: float = 30.0
+    pool_timeout: float = 60.0
+
+class LLMBatchSettings(BaseModel):
+    # send every request of the process through a batch endpoint (nightly bulk jobs)
+    enabled: bool = False
+    executor: str = "openai"  # openai / local
+    work_dir: str = "cra/batch"
+    flush_interval: float = 2.0
+    max_batch_size: int = 50000
+    poll_interval: float = 30.0
+    completion_window: str = "24h"
+    local_concurrency: int = 16
+
 class LLMSettings(BaseModel):
     model_name: str
     temperature: float
@@ -32,6 +118,28 @@ class LLMSettings(BaseModel):
     base_url: Optional[str] = None
     # providers: Dict[str, LLMProviderSettings] = Field(default_factory=dict)
     providers: str
+    # tokenizer of the model: tiktoken encoding, HF repo id or local path, resolved from model_name if unset
+    tokenizer: Optional[str] = None
+    # token counts kept in the LRU token count cache, 0 disables it
+    token_count_cache_size: int = 65536
+    # per request token usage kept for the last N requests (contract builds / self qa jobs)
+    usage_max_requests: int = 1024
+    # client-side token-bucket rate limit
+    request_limit: bool = False
+    rpm: int = 1000
+    tpm: int = 20000
+    cache: Optional[LLMCacheSettings] = None
+    # identical deterministic requests in flight at the same time share one backend call
+    single_flight: bool = True
+    replicas: Optional[LLMReplicaSettings] = None
+    concurrency: Optional[LLMConcurrencySettings] = None
+    # overrides of the generation profiles (extraction / glean_continue / loop_probe / summary / qa_rephrase / cot)
+    profiles: Optional[Dict[str, GenerationProfileSettings]] = None
+    batch: Optional[LLMBatchSettings] = None
+    http: Optional[LLMHttpSettings] = None
+    hedging: Optional[LLMHedgingSettings] = None
+    scoring: Optional[LLMScoringSettings] = None
+    record: Optional[LLMRecordSettings] = None
 
 class KnowledgeGraphSettings(BaseModel):
     working_dir: str
@@ -41,6 +149,23 @@ class KnowledgeGraphSettings(BaseModel):
     chunk_size: int
     chunk_overlap: int
     sub_graph_method: str
+    # stream extraction answers and stop at the completion delimiter
+    stream_extraction: bool = False
+    # gleaning rounds: if_loop / continue_sentinel / speculative
+    glean_strategy: str = "if_loop"
+    # gleaning history: full / compact
+    glean_history: str = "full"
+    # merge the records of each chunk while the other chunks are extracted (streaming build)
+    pipeline_merge: bool = False
+    # summaries packed into one LLM call (1: one call per entity / relation), and their prompt token budget
+    summary_batch_size: int = 1
+    summary_batch_tokens: int = 3000
+    # estimated similarity from which two descriptions are collapsed before summarization (0: exact duplicates only)
+    near_dup_threshold: float = 0
+    # keep the graph of a contract across revisions, only new chunks are extracted
+    incremental: bool = False
+    # storage of the per chunk extractions: json / sqlite
+    kv_storage: str = "json"
 
 class EmbeddingSettings(BaseModel):
     model_name: str
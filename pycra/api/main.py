@@ -3,7 +3,8 @@ try:
 except ImportError:
     from contextlib2 import asynccontextmanager # type: ignore
 import os
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime
 
@@ -11,6 +12,7 @@ from pycra.api.middleware import register_exception_handlers
 from pycra import settings
 from pycra.utils import setup_logger, logger
 from pycra.api.core import get_factory
+from pycra.core.llm_server import LLMFactory
 from pycra.api.router import cckg_router, selfqa_router
 import uvicorn
 os.environ['HTTP_PROXY'] = ''
@@ -28,6 +30,7 @@ async def lifespan(fastapi_app: FastAPI):
     try:
         yield
     finally:
+        await LLMFactory.aclose_http_clients()
         logger.info("The pycra API service is shut down")
 
 def create_app() -> FastAPI:
@@ -70,6 +73,32 @@ def create_app() -> FastAPI:
             "version": getattr(settings.app, "version", "1.0.0")
         }
 
+    @app.get("/health/llm", tags=["Health"])
+    async def llm_health_check():
+        return {
+            "status": "healthy",
+            "timestamp": datetime.now().isoformat(),
+            "http_transport": LLMFactory.http_stats(),
+            "concurrency": LLMFactory.concurrency_stats(),
+            "hedging": LLMFactory.hedging_stats(),
+            "token_count_cache": LLMFactory.token_count_stats(),
+        }
+
+    @app.get("/usage", tags=["Health"])
+    async def llm_usage():
+        return LLMFactory.usage_stats()
+
+    @app.get("/usage/{request_id}", tags=["Health"])
+    async def llm_request_usage(request_id: str):
+        usage = LLMFactory.usage_stats(request_id)
+        if usage is None:
+            raise HTTPException(status_code=404, detail=f"No token usage recorded for {request_id}")
+        return usage
+
+    @app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+    async def metrics():
+        return LLMFactory.usage_metrics()
+
     return app
 
 
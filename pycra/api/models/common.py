@@ -11,4 +11,5 @@ from datetime import datetime
 class ContractGraphRequest(BaseModel):
     """Request model for contract graph construction"""
     contract_text: Optional[str] = None # OCR extract md_context
-    contract_id: Optional[str] = None # the contract id 唯一的id
\ No newline at end of file
+    contract_id: Optional[str] = None # the contract id 唯一的id
+    timeout: Optional[float] = None # seconds the caller waits for the graph, server.request_timeout if unset
@@ -12,3 +12,5 @@ class BuildReturnModel(BaseModel):
     nodes: Optional[List[Tuple[str, Dict]]] = None
     edges: Optional[List[Tuple[str, str, Dict]]] = None
     graph_namespace: str = None
+    # LLM token usage of the build: calls / prompt_tokens / completion_tokens, by_stage, by_profile
+    usage: Optional[Dict[str, Any]] = None
@@ -9,6 +9,7 @@ from pydantic import BaseModel
 
 class SelfQaRequest(BaseModel):
     namespace: str
+    timeout: Optional[float] = None # seconds the caller waits, server.selfqa_request_timeout if unset
 
 
 class SubgraphSummary(BaseModel):
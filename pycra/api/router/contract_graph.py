@@ -1,32 +1,54 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+import uuid
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from typing import Optional
 from pycra.api.models.common import ContractGraphRequest
 from pycra.utils.logger import cckg_logger as logger
 from pycra.core.knowledge_graph import KgBuilder
+from pycra.core.llm_server.client import INTERACTIVE_LANE, llm_lane, usage_scope
+from pycra import settings
+from pycra.utils.request_context import DEADLINE_EXCEEDED, RequestCancelled, request_scope
 from pycra.api.core.dependencies import get_kgBuilder_async
 from pycra.api.models.knowledge_graph import BuildReturnModel
 cckg_router = APIRouter(prefix="/cckg", tags=["CCKG"]) # current contract knowledge graph
 
 @cckg_router.post("/build", response_model=BuildReturnModel, tags=["CCKG"], summary="Build a contract graph for current contract")
-async def build_contract_graph(request: ContractGraphRequest, kg_builder: KgBuilder = Depends(get_kgBuilder_async),) -> BuildReturnModel:
+async def build_contract_graph(request: ContractGraphRequest, http_request: Request, kg_builder: KgBuilder = Depends(get_kgBuilder_async),) -> BuildReturnModel:
     try:
         logger.info(f"build contract graph: id={request.contract_id}")
         # Extract entities and relationships
-        nodes, edges, namespaces = await kg_builder.build_graph(
-            md_content=request.contract_text,
-            contract_id=request.contract_id
-        )
+        # called synchronously by the contract review workflow, ahead of background jobs
+        # stop every LLM call once the caller gave up (deadline or disconnect)
+        async with request_scope(
+            timeout=request.timeout or settings.server.request_timeout,
+            request=http_request,
+            name=f"cckg/build {request.contract_id}",
+            disconnect_poll_interval=settings.server.disconnect_poll_interval,
+        ):
+            # token usage of the build, also readable at /usage/{contract_id} (/usage/cckg-... without a contract id)
+            usage_id = request.contract_id or f"cckg-{uuid.uuid4().hex[:12]}"
+            with llm_lane(INTERACTIVE_LANE), usage_scope(usage_id) as build_usage:
+                nodes, edges, namespaces = await kg_builder.build_graph(
+                    md_content=request.contract_text,
+                    contract_id=request.contract_id
+                )
         # Prepare response
         response = BuildReturnModel(
             status="success",
             nodes=nodes,
             edges=edges,
-            graph_namespace=namespaces
+            graph_namespace=namespaces,
+            usage=build_usage.to_dict()
         )
         
         logger.info(f"{request.contract_id} successfully built contract graph")
         return response
-        
+
+    except RequestCancelled as e:
+        logger.warning(f"{request.contract_id} contract graph build cancelled: {e.reason}")
+        raise HTTPException(
+            status_code=504 if e.reason == DEADLINE_EXCEEDED else 499,
+            detail=f"Contract graph build cancelled: {e.reason}"
+        )
     except Exception as e:
         logger.error(f"Failed to build contract graph: {e}", exc_info=True)
         raise HTTPException(
@@ -1,7 +1,7 @@
 import json
 import os
 import pandas as pd
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 
 from pycra import settings
 from pycra.utils.common import normalize_result, serialize_item
@@ -11,15 +11,24 @@ from pycra.api.models.selfqa import selfQaResponse
 from pycra.api.models.selfqa import SelfQaRequest, SelfQaSubgrapnResponse
 from pycra.core.agents.selfqa.sub_graph import SubGraphBuilder
 from pycra.core.agents import GenerateService
+from pycra.core.llm_server.client import BULK_LANE, llm_lane, usage_scope
+from pycra.utils.request_context import DEADLINE_EXCEEDED, RequestCancelled, request_scope
 selfqa_router = APIRouter(prefix="/selfqa", tags=["SELF-QA"])  # current contract knowledge graph
 
 
 @selfqa_router.post("/build", response_model=selfQaResponse, tags=["SELF-QA"],
                   summary="Build a contract graph for current contract")
-async def build_selfqa(request: SelfQaRequest,
+async def build_selfqa(request: SelfQaRequest, http_request: Request,
                                generatorService: GenerateService = Depends(get_generatorSerivce_async), ) -> selfQaResponse:
     try:
-        results, results_multihop, results_cot = await generatorService.build(namespace=request.namespace)
+        async with request_scope(
+            timeout=request.timeout or settings.server.selfqa_request_timeout,
+            request=http_request,
+            name=f"selfqa/build {request.namespace}",
+            disconnect_poll_interval=settings.server.disconnect_poll_interval,
+        ):
+            with llm_lane(BULK_LANE), usage_scope(f"selfqa-{request.namespace}"):
+                results, results_multihop, results_cot = await generatorService.build(namespace=request.namespace)
         save_dir = f"{settings.kg.working_dir}/selfqa_data/{request.namespace}"
         os.makedirs(save_dir, exist_ok=True)
         save_path_aggregated = f"{save_dir}/aggregated.json"
@@ -40,6 +49,12 @@ async def build_selfqa(request: SelfQaRequest,
         )
         return response
 
+    except RequestCancelled as e:
+        logger.warning(f"{request.namespace} self qa generation cancelled: {e.reason}")
+        raise HTTPException(
+            status_code=504 if e.reason == DEADLINE_EXCEEDED else 499,
+            detail=f"Self qa generation cancelled: {e.reason}"
+        )
     except Exception as e:
         logger.error(f"Failed to build contract graph: {e}", exc_info=True)
         raise HTTPException(
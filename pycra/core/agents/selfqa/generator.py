@@ -186,7 +186,7 @@ class AggregatedGenerator(BaseGenerator):
         """
         result = {}
         rephrasing_prompt = self.build_prompt(batch)
-        response = await self.llm_client.generate_answer(rephrasing_prompt)
+        response = await self.llm_client.generate_answer(rephrasing_prompt, profile="qa_rephrase")
         context = self.parse_rephrased_text(response)
         if not context:
             return result
@@ -307,13 +307,13 @@ class CoTGenerator(BaseGenerator):
         """
         result = {}
         prompt = self.build_prompt(batch)
-        response = await self.llm_client.generate_answer(prompt)
+        response = await self.llm_client.generate_answer(prompt, profile="cot")
         response = self.parse_response(response)
         if not response:
             return result
         question, reasoning_path = response["question"], response["reasoning_path"]
         prompt = self.build_prompt_for_cot_generation(batch, question, reasoning_path)
-        cot_answer = await self.llm_client.generate_answer(prompt)
+        cot_answer = await self.llm_client.generate_answer(prompt, profile="cot")
         logger.debug("CoT Answer: %s", cot_answer)
         qa_pairs = {
             compute_content_hash(question): {
@@ -10,6 +10,7 @@ from typing import Any, List, Tuple, Dict
 from pycra import settings
 from pycra.utils.run_concurrent import run_concurrent
 from pycra.core.llm_server import BaseLLMClient
+from pycra.core.llm_server.client import BULK_LANE, with_llm_lane
 from pycra.utils.logger import selfqa_logger as logger
 from pycra.core.agents.selfqa.generator import AggregatedGenerator, MultiHopGenerator, CoTGenerator
 from pycra.core.agents.selfqa.sub_graph import SubGraphBuilder
@@ -27,6 +28,7 @@ class GenerateService:
         self.generator_multihop = MultiHopGenerator(self.llm_client)
         self.generator_cot = CoTGenerator(self.llm_client)
 
+    @with_llm_lane(BULK_LANE)
     async def build(self, namespace) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
         batches, batches_leiden = await self.subgraph_builder(namespace)
         aggregated_task = run_concurrent(
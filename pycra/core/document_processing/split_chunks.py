@@ -58,7 +58,7 @@ async def chunk_documents(
             compute_content_hash(txt, prefix=f"{text_id}-chunk-"): {
                 "content": txt,
                 "full_doc_id": doc_key,
-                "length": len(tokenizer_instance.encode(txt))
+                "length": tokenizer_instance.count_tokens(txt)
                 if tokenizer_instance
                 else len(txt),
                 "language": doc_language,
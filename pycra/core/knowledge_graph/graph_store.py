@@ -1,7 +1,11 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Generic, TypeVar, Union, List, Dict, Any, Optional, cast
+import asyncio
 import html
+import json
 import os
+import sqlite3
+import threading
 import networkx as nx
 from neo4j import GraphDatabase, AsyncGraphDatabase
 from neo4j.exceptions import Neo4jError
@@ -268,6 +272,9 @@ class BaseKVStorage(Generic[T], StorageNameSpace):
     async def all_keys(self) -> list[str]:
         raise NotImplementedError
 
+    def close(self):
+        """Release the resources of the storage (connections), nothing to do by default."""
+
     async def get_by_id(self, id: str) -> Union[T, None]:
         raise NotImplementedError
 
@@ -339,6 +346,198 @@ class BaseGraphStorage(StorageNameSpace):
     async def delete_node(self, node_id: str):
         raise NotImplementedError
 
+    async def delete_edge(self, source_node_id: str, target_node_id: str):
+        raise NotImplementedError
+
+
+@dataclass
+class JsonKVStorage(BaseKVStorage):
+    """
+    Key-value storage kept in memory and written to ``kv_store_{namespace}.json`` of the
+    working dir on index_done_callback.
+    """
+    _data: Dict[str, Any] = field(default_factory=dict, init=False, repr=False)
+
+    def __post_init__(self):
+        os.makedirs(self.working_dir, exist_ok=True)
+        self._file_name = os.path.join(self.working_dir, f"kv_store_{self.namespace}.json")
+        if os.path.exists(self._file_name):
+            with open(self._file_name, "r", encoding="utf-8") as f:
+                self._data = json.load(f)
+            logger.info("Loaded KV %s with %d items", self.namespace, len(self._data))
+
+    async def index_done_callback(self):
+        # write to a temporary file first, a crash never leaves a truncated store behind
+        tmp_file_name = f"{self._file_name}.tmp"
+        with open(tmp_file_name, "w", encoding="utf-8") as f:
+            json.dump(self._data, f, ensure_ascii=False)
+        os.replace(tmp_file_name, self._file_name)
+
+    async def all_keys(self) -> list[str]:
+        return list(self._data.keys())
+
+    async def get_by_id(self, id: str) -> Union[Any, None]:
+        return self._data.get(id)
+
+    async def get_by_ids(
+        self, ids: list[str], fields: Union[set[str], None] = None
+    ) -> list[Union[Any, None]]:
+        if fields is None:
+            return [self._data.get(id) for id in ids]
+        return [
+            {k: v for k, v in self._data[id].items() if k in fields} if id in self._data else None
+            for id in ids
+        ]
+
+    async def filter_keys(self, data: list[str]) -> set[str]:
+        return set(key for key in data if key not in self._data)
+
+    async def upsert(self, data: dict[str, Any]):
+        self._data.update(data)
+
+    async def delete(self, ids: list[str]):
+        for id in ids:
+            self._data.pop(id, None)
+
+    async def drop(self):
+        self._data = {}
+
+
+@dataclass
+class SQLiteKVStorage(BaseKVStorage):
+    """
+    Key-value storage in an embedded SQLite database (WAL mode), values stored as JSON.
+
+    - every namespace of the working dir shares ``file_name``, rows are isolated by namespace
+    - get_by_ids / filter_keys / upsert run one statement per ``batch_size`` keys
+    - ``fields`` of get_by_ids are projected by SQLite (``->`` operator), the other fields
+      of a value are never decoded
+    - every upsert / delete is committed at once (cheap in WAL mode): SQLite has one writer per
+      database file, a write transaction held for a whole build would lock out the builds of the
+      other namespaces and processes sharing the file
+    """
+    file_name: str = "kv_store.sqlite"
+    batch_size: int = 500
+    busy_timeout: float = 30.0
+
+    def __post_init__(self):
+        os.makedirs(self.working_dir, exist_ok=True)
+        self._db_file = os.path.join(self.working_dir, self.file_name)
+        self._lock = threading.Lock()
+        # waits for the write lock of another process instead of failing with "database is locked"
+        self._conn = sqlite3.connect(
+            self._db_file, timeout=self.busy_timeout, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS kv_store (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (namespace, key)
+            ) WITHOUT ROWID
+            """
+        )
+        # the -> operator (field projection) needs SQLite 3.38
+        self._sql_projection = sqlite3.sqlite_version_info >= (3, 38, 0)
+
+    def _batches(self, keys: List[str]) -> List[List[str]]:
+        return [keys[i:i + self.batch_size] for i in range(0, len(keys), self.batch_size)]
+
+    def _write(self, sql: str, rows: List[tuple]):
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock up front, the busy timeout applies to it
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(sql, rows)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _select(self, keys: List[str], columns: str, column_params: tuple = ()) -> Dict[str, tuple]:
+        rows = {}
+        with self._lock:
+            for batch in self._batches(keys):
+                placeholders = ",".join("?" * len(batch))
+                for row in self._conn.execute(
+                    f"SELECT key, {columns} FROM kv_store WHERE namespace = ? AND key IN ({placeholders})",
+                    (*column_params, self.namespace, *batch),
+                ):
+                    rows[row[0]] = row[1:]
+        return rows
+
+    def _get_by_ids(self, ids: List[str], fields: Union[set[str], None]) -> List[Union[Any, None]]:
+        if fields is None:
+            rows = self._select(ids, "value")
+            return [json.loads(rows[id][0]) if id in rows else None for id in ids]
+        fields = sorted(fields)
+        if not self._sql_projection:
+            rows = self._select(ids, "value")
+            values = {key: json.loads(row[0]) for key, row in rows.items()}
+            return [
+                {k: v for k, v in values[id].items() if k in fields} if id in values else None
+                for id in ids
+            ]
+        # value -> '$."field"' is the JSON text of the field, NULL when the field is missing
+        columns = ", ".join("value -> ?" for _ in fields)
+        rows = self._select(ids, columns, tuple(f'$."{f}"' for f in fields))
+        return [
+            {f: json.loads(v) for f, v in zip(fields, rows[id]) if v is not None} if id in rows else None
+            for id in ids
+        ]
+
+    async def index_done_callback(self):
+        # every write is already committed
+        pass
+
+    async def all_keys(self) -> list[str]:
+        def _all_keys():
+            with self._lock:
+                return [row[0] for row in self._conn.execute(
+                    "SELECT key FROM kv_store WHERE namespace = ?", (self.namespace,)
+                )]
+        return await asyncio.to_thread(_all_keys)
+
+    async def get_by_id(self, id: str) -> Union[Any, None]:
+        return (await self.get_by_ids([id]))[0]
+
+    async def get_by_ids(
+        self, ids: list[str], fields: Union[set[str], None] = None
+    ) -> list[Union[Any, None]]:
+        return await asyncio.to_thread(self._get_by_ids, list(ids), fields)
+
+    async def filter_keys(self, data: list[str]) -> set[str]:
+        existing = await asyncio.to_thread(self._select, list(data), "1")
+        return set(key for key in data if key not in existing)
+
+    async def upsert(self, data: dict[str, Any]):
+        rows = [
+            (self.namespace, key, json.dumps(value, ensure_ascii=False)) for key, value in data.items()
+        ]
+        await asyncio.to_thread(
+            self._write, "INSERT OR REPLACE INTO kv_store (namespace, key, value) VALUES (?, ?, ?)", rows
+        )
+
+    async def delete(self, ids: list[str]):
+        await asyncio.to_thread(
+            self._write, "DELETE FROM kv_store WHERE namespace = ? AND key = ?",
+            [(self.namespace, id) for id in ids],
+        )
+
+    async def drop(self):
+        await asyncio.to_thread(
+            self._write, "DELETE FROM kv_store WHERE namespace = ?", [(self.namespace,)]
+        )
+
+    def close(self):
+        self._conn.close()
+
+
+KV_STORAGES = {"json": JsonKVStorage, "sqlite": SQLiteKVStorage}
+
 
 @dataclass
 class NetworkXStorage(BaseGraphStorage):
@@ -498,6 +697,16 @@ class NetworkXStorage(BaseGraphStorage):
         else:
             logger.warning("Node %s not found in the graph for deletion.", node_id)
 
+    async def delete_edge(self, source_node_id: str, target_node_id: str):
+        if self._graph.has_edge(source_node_id, target_node_id):
+            self._graph.remove_edge(source_node_id, target_node_id)
+        else:
+            logger.warning(
+                "Edge %s -> %s not found in the graph for deletion.",
+                source_node_id,
+                target_node_id,
+            )
+
     async def clear(self):
         """
         Clear the graph by removing all nodes and edges.
@@ -1,22 +1,40 @@
+import asyncio
 import re
+from contextlib import asynccontextmanager
+from functools import partial
 from typing import Union
 from collections import Counter, defaultdict
 
 from pycra import settings
 from pycra.core.document_processing import chunk_documents, Chunk
-from pycra.core.knowledge_graph.graph_store import BaseGraphStorage, NetworkXStorage, neo4j_importer
+from pycra.core.knowledge_graph.graph_store import (
+    BaseGraphStorage, BaseKVStorage, KV_STORAGES, NetworkXStorage, neo4j_importer
+)
 from pycra.core.templates.kg import KG_EXTRACTION_PROMPT, KG_SUMMARIZATION_PROMPT
+from pycra.core.templates.prefix_template import PrefixTemplate
 from pycra.utils.common import (
     detect_main_language, pack_history_conversations,
     split_string_by_multi_markers, handle_single_entity_extraction,
+    RecordStreamParser,
     handle_single_relationship_extraction, compute_content_hash,
     time_record
 )
 from pycra.core.llm_server import BaseLLMClient
+from pycra.core.llm_server.client import BUILD_LANE, usage_stage, with_llm_lane
+from pycra.utils.near_dedup import collapse_near_duplicates
 from pycra.utils.run_concurrent import run_concurrent
+from pycra.utils.request_context import RequestCancelled, check_request
 from pycra.core.knowledge_graph.models import *
+from pycra.core.knowledge_graph.summarizer import BatchedSummarizer
 from pycra.utils.logger import cckg_logger
 
+# if_loop: IF_LOOP probe then CONTINUE, two sequential calls per gleaning round
+# continue_sentinel: one CONTINUE_OR_STOP call per round, answered with the no-more delimiter when done
+# speculative: IF_LOOP probe and CONTINUE sent together, the glean is dropped when the probe says no
+GLEAN_STRATEGIES = ("if_loop", "continue_sentinel", "speculative")
+# full: verbatim transcript of the gleaning conversation, compact: chunk prompt plus extracted names
+GLEAN_HISTORIES = ("full", "compact")
+
 class KgBuilder:
     """
     Entity and relation extraction module based on LLM.
@@ -27,6 +45,179 @@ class KgBuilder:
         self.logger = cckg_logger
         self.llm_pycra = llm_pycra
         self.max_loop = settings.kg.max_loop
+        self.stream_extraction = settings.kg.stream_extraction
+        self.glean_strategy = settings.kg.glean_strategy
+        if self.glean_strategy not in GLEAN_STRATEGIES:
+            raise ValueError(f"Unsupported glean strategy: {self.glean_strategy}")
+        self.glean_history = settings.kg.glean_history
+        if self.glean_history not in GLEAN_HISTORIES:
+            raise ValueError(f"Unsupported glean history: {self.glean_history}")
+        # merge the entities / relations of each chunk as soon as it is extracted
+        self.pipeline_merge = settings.kg.pipeline_merge
+        # keep the graph and the per chunk extractions of a contract across revisions
+        self.incremental = settings.kg.incremental
+        if settings.kg.kv_storage not in KV_STORAGES:
+            raise ValueError(f"Unsupported KV storage: {settings.kg.kv_storage}")
+        # one build at a time per contract in incremental mode, they share the graph files;
+        # a lock is dropped once no build holds or waits for it
+        self._contract_locks: Dict[str, asyncio.Lock] = {}
+        self._contract_lock_users: Counter = Counter()
+        # static part of the prompts formatted once, byte-identical for every chunk (prefix caching)
+        self.extraction_templates = {
+            language: PrefixTemplate(
+                KG_EXTRACTION_PROMPT[language]["TEMPLATE"], ("input_text",),
+                **KG_EXTRACTION_PROMPT["FORMAT"], entity_types=ENTITY_LIST, entity_types_des=ENTITY_DES
+            )
+            for language in ("en", "zh")
+        }
+        self.summary_templates = {
+            language: PrefixTemplate(
+                KG_SUMMARIZATION_PROMPT[language]["TEMPLATE"], ("entity_name", "description_list"),
+                **KG_SUMMARIZATION_PROMPT["FORMAT"]
+            )
+            for language in ("English", "Chinese")
+        }
+        # summaries requested together (merge phase) share one LLM call
+        self.summarizer = BatchedSummarizer(
+            llm_pycra, self._summarize_one,
+            max_items=settings.kg.summary_batch_size,
+            token_budget=settings.kg.summary_batch_tokens,
+        ) if settings.kg.summary_batch_size > 1 else None
+
+    async def _generate_records(
+        self, text: str, history: Optional[List[dict]] = None, profile: str = "extraction",
+        prompt_prefix: Optional[str] = None
+    ) -> Tuple[str, List[str]]:
+        """
+        Generate one extraction answer and split it into records.
+        With kg.stream_extraction the answer is streamed, records are split while they arrive
+        and the generation is stopped as soon as the completion delimiter shows up.
+        """
+        completion_delimiter = KG_EXTRACTION_PROMPT["FORMAT"]["completion_delimiter"]
+        markers = [KG_EXTRACTION_PROMPT["FORMAT"]["record_delimiter"], completion_delimiter]
+        if not self.stream_extraction:
+            answer = await self.llm_pycra.generate_answer(
+                text, history=history, profile=profile, prompt_prefix=prompt_prefix
+            )
+            return answer, split_string_by_multi_markers(answer, markers)
+
+        parser = RecordStreamParser(markers)
+        pieces, records = [], []
+        async for piece in self.llm_pycra.generate_answer_stream(
+            text, history=history, stop_markers=[completion_delimiter], profile=profile,
+            prompt_prefix=prompt_prefix
+        ):
+            pieces.append(piece)
+            records.extend(parser.feed(piece))
+        records.extend(parser.close())
+        return self.llm_pycra.filter_think_tags("".join(pieces)), records
+
+    async def _parse_records(
+        self, records: List[str], chunk_id: str
+    ) -> Tuple[Dict[str, List[dict]], Dict[Tuple[str, str], List[dict]]]:
+        nodes = defaultdict(list)
+        edges = defaultdict(list)
+
+        for record in records:
+            match = re.search(r"\((.*)\)", record)
+            if not match:
+                continue
+            inner = match.group(1)
+
+            attributes = split_string_by_multi_markers(
+                inner, [KG_EXTRACTION_PROMPT["FORMAT"]["tuple_delimiter"]]
+            )
+
+            entity = await handle_single_entity_extraction(attributes, chunk_id)
+            if entity is not None:
+                nodes[entity["entity_name"]].append(entity)
+                continue
+
+            relation = await handle_single_relationship_extraction(attributes, chunk_id)
+            if relation is not None:
+                key = (relation["src_id"], relation["tgt_id"])
+                edges[key].append(relation)
+        return dict(nodes), dict(edges)
+
+    async def _glean_history(
+        self, language: str, hint_prompt: str, transcript: List[dict], records: List[str]
+    ) -> List[dict]:
+        """
+        Conversation the next gleaning call continues.
+        full: the verbatim transcript, it grows with every round.
+        compact: the hint prompt and the names of what was extracted so far, about constant size.
+        """
+        if self.glean_history == "full":
+            return transcript
+        nodes, edges = await self._parse_records(records, "")
+        extracted = KG_EXTRACTION_PROMPT[language]["EXTRACTED"].format(
+            entity_names=", ".join(nodes) or "-",
+            relation_pairs=", ".join(f"({src}, {tgt})" for src, tgt in edges) or "-",
+        )
+        return pack_history_conversations(hint_prompt, extracted)
+
+    async def _probe_more(self, language: str, history: List[dict], prompt_prefix: str) -> bool:
+        """IF_LOOP probe: does the model think entities or relationships are still missing."""
+        answer = await self.llm_pycra.generate_answer(
+            text=KG_EXTRACTION_PROMPT[language]["IF_LOOP"], history=history, profile="loop_probe",
+            prompt_prefix=prompt_prefix
+        )
+        return answer.strip().strip('"').strip("'").lower() == "yes"
+
+    async def _glean(
+        self, language: str, template: PrefixTemplate, hint_prompt: str, first_result: str,
+        first_records: List[str]
+    ) -> Tuple[str, List[str]]:
+        """
+        Ask up to max_loop times for the entities and relationships missed by the first extraction,
+        following kg.glean_strategy. Returns the concatenated glean answers and their records.
+        """
+        no_more = KG_EXTRACTION_PROMPT["FORMAT"]["no_more_delimiter"]
+        if self.glean_strategy == "continue_sentinel":
+            continue_prompt = KG_EXTRACTION_PROMPT[language]["CONTINUE_OR_STOP"].format(no_more_delimiter=no_more)
+        else:
+            continue_prompt = KG_EXTRACTION_PROMPT[language]["CONTINUE"]
+
+        transcript = pack_history_conversations(hint_prompt, first_result)
+        results, records = [], []
+        for loop_idx in range(self.max_loop):
+            check_request()
+            history = await self._glean_history(language, hint_prompt, transcript, first_records + records)
+            self.logger.debug(f"the history: \n {history}")
+            # the glean coroutine is only created right before it is awaited or scheduled,
+            # a probe failing first must not leave it never awaited
+            glean = partial(
+                self._generate_records,
+                continue_prompt, history=history, profile="glean_continue", prompt_prefix=template.prefix_key
+            )
+            if self.glean_strategy == "if_loop":
+                if not await self._probe_more(language, history, template.prefix_key):
+                    break
+                glean_result, glean_records = await glean()
+            elif self.glean_strategy == "speculative":
+                # the glean runs while the probe is answered, a NO cancels it
+                glean_task = asyncio.create_task(glean())
+                try:
+                    if not await self._probe_more(language, history, template.prefix_key):
+                        break
+                    glean_result, glean_records = await glean_task
+                finally:
+                    if not glean_task.done():
+                        glean_task.cancel()
+            else:
+                glean_result, glean_records = await glean()
+                # the no-more delimiter is a stop sequence, an answer without records means done as well
+                glean_records = [r for r in glean_records if no_more not in r]
+                if no_more in glean_result or not any(re.search(r"\((.*)\)", r) for r in glean_records):
+                    records += glean_records
+                    results.append(glean_result.replace(no_more, ""))
+                    break
+            self.logger.debug("Loop %s glean: %s", loop_idx + 1, glean_result)
+
+            transcript = transcript + pack_history_conversations(continue_prompt, glean_result)
+            results.append(glean_result)
+            records += glean_records
+        return "".join(results), records
 
     # local_perception_recognition
     async def local_perception_recognition(self, chunk: Chunk) -> Tuple[Dict[str, List[dict]], Dict[Tuple[str, str], List[dict]]]:
@@ -47,71 +238,31 @@ class KgBuilder:
         if not contract_content:
             self.logger.error("No contract content provided for extraction")
             raise ValueError("Contract content must be provided")
+        check_request()
         language = detect_main_language(contract_content)
         try:
             # TODO few-shot 的例子 要经典 后续业务数据有badcase的可以人工调整后作为few-shot
-            hint_prompt = KG_EXTRACTION_PROMPT[language]["TEMPLATE"].format(
-                    **KG_EXTRACTION_PROMPT["FORMAT"], input_text=contract_content,
-                    entity_types=ENTITY_LIST, entity_types_des=ENTITY_DES)
-            hint_prompt_token_count = self.llm_pycra.tokenizer.count_tokens(hint_prompt)
+            template = self.extraction_templates[language]
+            hint_prompt = template.format(input_text=contract_content)
+            hint_prompt_token_count = self.llm_pycra.tokenizer.estimate_tokens(hint_prompt)
             self.logger.debug(f"the hint prompt token size: \n {hint_prompt_token_count}")
             # initial glean
-            final_result = await self.llm_pycra.generate_answer(hint_prompt)
+            final_result, records = await self._generate_records(
+                hint_prompt, profile="extraction", prompt_prefix=template.prefix_key
+            )
             self.logger.debug("init result: %s", final_result)
 
             # iterative refinement
-            history = pack_history_conversations(hint_prompt, final_result)
-            self.logger.debug(f"the history: \n {history}")
-            for loop_idx in range(self.max_loop):
-                if_loop_result = await self.llm_pycra.generate_answer(
-                text=KG_EXTRACTION_PROMPT[language]["IF_LOOP"], history=history
-            )
-                if_loop_result = if_loop_result.strip().strip('"').strip("'").lower()
-                if if_loop_result != "yes":
-                    break
-
-                glean_result = await self.llm_pycra.generate_answer(
-                    text=KG_EXTRACTION_PROMPT[language]["CONTINUE"], history=history
-                )
-                self.logger.debug("Loop %s glean: %s", loop_idx + 1, glean_result)
-
-                history += pack_history_conversations(
-                    KG_EXTRACTION_PROMPT[language]["CONTINUE"], glean_result
-                )
-                final_result += glean_result
+            glean_result, glean_records = await self._glean(language, template, hint_prompt, final_result, records)
+            final_result += glean_result
+            records += glean_records
             self.logger.debug(f"loop after final_result: \n {final_result}")
-            # step 4: parse the final result
-            records = split_string_by_multi_markers(
-                final_result,
-                [
-                    KG_EXTRACTION_PROMPT["FORMAT"]["record_delimiter"],
-                    KG_EXTRACTION_PROMPT["FORMAT"]["completion_delimiter"],
-                ],
-            )
+            # step 4: parse the records
             self.logger.debug(f"the records: \n {records}")
-            nodes = defaultdict(list)
-            edges = defaultdict(list)
-
-            for record in records:
-                match = re.search(r"\((.*)\)", record)
-                if not match:
-                    continue
-                inner = match.group(1)
-
-                attributes = split_string_by_multi_markers(
-                    inner, [KG_EXTRACTION_PROMPT["FORMAT"]["tuple_delimiter"]]
-                )
-
-                entity = await handle_single_entity_extraction(attributes, chunk.id)
-                if entity is not None:
-                    nodes[entity["entity_name"]].append(entity)
-                    continue
-
-                relation = await handle_single_relationship_extraction(attributes, chunk.id)
-                if relation is not None:
-                    key = (relation["src_id"], relation["tgt_id"])
-                    edges[key].append(relation)
+            nodes, edges = await self._parse_records(records, chunk.id)
             self.logger.debug(f"the nodes: \n {nodes} \n the edges: \n {edges}")
+        except RequestCancelled:
+            raise
         except Exception as e:
             self.logger.error(f"Entity and relation extraction failed: {e}", exc_info=True)
             raise
@@ -121,29 +272,41 @@ class KgBuilder:
         self,
         node_data: tuple[str, List[dict]],
         kg_instance: BaseGraphStorage,
+        replace: bool = False,
+        summarize: bool = True,
     ) -> None:
+        """
+        Merge the extracted records of an entity into the graph, ``replace`` ignores the stored node.
+        Without ``summarize`` the descriptions are only joined, summaries are left to the caller.
+        """
+        check_request()
         entity_name, node_data = node_data
         entity_types = []
         source_ids = []
         descriptions = []
 
-        node = await kg_instance.get_node(entity_name)
+        node = None if replace else await kg_instance.get_node(entity_name)
+        if node is not None and node["entity_type"] == "UNKNOWN":
+            # endpoint placeholder of a relation merged before the entity (pipelined merge): it only
+            # holds the relation's description and chunks, the extracted records replace it
+            node = None
         if node is not None:
             entity_types.append(node["entity_type"])
             source_ids.extend(
                 split_string_by_multi_markers(node["source_id"], ["<SEP>"])
             )
-            descriptions.append(node["description"])
+            descriptions.extend(
+                split_string_by_multi_markers(node["description"], ["<SEP>"])
+            )
         entity_type = sorted(
             Counter([dp["entity_type"] for dp in node_data] + entity_types).items(),
             key=lambda x: x[1],
             reverse=True,
         )[0][0]
 
-        description = "<SEP>".join(
-            sorted(set([dp["description"] for dp in node_data] + descriptions))
-        )
-        description = await self._handle_kg_summary(entity_name, description, max_summary_tokens=settings.kg.max_summary_tokens)
+        description = self._join_descriptions([dp["description"] for dp in node_data] + descriptions)
+        if summarize:
+            description = await self._handle_kg_summary(entity_name, description, max_summary_tokens=settings.kg.max_summary_tokens)
 
         source_id = "<SEP>".join(
             set([dp["source_id"] for dp in node_data] + source_ids)
@@ -156,26 +319,44 @@ class KgBuilder:
         }
         await kg_instance.upsert_node(entity_name, node_data=node_data)
 
+    @staticmethod
+    def _join_descriptions(descriptions: List[str]) -> str:
+        """
+        Join the distinct descriptions of an entity / relation, near duplicates (the same fact
+        extracted from overlapping chunks, reworded) are collapsed before the summary token check.
+        """
+        descriptions = sorted(set(d for d in descriptions if d))
+        if settings.kg.near_dup_threshold > 0:
+            descriptions = collapse_near_duplicates(descriptions, settings.kg.near_dup_threshold)
+        return "<SEP>".join(descriptions)
+
     async def merge_edges(
         self,
         edges_data: tuple[Tuple[str, str], List[dict]],
         kg_instance: BaseGraphStorage,
+        replace: bool = False,
+        summarize: bool = True,
     ) -> None:
+        """
+        Merge the extracted records of a relation into the graph, ``replace`` ignores the stored edge.
+        Without ``summarize`` the descriptions are only joined, summaries are left to the caller.
+        """
+        check_request()
         (src_id, tgt_id), edge_data = edges_data
 
         source_ids = []
         descriptions = []
 
-        edge = await kg_instance.get_edge(src_id, tgt_id)
+        edge = None if replace else await kg_instance.get_edge(src_id, tgt_id)
         if edge is not None:
             source_ids.extend(
                 split_string_by_multi_markers(edge["source_id"], ["<SEP>"])
             )
-            descriptions.append(edge["description"])
+            descriptions.extend(
+                split_string_by_multi_markers(edge["description"], ["<SEP>"])
+            )
 
-        description = "<SEP>".join(
-            sorted(set([dp["description"] for dp in edge_data] + descriptions))
-        )
+        description = self._join_descriptions([dp["description"] for dp in edge_data] + descriptions)
         source_id = "<SEP>".join(
             set([dp["source_id"] for dp in edge_data] + source_ids)
         )
@@ -191,9 +372,10 @@ class KgBuilder:
                     },
                 )
 
-        description = await self._handle_kg_summary(
-            f"({src_id}, {tgt_id})", description, max_summary_tokens=settings.kg.max_summary_tokens
-        )
+        if summarize:
+            description = await self._handle_kg_summary(
+                f"({src_id}, {tgt_id})", description, max_summary_tokens=settings.kg.max_summary_tokens
+            )
 
         await kg_instance.upsert_edge(
             src_id,
@@ -224,17 +406,20 @@ class KgBuilder:
             language = "Chinese"
         KG_EXTRACTION_PROMPT["FORMAT"]["language"] = language
 
-        tokens = tokenizer_instance.encode(description)
-        if len(tokens) < max_summary_tokens:
+        # descriptions are checked again at every merge, the count is cached
+        if tokenizer_instance.count_tokens(description) < max_summary_tokens:
             return description
 
+        tokens = tokenizer_instance.encode(description)
         use_description = tokenizer_instance.decode(tokens[:max_summary_tokens])
-        prompt = KG_SUMMARIZATION_PROMPT[language]["TEMPLATE"].format(
-            entity_name=entity_or_relation_name,
-            description_list=use_description.split("<SEP>"),
-            **KG_SUMMARIZATION_PROMPT["FORMAT"],
-        )
-        new_description = await self.llm_pycra.generate_answer(prompt)
+        if self.summarizer is not None:
+            new_description = await self.summarizer.summarize(
+                entity_or_relation_name, use_description.split("<SEP>"), language
+            )
+        else:
+            new_description = await self._summarize_one(
+                entity_or_relation_name, use_description.split("<SEP>"), language
+            )
         self.logger.info(
             "Entity or relation %s summary: %s",
             entity_or_relation_name,
@@ -242,6 +427,16 @@ class KgBuilder:
         )
         return new_description
 
+    async def _summarize_one(self, entity_or_relation_name: str, description_list: List[str], language: str) -> str:
+        template = self.summary_templates[language]
+        prompt = template.format(
+            entity_name=entity_or_relation_name,
+            description_list=description_list,
+        )
+        return await self.llm_pycra.generate_answer(
+            prompt, profile="summary", prompt_prefix=template.prefix_key
+        )
+
 
     async def _split_chunks(self, md_content: str, contract_id: str) -> List[Chunk]:
         new_docs = {
@@ -264,7 +459,242 @@ class KgBuilder:
         ]
         return chunks
 
+    async def _extract_and_merge(self, chunks: List[Chunk], kg_instance: BaseGraphStorage) -> None:
+        """
+        Streaming build: the records of each chunk are merged into the graph as soon as the chunk
+        is extracted, while the other chunks are still with the LLM. Descriptions are only joined
+        at that point; an entity / relation whose description reaches max_summary_tokens is
+        summarized at once in the background (records merged meanwhile are appended to the
+        summary, and may take it over the limit again), and a last pass summarizes what is still
+        too long when every chunk is merged. Summary calls overlap the extraction instead of
+        following it, at the price of more of them for entities mentioned all over the contract.
+        """
+        max_summary_tokens = settings.kg.max_summary_tokens
+        tokenizer = self.llm_pycra.tokenizer
+        locks: Dict[Any, asyncio.Lock] = defaultdict(asyncio.Lock)
+        in_flight = set()
+        summaries: Dict[Any, str] = {}
+        summary_tasks: List[asyncio.Task] = []
+
+        async def get_description(key) -> Optional[str]:
+            data = await (kg_instance.get_edge(*key) if isinstance(key, tuple) else kg_instance.get_node(key))
+            return data["description"] if data else None
+
+        async def summarize(key):
+            name = f"({key[0]}, {key[1]})" if isinstance(key, tuple) else key
+            snapshot = await get_description(key)
+            try:
+                summary = await self._handle_kg_summary(name, snapshot, max_summary_tokens=max_summary_tokens)
+                async with locks[key]:
+                    # keep the descriptions merged while the summary was generated
+                    current = await get_description(key) or ""
+                    added = set(split_string_by_multi_markers(current, ["<SEP>"])) - set(
+                        split_string_by_multi_markers(snapshot, ["<SEP>"])
+                    )
+                    description = summaries[key] = "<SEP>".join([summary] + sorted(added))
+                    if isinstance(key, tuple):
+                        await kg_instance.update_edge(*key, {"description": description})
+                    else:
+                        await kg_instance.update_node(key, {"description": description})
+            finally:
+                in_flight.discard(key)
+
+        async def merge(key, records):
+            async with locks[key]:
+                if isinstance(key, tuple):
+                    await self.merge_edges((key, records), kg_instance=kg_instance, summarize=False)
+                else:
+                    await self.merge_nodes((key, records), kg_instance=kg_instance, summarize=False)
+                description = await get_description(key)
+            if key not in in_flight and tokenizer.count_tokens(description) >= max_summary_tokens:
+                in_flight.add(key)
+                summary_tasks.append(asyncio.create_task(summarize(key)))
+
+        async def extract_and_merge(chunk: Chunk):
+            with usage_stage("extraction"):
+                nodes, edges = await self.local_perception_recognition(chunk)
+            with usage_stage("merge"):
+                for name, records in nodes.items():
+                    await merge(name, records)
+                for key, records in edges.items():
+                    await merge(tuple(sorted(key)), records)
+
+        try:
+            await run_concurrent(
+                extract_and_merge,
+                chunks,
+                desc="pycra.cckg: Extracting and merging entities and relationships",
+                unit="chunk",
+            )
+            for result in await asyncio.gather(*summary_tasks, return_exceptions=True):
+                if isinstance(result, RequestCancelled):
+                    raise result
+                if isinstance(result, Exception):
+                    self.logger.error(f"Description summary failed: {result}")
+        finally:
+            for task in summary_tasks:
+                if not task.done():
+                    task.cancel()
+
+        # descriptions still too long: never summarized, or grown again after the early summary
+        descriptions = [(node_id, data["description"]) for node_id, data in await kg_instance.get_all_nodes()]
+        descriptions += [
+            (tuple(sorted((src_id, tgt_id))), data["description"])
+            for src_id, tgt_id, data in await kg_instance.get_all_edges()
+        ]
+        too_long = [
+            key for key, description in descriptions
+            if summaries.get(key) != description and tokenizer.count_tokens(description) >= max_summary_tokens
+        ]
+        with usage_stage("merge"):
+            await run_concurrent(summarize, too_long, desc="pycra.cckg: Summarizing descriptions")
+
+    async def _extract_new_chunks(
+        self, chunks: List[Chunk], extraction_store: BaseKVStorage
+    ) -> List[Chunk]:
+        """Extract the chunks without a stored extraction and store their nodes / edges records."""
+        missing = await extraction_store.filter_keys([chunk.id for chunk in chunks])
+        new_chunks = [chunk for chunk in chunks if chunk.id in missing]
+
+        async def extract(chunk: Chunk):
+            nodes, edges = await self.local_perception_recognition(chunk)
+            return chunk.id, nodes, edges
+
+        with usage_stage("extraction"):
+            # failed chunks are left out of the store and extracted again by the next build
+            results = await run_concurrent(
+                extract,
+                new_chunks,
+                desc="pycra.cckg: Extracting entities and relationships from new chunks",
+                unit="chunk",
+            )
+        await extraction_store.upsert({
+            chunk_id: {
+                "nodes": [record for records in nodes.values() for record in records],
+                "edges": [record for records in edges.values() for record in records],
+            }
+            for chunk_id, nodes, edges in results
+        })
+        await extraction_store.index_done_callback()
+        return new_chunks
+
+    @asynccontextmanager
+    async def _contract_lock(self, contract_id: str):
+        lock = self._contract_locks.setdefault(contract_id, asyncio.Lock())
+        self._contract_lock_users[contract_id] += 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._contract_lock_users[contract_id] -= 1
+            if not self._contract_lock_users[contract_id]:
+                del self._contract_lock_users[contract_id]
+                del self._contract_locks[contract_id]
+
+    async def _build_graph_incremental(self, chunks: List[Chunk], contract_id: str) -> Tuple[
+        list[tuple[str, dict]],
+        list[tuple[str, str, dict]],
+        str
+    ]:
+        """
+        Update the graph of the contract to a new revision.
+        Chunk ids are content hashes: only chunks never extracted before are sent to the LLM.
+        Nodes / edges whose source_id names a chunk that is gone are retracted, and only the
+        entities and relations touched by a new or removed chunk are merged again, from the
+        stored extractions of the chunks of the revision.
+        """
+        namespace = f"{settings.kg.namespace}_{contract_id}"
+        kg_instance = NetworkXStorage(settings.kg.working_dir, namespace=namespace)
+        extraction_store = KV_STORAGES[settings.kg.kv_storage](
+            settings.kg.working_dir, namespace=f"{namespace}_extractions"
+        )
+        try:
+            return await self._update_graph(chunks, contract_id, namespace, kg_instance, extraction_store)
+        finally:
+            extraction_store.close()
+
+    async def _update_graph(
+        self, chunks: List[Chunk], contract_id: str, namespace: str,
+        kg_instance: BaseGraphStorage, extraction_store: BaseKVStorage
+    ) -> Tuple[list[tuple[str, dict]], list[tuple[str, str, dict]], str]:
+        """Body of _build_graph_incremental, with the graph and extraction store of the contract open."""
+        new_chunks = await self._extract_new_chunks(chunks, extraction_store)
+        chunk_ids = [chunk.id for chunk in chunks]
+        current = set(chunk_ids)
+
+        # records of every chunk of the revision, by entity and by relation
+        nodes = defaultdict(list)
+        edges = defaultdict(list)
+        extractions = dict(zip(chunk_ids, await extraction_store.get_by_ids(chunk_ids)))
+        for extraction in extractions.values():
+            if extraction is None:
+                continue
+            for record in extraction["nodes"]:
+                nodes[record["entity_name"]].append(record)
+            for record in extraction["edges"]:
+                edges[tuple(sorted((record["src_id"], record["tgt_id"])))].append(record)
+
+        # provenance: a node / edge citing a chunk that is gone is touched, chunks the graph
+        # does not cite yet (new, or left out by a failed build) touch what they extracted
+        merged = set()
+        touched_nodes = set()
+        touched_edges = set()
+        for node_id, data in await kg_instance.get_all_nodes():
+            source_ids = set(split_string_by_multi_markers(data.get("source_id", ""), ["<SEP>"]))
+            merged |= source_ids
+            if source_ids - current:
+                touched_nodes.add(node_id)
+        for src_id, tgt_id, data in await kg_instance.get_all_edges():
+            source_ids = set(split_string_by_multi_markers(data.get("source_id", ""), ["<SEP>"]))
+            merged |= source_ids
+            if source_ids - current:
+                touched_edges.add(tuple(sorted((src_id, tgt_id))))
+        for chunk_id in current - merged:
+            extraction = extractions.get(chunk_id)
+            if extraction is None:
+                continue
+            touched_nodes.update(record["entity_name"] for record in extraction["nodes"])
+            touched_edges.update(tuple(sorted((r["src_id"], r["tgt_id"]))) for r in extraction["edges"])
+        self.logger.info(
+            f"{contract_id} incremental build: {len(new_chunks)}/{len(chunks)} chunks extracted, "
+            f"{len(merged - current)} chunks retracted, "
+            f"{len(touched_nodes)} entities and {len(touched_edges)} relations to merge"
+        )
+
+        # relations first, the entities left without records are then dropped or kept as endpoints
+        retracted_edges = [key for key in touched_edges if key not in edges]
+        for src_id, tgt_id in retracted_edges:
+            if await kg_instance.has_edge(src_id, tgt_id):
+                await kg_instance.delete_edge(src_id, tgt_id)
+        with usage_stage("merge"):
+            await run_concurrent(
+                lambda key: self.merge_edges((key, edges[key]), kg_instance=kg_instance, replace=True),
+                [key for key in touched_edges if key in edges],
+                desc="pycra.cckg: Merging touched relationships",
+            )
+            await run_concurrent(
+                lambda name: self.merge_nodes((name, nodes[name]), kg_instance=kg_instance, replace=True),
+                [name for name in touched_nodes if name in nodes],
+                desc="pycra.cckg: Merging touched entities",
+            )
+        for node_id in touched_nodes - set(nodes):
+            if not await kg_instance.has_node(node_id):
+                continue
+            node_edges = await kg_instance.get_node_edges(node_id) or []
+            if not node_edges:
+                await kg_instance.delete_node(node_id)
+                continue
+            # only an endpoint of relations now, cite the chunks of these relations
+            source_ids = set()
+            for _, _, data in node_edges:
+                source_ids.update(split_string_by_multi_markers(data["source_id"], ["<SEP>"]))
+            await kg_instance.update_node(node_id, {"source_id": "<SEP>".join(sorted(source_ids))})
+
+        await kg_instance.index_done_callback()
+        return await kg_instance.get_all_nodes(), await kg_instance.get_all_edges(), namespace
+
     @time_record
+    @with_llm_lane(BUILD_LANE)
     async def build_graph(self, md_content: Optional[str] = None, contract_id: Optional[str] = None) -> Tuple[
         list[tuple[str, dict]],
         list[tuple[str, str, dict]],
@@ -309,18 +739,28 @@ class KgBuilder:
 
         # step1: Chapter divisions for md_content
         init_chunks = await self._split_chunks(md_content, contract_id)
-        # step2: Local Extraction --> 局部强召回 这一步的目标是“宁可错杀，不可放过”, 在小范围内，尽可能多地把所有潜在的实体和关系都找出来。
-        results = await run_concurrent(
-            self.local_perception_recognition,
-            init_chunks,
-            desc="pycra.cckg: Extracting entities and relationships from chunks",
-            unit="chunk",
-        )
+        # the graph of a contract is only found again by its id, anonymous builds get their own graph
+        if self.incremental and contract_id:
+            async with self._contract_lock(contract_id):
+                return await self._build_graph_incremental(init_chunks, contract_id)
+        if self.incremental:
+            self.logger.warning("Incremental build without contract id, building a standalone graph")
         namespace_postfix = compute_content_hash(md_content)
         namespace = f"{settings.kg.namespace}_{contract_id}_{namespace_postfix}"
         kg_instance = NetworkXStorage(
             settings.kg.working_dir, namespace=namespace
         )
+        if self.pipeline_merge:
+            await self._extract_and_merge(init_chunks, kg_instance)
+            return await self._write_graph(kg_instance, namespace)
+        # step2: Local Extraction --> 局部强召回 这一步的目标是“宁可错杀，不可放过”, 在小范围内，尽可能多地把所有潜在的实体和关系都找出来。
+        with usage_stage("extraction"):
+            results = await run_concurrent(
+                self.local_perception_recognition,
+                init_chunks,
+                desc="pycra.cckg: Extracting entities and relationships from chunks",
+                unit="chunk",
+            )
         # step3: 全局拓扑对齐 --> 将不同文本块中抽取的同一个实体统一成一个全局ID。
         nodes = defaultdict(list)
         edges = defaultdict(list)
@@ -330,16 +770,25 @@ class KgBuilder:
             for k, v in e.items():
                 edges[tuple(sorted(k))].extend(
                     v)
-        await run_concurrent(
-            lambda kv: self.merge_nodes(kv, kg_instance=kg_instance),
-            list(nodes.items()),
-            desc="pycra.cckg: Inserting entities into storage",
-        )
-        await run_concurrent(
-            lambda kv: self.merge_edges(kv, kg_instance=kg_instance),
-            list(edges.items()),
-            desc="pycra.cckg: Inserting relationships into storage",
-        )
+        # summaries of the merged descriptions
+        with usage_stage("merge"):
+            await run_concurrent(
+                lambda kv: self.merge_nodes(kv, kg_instance=kg_instance),
+                list(nodes.items()),
+                desc="pycra.cckg: Inserting entities into storage",
+            )
+            await run_concurrent(
+                lambda kv: self.merge_edges(kv, kg_instance=kg_instance),
+                list(edges.items()),
+                desc="pycra.cckg: Inserting relationships into storage",
+            )
+        return await self._write_graph(kg_instance, namespace)
+
+    async def _write_graph(self, kg_instance: NetworkXStorage, namespace: str) -> Tuple[
+        list[tuple[str, dict]],
+        list[tuple[str, str, dict]],
+        str
+    ]:
         g = await kg_instance.get_graph()
         file_name = f"{settings.kg.working_dir}/{namespace}.graphml"
         NetworkXStorage.write_nx_graph(graph=g, file_name=file_name)
@@ -0,0 +1,160 @@
+import asyncio
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from pycra.core.llm_server import BaseLLMClient
+from pycra.core.templates.kg import KG_SUMMARIZATION_PROMPT
+from pycra.core.templates.prefix_template import PrefixTemplate
+from pycra.utils.logger import cckg_logger as logger
+from pycra.utils.request_context import RequestCancelled, current_request
+
+_ITEM_MARKER = re.compile(r"<\|ITEM\s*(\d+)\s*\|>")
+
+
+class _SummaryItem:
+    def __init__(self, name: str, description_list: List[str], language: str, tokens: int):
+        self.name = name
+        self.description_list = description_list
+        self.language = language
+        self.tokens = tokens
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def format(self, index: int) -> str:
+        return KG_SUMMARIZATION_PROMPT[self.language]["BATCH_ITEM"].format(
+            index=index, entity_name=self.name, description_list=self.description_list
+        )
+
+
+def parse_batch_summaries(answer: str, count: int) -> Dict[int, str]:
+    """Summaries of a batch answer by item index (1-based), empty or out of range items are left out."""
+    parts = _ITEM_MARKER.split(answer)
+    summaries = {}
+    # parts: [preamble, index, summary, index, summary, ...]
+    for index, summary in zip(parts[1::2], parts[2::2]):
+        summary = summary.replace(KG_SUMMARIZATION_PROMPT["FORMAT"]["completion_delimiter"], "").strip()
+        if summary and 1 <= int(index) <= count:
+            summaries.setdefault(int(index), summary)
+    return summaries
+
+
+class BatchedSummarizer:
+    """
+    Pack the description summaries requested at the same time into one LLM call.
+
+    Merging a graph asks for hundreds of small summaries concurrently, each paying the whole
+    prompt overhead. Requests are queued per language (and per API request, so a cancelled
+    build never fails the summaries of another one); a queue is sent as one batch prompt when
+    it reaches ``max_items`` or ``token_budget`` prompt tokens, or ``linger`` seconds after its
+    first item. Items missing from the answer are summarized one by one with ``fallback``.
+    """
+
+    def __init__(
+        self,
+        llm_client: BaseLLMClient,
+        fallback: Callable[[str, List[str], str], Awaitable[str]],
+        max_items: int = 16,
+        token_budget: int = 3000,
+        linger: float = 0.05,
+    ):
+        self.llm_client = llm_client
+        self.fallback = fallback
+        self.max_items = max_items
+        self.token_budget = token_budget
+        self.linger = linger
+        self.templates = {
+            language: PrefixTemplate(
+                KG_SUMMARIZATION_PROMPT[language]["BATCH_TEMPLATE"], ("items",),
+                **{**KG_SUMMARIZATION_PROMPT["FORMAT"], "language": language}
+            )
+            for language in ("English", "Chinese")
+        }
+        self._pending: Dict[Tuple[str, Any], List[_SummaryItem]] = {}
+        self._timers: Dict[Tuple[str, Any], asyncio.TimerHandle] = {}
+        self._tasks: set = set()
+        self.batches = 0
+        self.batched_items = 0
+        self.fallbacks = 0
+
+    async def summarize(self, name: str, description_list: List[str], language: str) -> str:
+        """Summary of the descriptions of one entity or relation, ``language`` English / Chinese."""
+        item = _SummaryItem(name, description_list, language, 0)
+        item.tokens = self.llm_client.tokenizer.count_tokens(item.format(0))
+        key = (language, current_request())
+        queue = self._pending.setdefault(key, [])
+        if queue and sum(i.tokens for i in queue) + item.tokens > self.token_budget:
+            self._flush(key)
+            queue = self._pending.setdefault(key, [])
+        queue.append(item)
+        if len(queue) >= self.max_items:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.linger, self._flush, key)
+        return await item.future
+
+    def _flush(self, key: Tuple[str, Any]):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        items = self._pending.pop(key, None)
+        if not items:
+            return
+        task = asyncio.create_task(self._run_batch(items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, items: List[_SummaryItem]):
+        try:
+            await self._summarize_batch(items)
+        finally:
+            # the batch task was cancelled (shutdown, or during the fallbacks): never leave a caller waiting
+            for item in items:
+                if not item.future.done():
+                    item.future.set_exception(RuntimeError(f"Summary of {item.name} cancelled"))
+
+    async def _summarize_batch(self, items: List[_SummaryItem]):
+        summaries: Dict[int, str] = {}
+        try:
+            if len(items) > 1:
+                template = self.templates[items[0].language]
+                prompt = template.format(
+                    items="\n".join(item.format(i) for i, item in enumerate(items, 1))
+                )
+                answer = await self.llm_client.generate_answer(
+                    prompt, profile="summary_batch", prompt_prefix=template.prefix_key
+                )
+                summaries = parse_batch_summaries(answer, len(items))
+                self.batches += 1
+                self.batched_items += len(summaries)
+        except RequestCancelled as e:
+            for item in items:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning(f"Batched summary of {len(items)} items failed, summarizing one by one: {e}")
+
+        missing = [item for i, item in enumerate(items, 1) if i not in summaries]
+        if missing and len(items) > 1:
+            logger.debug(f"{len(missing)} of {len(items)} batched summaries missing, summarizing one by one")
+        for i, item in enumerate(items, 1):
+            if i in summaries and not item.future.done():
+                item.future.set_result(summaries[i])
+        self.fallbacks += len(missing) if len(items) > 1 else 0
+        await asyncio.gather(*[self._summarize_one(item) for item in missing])
+
+    async def _summarize_one(self, item: _SummaryItem):
+        try:
+            summary = await self.fallback(item.name, item.description_list, item.language)
+        except Exception as e:  # pylint: disable=broad-except
+            if not item.future.done():
+                item.future.set_exception(e)
+            return
+        if not item.future.done():
+            item.future.set_result(summary)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "batched_items": self.batched_items,
+            "fallbacks": self.fallbacks,
+        }
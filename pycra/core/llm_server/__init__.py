@@ -1,3 +1,3 @@
 from .llm_factory import LLMFactory
-from .client import OpenAIClient, BaseLLMClient
+from .client import OpenAIClient, MultiReplicaOpenAIClient, BaseLLMClient
 from .tokenizer import BaseTokenizer, Tokenizer
\ No newline at end of file
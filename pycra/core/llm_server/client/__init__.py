@@ -1,3 +1,17 @@
 from .base_llm_client import BaseLLMClient
 from .openai_client import OpenAIClient
-from .limitter import RPM, TPM
\ No newline at end of file
+from .replica_client import MultiReplicaOpenAIClient, Replica
+from .limitter import RPM, TPM, TokenBucket
+from .cache import BaseResponseCache, SQLiteResponseCache, compute_request_fingerprint
+from .concurrency import AIMDConcurrencyController
+from .lanes import (
+    llm_lane, with_llm_lane, current_lane, INTERACTIVE_LANE, BUILD_LANE, BULK_LANE, DEFAULT_LANE_WEIGHTS
+)
+from .single_flight import SingleFlight
+from .batch import (
+    BatchLLMClient, BaseBatchExecutor, OpenAIBatchExecutor, LocalBatchExecutor, BatchRequestError
+)
+from .hedging import HedgingPolicy
+from .usage import (
+    UsageCounter, UsageMeter, RequestUsage, usage_meter, usage_scope, usage_stage, current_usage
+)
@@ -1,10 +1,16 @@
 from __future__ import annotations
 
 import abc
+import asyncio
 import re
-from typing import Any, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 from pycra.core.llm_server.tokenizer import BaseTokenizer, Token
+from .concurrency import AIMDConcurrencyController
+from .profiles import DEFAULT_GENERATION_PROFILES, GenerationProfile
+from .scoring import candidate_probs, tokens_to_topk_row, topk_arrays
 
 
 class BaseLLMClient(abc.ABC):
@@ -22,6 +28,8 @@ class BaseLLMClient(abc.ABC):
         top_p: float = 0.95,
         top_k: int = 50,
         tokenizer: Optional[BaseTokenizer] = None,
+        profiles: Optional[Dict[str, GenerationProfile]] = None,
+        concurrency_controller: Optional[AIMDConcurrencyController] = None,
         **kwargs: Any,
     ):
         self.system_prompt = system_prompt
@@ -31,22 +39,61 @@ class BaseLLMClient(abc.ABC):
         self.top_p = top_p
         self.top_k = top_k
         self.tokenizer = tokenizer
+        self.profiles = {**DEFAULT_GENERATION_PROFILES, **(profiles or {})}
+        # shared by every client talking to the same backend, None disables the governor
+        self.concurrency_controller = concurrency_controller
 
         for k, v in kwargs.items():
             setattr(self, k, v)
 
+    def get_profile(self, name: Optional[str]) -> Optional[GenerationProfile]:
+        """Resolve a generation profile by name, None means the client defaults."""
+        if name is None:
+            return None
+        if name not in self.profiles:
+            raise ValueError(
+                f"Unknown generation profile: {name}. "
+                f"Available profiles are: {list(self.profiles.keys())}"
+            )
+        return self.profiles[name]
+
     @abc.abstractmethod
     async def generate_answer(
         self, text: str, history: Optional[List[str]] = None, **extra: Any
     ) -> str:
-        """Generate answer from the model."""
+        """
+        Generate answer from the model.
+        Pass ``profile=<name>`` to use the max_tokens / stop / sampling of a generation profile,
+        and ``prompt_prefix=<key>`` (see PrefixTemplate.prefix_key) to let prefix-aware scheduling
+        group requests sharing the same static prompt prefix.
+        """
         raise NotImplementedError
 
+    async def generate_answer_stream(
+        self,
+        text: str,
+        history: Optional[List[str]] = None,
+        stop_markers: Optional[List[str]] = None,
+        **extra: Any,
+    ) -> AsyncIterator[str]:
+        """
+        Stream the answer piece by piece.
+        If ``stop_markers`` are given, the output ends right before the first marker
+        and the generation is stopped as soon as it appears.
+        Backends without streaming support yield the whole answer at once.
+        """
+        answer = await self.generate_answer(text, history, **extra)
+        for marker in stop_markers or []:
+            index = answer.find(marker)
+            if index >= 0:
+                answer = answer[:index]
+        yield answer
+
     @abc.abstractmethod
     async def generate_topk_per_token(
         self, text: str, history: Optional[List[str]] = None, **extra: Any
     ) -> List[Token]:
-        """Generate top-k tokens for the next token prediction."""
+        """Generate top-k tokens for the next token prediction, ``top_k`` in extra overrides the client default."""
         raise NotImplementedError
 
     @abc.abstractmethod
@@ -56,6 +103,50 @@ class BaseLLMClient(abc.ABC):
         """Generate probabilities for each token in the input."""
         raise NotImplementedError
 
+    async def generate_topk_batch(
+        self, texts: Sequence[str], top_k: Optional[int] = None, max_concurrency: int = 16, **extra: Any
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k candidates of the next token for many prompts, as two (n_prompts, top_k) arrays
+        of token texts and probabilities.
+        The default sends one generate_topk_per_token request per prompt (asking for ``top_k``
+        candidates), at most ``max_concurrency`` at a time. Backends able to score several prompts
+        per request override it.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        if top_k:
+            extra["top_k"] = top_k
+
+        async def topk_row(text: str):
+            async with semaphore:
+                return tokens_to_topk_row(await self.generate_topk_per_token(text, **extra))
+
+        rows = await asyncio.gather(*[topk_row(text) for text in texts])
+        return topk_arrays(rows, top_k or max((len(row) for row in rows), default=0))
+
+    async def score_candidates(
+        self, texts: Sequence[str], candidates: Sequence[str] = ("yes", "no"), **extra: Any
+    ) -> np.ndarray:
+        """
+        Probability of each candidate answer (e.g. yes / no of a judge prompt) being the next token,
+        shape (n_prompts, n_candidates). Candidates missing from the top-k get 0.
+        """
+        tokens, probs = await self.generate_topk_batch(texts, **extra)
+        return candidate_probs(tokens, probs, candidates)
+
+    async def generate_inputs_prob_batch(
+        self, texts: Sequence[str], max_concurrency: int = 16, **extra: Any
+    ) -> List[np.ndarray]:
+        """Probabilities of the tokens of each text, one array per text (see generate_inputs_prob)."""
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def inputs_prob(text: str):
+            async with semaphore:
+                tokens = await self.generate_inputs_prob(text, **extra)
+                return np.array([t.prob for t in tokens], dtype=np.float64)
+
+        return list(await asyncio.gather(*[inputs_prob(text) for text in texts]))
+
     @staticmethod
     def filter_think_tags(text: str, think_tag: str = "think") -> str:
         """
@@ -0,0 +1,383 @@
+import abc
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import openai
+from openai import AsyncOpenAI
+
+from pycra.utils.logger import llm_logger as logger
+from .base_llm_client import BaseLLMClient
+from .cache import compute_request_fingerprint
+from .openai_client import OpenAIClient
+
+CHAT_COMPLETIONS_URL = "/v1/chat/completions"
+
+
+class BatchRequestError(Exception):
+    """A request of a batch failed or is missing from the batch output."""
+
+
+class BaseBatchExecutor(abc.ABC):
+    """Runs a JSONL file of requests in the OpenAI batch format and produces the output JSONL file."""
+
+    @abc.abstractmethod
+    async def submit(self, input_path: str) -> str:
+        """Submit the batch input file, return the batch id."""
+
+    @abc.abstractmethod
+    async def status(self, batch_id: str) -> str:
+        """OpenAI batch status: validating / in_progress / finalizing / completed / failed / expired / cancelled."""
+
+    @abc.abstractmethod
+    async def download(self, batch_id: str, output_path: str):
+        """Write the output (and error) lines of a finished batch to ``output_path``."""
+
+
+class OpenAIBatchExecutor(BaseBatchExecutor):
+    """Batch API of OpenAI (or any server implementing /v1/files and /v1/batches)."""
+
+    def __init__(self, client: AsyncOpenAI, completion_window: str = "24h"):
+        self.client = client
+        self.completion_window = completion_window
+
+    async def submit(self, input_path: str) -> str:
+        with open(input_path, "rb") as f:
+            input_file = await self.client.files.create(file=f, purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=CHAT_COMPLETIONS_URL,
+            completion_window=self.completion_window,
+        )
+        return batch.id
+
+    async def status(self, batch_id: str) -> str:
+        batch = await self.client.batches.retrieve(batch_id)
+        return batch.status
+
+    async def download(self, batch_id: str, output_path: str):
+        batch = await self.client.batches.retrieve(batch_id)
+        with open(output_path, "wb") as f:
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    content = await self.client.files.content(file_id)
+                    f.write(content.read())
+
+
+class LocalBatchExecutor(BaseBatchExecutor):
+    """
+    Stand-in batch endpoint running the requests of a batch file against an online client,
+    so the batch flow can be exercised offline or against a local lmdeploy / vLLM server.
+    """
+
+    def __init__(self, llm_client: OpenAIClient, max_concurrency: int = 16):
+        self.llm_client = llm_client
+        self.max_concurrency = max_concurrency
+        self._jobs: Dict[str, asyncio.Task] = {}
+        self._outputs: Dict[str, List[dict]] = {}
+
+    async def submit(self, input_path: str) -> str:
+        requests = _read_jsonl(input_path)
+        batch_id = f"local_batch_{uuid.uuid4().hex}"
+        self._jobs[batch_id] = asyncio.create_task(self._run(batch_id, requests))
+        return batch_id
+
+    async def _run_one(self, semaphore: asyncio.Semaphore, request: dict) -> dict:
+        body = dict(request["body"])
+        body.pop("model", None)
+        async with semaphore:
+            try:
+                completion = await self.llm_client._create_completion(body)  # pylint: disable=W0212
+            except openai.APIStatusError as e:
+                return _error_line(request["custom_id"], e.status_code, str(e))
+            except Exception as e:  # pylint: disable=broad-except
+                return _error_line(request["custom_id"], None, str(e))
+        return {
+            "id": f"batch_req_{uuid.uuid4().hex}",
+            "custom_id": request["custom_id"],
+            "response": {"status_code": 200, "request_id": completion.id, "body": completion.model_dump()},
+            "error": None,
+        }
+
+    async def _run(self, batch_id: str, requests: List[dict]):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._outputs[batch_id] = await asyncio.gather(
+            *[self._run_one(semaphore, request) for request in requests]
+        )
+
+    async def status(self, batch_id: str) -> str:
+        job = self._jobs.get(batch_id)
+        if job is None:
+            # lost with the process that submitted it
+            return "expired"
+        if not job.done():
+            return "in_progress"
+        return "failed" if job.exception() else "completed"
+
+    async def download(self, batch_id: str, output_path: str):
+        with open(output_path, "w", encoding="utf-8") as f:
+            for line in self._outputs.pop(batch_id, []):
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        self._jobs.pop(batch_id, None)
+
+
+def _read_jsonl(path: str) -> List[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _error_line(custom_id: str, status_code: Optional[int], message: str) -> dict:
+    return {
+        "id": f"batch_req_{uuid.uuid4().hex}",
+        "custom_id": custom_id,
+        "response": None if status_code is None else {"status_code": status_code, "body": None},
+        "error": {"code": str(status_code or "error"), "message": message},
+    }
+
+
+class BatchLLMClient(OpenAIClient):
+    """
+    OpenAIClient sending its requests through a batch endpoint instead of one by one.
+
+    Requests are held back until no new request arrived for ``flush_interval`` seconds
+    (every pipeline coroutine is waiting for the LLM) or ``max_batch_size`` requests are pending,
+    then written to a JSONL file in the OpenAI batch format and submitted.
+    The callers wait until the batch is finished, so KgBuilder and the Self-QA generators run
+    unchanged, one batch per dependent stage (extraction, gleaning, summaries, ...).
+
+    Everything lives in ``work_dir``: the input / output file of every batch and ``state.json``
+    with the submitted batches. A restarted process loads the finished results (a re-run of the
+    pipeline replays them without a request) and goes on polling the unfinished batches instead
+    of submitting their requests again. Requests of failed or expired batches are submitted again
+    up to ``max_attempts`` times.
+    """
+
+    FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+    def __init__(
+        self,
+        *,
+        executor: Optional[BaseBatchExecutor] = None,
+        work_dir: str = "cra/batch",
+        flush_interval: float = 2.0,
+        max_batch_size: int = 50000,
+        poll_interval: float = 30.0,
+        max_attempts: int = 2,
+        **kwargs: Any,
+    ):
+        self.work_dir = work_dir
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        super().__init__(**kwargs)
+        self.executor = executor or OpenAIBatchExecutor(self.client)
+        # batch files hold chat completions only, scoring prompts go one chat request each
+        self.scoring_endpoint = "chat"
+
+        # custom_id -> output line of finished requests
+        self._results: Dict[str, dict] = {}
+        # custom_id -> future of the callers waiting for the request
+        self._futures: Dict[str, asyncio.Future] = {}
+        # custom_id -> request line not submitted yet
+        self._pending: Dict[str, dict] = {}
+        # custom_ids of submitted batches that have not finished yet
+        self._submitted: Dict[str, str] = {}
+        self._attempts: Dict[str, int] = {}
+        self._last_enqueue = 0.0
+        self._flush_task: Optional[asyncio.Task] = None
+        self._batch_tasks: List[asyncio.Task] = []
+        self._state: Dict[str, Any] = {"batches": {}}
+        self._resumed = False
+
+        os.makedirs(self.work_dir, exist_ok=True)
+        self._load_state()
+
+    @property
+    def _state_path(self) -> str:
+        return os.path.join(self.work_dir, "state.json")
+
+    def _load_state(self):
+        if os.path.exists(self._state_path):
+            with open(self._state_path, "r", encoding="utf-8") as f:
+                self._state = json.load(f)
+        for batch in self._state["batches"].values():
+            if batch["status"] == "completed" and os.path.exists(batch["output"]):
+                self._load_output(batch["output"])
+        if self._results:
+            logger.info("Loaded %d batch results from %s", len(self._results), self.work_dir)
+
+    def _save_state(self):
+        tmp_path = self._state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._state_path)
+
+    def _load_output(self, output_path: str):
+        for result in _read_jsonl(output_path):
+            self._results[result["custom_id"]] = result
+
+    def _custom_id(self, kwargs: Dict) -> str:
+        return compute_request_fingerprint(
+            self.model_name, kwargs["messages"], **{k: v for k, v in kwargs.items() if k != "messages"}
+        )
+
+    @staticmethod
+    def _parse_result(custom_id: str, result: Optional[dict]) -> openai.ChatCompletion:
+        response = (result or {}).get("response") or {}
+        if result is None or result.get("error") or response.get("status_code") != 200:
+            error = (result or {}).get("error") or {"message": "missing from the batch output"}
+            raise BatchRequestError(f"Batch request {custom_id} failed: {error}")
+        return openai.types.chat.ChatCompletion.model_validate(response["body"])
+
+    def _resolve(self, custom_id: str, result: Optional[dict]):
+        future = self._futures.pop(custom_id, None)
+        if future is None or future.done():
+            return
+        try:
+            future.set_result(self._parse_result(custom_id, result))
+        except BatchRequestError as e:
+            future.set_exception(e)
+
+    def _enqueue(self, request: dict):
+        self._pending[request["custom_id"]] = request
+        self._last_enqueue = time.monotonic()
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _create_completion(
+        self, kwargs: Dict, used_replicas: Optional[set] = None
+    ) -> openai.ChatCompletion:
+        if kwargs.get("stream"):
+            raise ValueError("BatchLLMClient does not support streaming requests")
+        if "prompt" in kwargs:
+            raise ValueError("BatchLLMClient only batches chat completion requests")
+        self._resume_batches()
+        custom_id = self._custom_id(kwargs)
+        if custom_id in self._results:
+            try:
+                return self._parse_result(custom_id, self._results[custom_id])
+            except BatchRequestError:
+                # failed in an earlier batch, submit it again
+                del self._results[custom_id]
+
+        future = self._futures.get(custom_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._futures[custom_id] = future
+            if custom_id not in self._submitted and custom_id not in self._pending:
+                self._enqueue(
+                    {
+                        "custom_id": custom_id,
+                        "method": "POST",
+                        "url": CHAT_COMPLETIONS_URL,
+                        "body": {"model": self.model_name, **kwargs},
+                    }
+                )
+        # several callers may wait for the same request
+        return await asyncio.shield(future)
+
+    async def _flush_loop(self):
+        while self._pending:
+            idle = time.monotonic() - self._last_enqueue
+            if idle < self.flush_interval and len(self._pending) < self.max_batch_size:
+                await asyncio.sleep(self.flush_interval - idle)
+                continue
+            requests = list(self._pending.values())[: self.max_batch_size]
+            for request in requests:
+                del self._pending[request["custom_id"]]
+            self._batch_tasks.append(asyncio.create_task(self._submit(requests)))
+
+    async def _submit(self, requests: List[dict]):
+        name = f"batch_{time.strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        input_path = os.path.join(self.work_dir, f"{name}.input.jsonl")
+        with open(input_path, "w", encoding="utf-8") as f:
+            for request in requests:
+                f.write(json.dumps(request, ensure_ascii=False) + "\n")
+        custom_ids = [r["custom_id"] for r in requests]
+        for custom_id in custom_ids:
+            self._submitted[custom_id] = input_path
+            self._attempts[custom_id] = self._attempts.get(custom_id, 0) + 1
+        try:
+            batch_id = await self.executor.submit(input_path)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error("Submitting batch %s failed: %s", input_path, e)
+            for custom_id in custom_ids:
+                del self._submitted[custom_id]
+                self._resolve(custom_id, {"custom_id": custom_id, "error": {"message": str(e)}})
+            return
+        logger.info("Submitted batch %s with %d requests", batch_id, len(requests))
+        self._state["batches"][batch_id] = {
+            "input": input_path,
+            "output": os.path.join(self.work_dir, f"{name}.output.jsonl"),
+            "custom_ids": custom_ids,
+            "status": "submitted",
+        }
+        self._save_state()
+        await self._wait_batch(batch_id)
+
+    async def _wait_batch(self, batch_id: str):
+        batch = self._state["batches"][batch_id]
+        status = await self.executor.status(batch_id)
+        while status not in self.FINAL_STATUSES:
+            await asyncio.sleep(self.poll_interval)
+            status = await self.executor.status(batch_id)
+        logger.info("Batch %s finished with status %s", batch_id, status)
+
+        if status == "completed":
+            await self.executor.download(batch_id, batch["output"])
+            self._load_output(batch["output"])
+        batch["status"] = status
+        self._save_state()
+
+        requests = None
+        for custom_id in batch["custom_ids"]:
+            self._submitted.pop(custom_id, None)
+            result = self._results.get(custom_id)
+            failed = result is None or result.get("error")
+            if failed and custom_id in self._futures and self._attempts.get(custom_id, 1) < self.max_attempts:
+                if requests is None:
+                    requests = {r["custom_id"]: r for r in _read_jsonl(batch["input"])}
+                self._results.pop(custom_id, None)
+                self._enqueue(requests[custom_id])
+                continue
+            self._resolve(custom_id, result)
+
+    def _resume_batches(self):
+        """Attach to the batches submitted by a previous process that have not finished yet."""
+        if self._resumed:
+            return
+        self._resumed = True
+        for batch_id, batch in self._state["batches"].items():
+            if batch["status"] != "submitted":
+                continue
+            logger.info("Resuming batch %s with %d requests", batch_id, len(batch["custom_ids"]))
+            for custom_id in batch["custom_ids"]:
+                self._submitted[custom_id] = batch["input"]
+                self._attempts[custom_id] = self._attempts.get(custom_id, 0) + 1
+            self._batch_tasks.append(asyncio.create_task(self._wait_batch(batch_id)))
+
+    async def generate_answer_stream(
+        self,
+        text: str,
+        history: Optional[List[str]] = None,
+        stop_markers: Optional[List[str]] = None,
+        **extra: Any,
+    ) -> AsyncIterator[str]:
+        # batches have no streaming, answer at once like any backend without streaming support
+        async for piece in BaseLLMClient.generate_answer_stream(
+            self, text, history, stop_markers=stop_markers, **extra
+        ):
+            yield piece
+
+    def batch_stats(self) -> Dict[str, Any]:
+        return {
+            "results": len(self._results),
+            "pending": len(self._pending),
+            "submitted": len(self._submitted),
+            "waiting": len(self._futures),
+            "batches": {k: v["status"] for k, v in self._state["batches"].items()},
+        }
@@ -0,0 +1,213 @@
+import abc
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from pycra.utils.logger import llm_logger as logger
+
+
+def compute_request_fingerprint(
+    model_name: str,
+    messages: List[Dict[str, Any]],
+    temperature: Optional[float] = None,
+    top_p: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    seed: Optional[int] = None,
+    **extra: Any,
+) -> str:
+    """
+    Content-addressed key of a chat completion request.
+    Any additional request parameter that changes the output (stop, response_format, ...)
+    should be passed through ``extra`` so that it becomes part of the key.
+    """
+    payload = {
+        "model": model_name,
+        "messages": messages,
+        "temperature": temperature,
+        "top_p": top_p,
+        "max_tokens": max_tokens,
+        "seed": seed,
+    }
+    payload.update({k: v for k, v in extra.items() if v is not None})
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class BaseResponseCache(abc.ABC):
+    """
+    Response cache interface used by the LLM clients.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        """Return the cached response of ``key`` or None."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: str) -> None:
+        """Store the response of ``key``."""
+        raise NotImplementedError
+
+    async def clear(self) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class SQLiteResponseCache(BaseResponseCache):
+    """
+    Persistent on-disk response cache backed by SQLite.
+
+    - entries older than ``ttl_seconds`` are treated as misses and dropped (ttl <= 0 disables expiry)
+    - when the total payload size exceeds ``max_size_bytes`` the least recently used entries are evicted
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_size_bytes: int = 512 * 1024 * 1024,
+    ):
+        super().__init__()
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_size_bytes = max_size_bytes
+
+        cache_dir = os.path.dirname(os.path.abspath(path))
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_response_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_response_cache_accessed "
+            "ON llm_response_cache (accessed_at)"
+        )
+        self._total_size = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM llm_response_cache"
+        ).fetchone()[0]
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, size, created_at FROM llm_response_cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            value, size, created_at = row
+            if self.ttl_seconds > 0 and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_response_cache WHERE key = ?", (key,))
+                self._total_size -= size
+                self.evictions += 1
+                return None
+            self._conn.execute(
+                "UPDATE llm_response_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            return value
+
+    def _set(self, key: str, value: str) -> None:
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM llm_response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_response_cache (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._total_size += size - (old[0] if old else 0)
+            if self._total_size > self.max_size_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Drop expired entries first, then the least recently used ones until the cache fits."""
+        if self.ttl_seconds > 0:
+            cur = self._conn.execute(
+                "DELETE FROM llm_response_cache WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,),
+            )
+            self.evictions += max(cur.rowcount, 0)
+        self._total_size = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM llm_response_cache"
+        ).fetchone()[0]
+        if self._total_size <= self.max_size_bytes:
+            return
+
+        rows = self._conn.execute(
+            "SELECT key, size FROM llm_response_cache ORDER BY accessed_at ASC"
+        )
+        to_delete = []
+        excess = self._total_size - self.max_size_bytes
+        for key, size in rows:
+            if excess <= 0:
+                break
+            to_delete.append((key,))
+            excess -= size
+        self._conn.executemany("DELETE FROM llm_response_cache WHERE key = ?", to_delete)
+        self.evictions += len(to_delete)
+        self._total_size = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM llm_response_cache"
+        ).fetchone()[0]
+        logger.debug("LLM response cache evicted %d entries", len(to_delete))
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await asyncio.to_thread(self._get, key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        await asyncio.to_thread(self._set, key, value)
+
+    async def clear(self) -> None:
+        def _clear():
+            with self._lock:
+                self._conn.execute("DELETE FROM llm_response_cache")
+                self._total_size = 0
+
+        await asyncio.to_thread(_clear)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["size_bytes"] = self._total_size
+        stats["max_size_bytes"] = self.max_size_bytes
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,278 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional
+
+from pycra.utils.logger import llm_logger as logger
+from .lanes import DEFAULT_LANE, DEFAULT_LANE_WEIGHTS
+
+
+# latencies observed in a class before a rising latency counts as overload
+_MIN_BASELINE_SAMPLES = 16
+
+
+@dataclass
+class _Waiter:
+    future: asyncio.Future
+    lane: str = DEFAULT_LANE
+    prefix_key: Optional[str] = None
+    # virtual start / finish time of weighted fair queuing
+    start_tag: float = 0.0
+    finish_tag: float = 0.0
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class _Lane:
+    weight: float
+    waiters: Deque[_Waiter] = field(default_factory=deque)
+    last_finish_tag: float = 0.0
+    dispatched: int = 0
+    total_wait_time: float = 0.0
+    max_wait_time: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "weight": self.weight,
+            "queue_depth": len(self.waiters),
+            "dispatched": self.dispatched,
+            "total_wait_time": self.total_wait_time,
+            "avg_wait_time": self.total_wait_time / self.dispatched if self.dispatched else 0.0,
+            "max_wait_time": self.max_wait_time,
+        }
+
+
+class AIMDConcurrencyController:
+    """
+    Client-side concurrency governor in front of every LLM call.
+
+    The number of requests allowed in flight is adjusted with additive-increase /
+    multiplicative-decrease:
+        - every successful call adds ``increase / limit`` (about +increase per round trip of the whole window)
+        - an overload signal (429, 503, timeout) multiplies the limit by ``decrease_factor``
+        - a latency rising above ``latency_tolerance`` times the baseline of its latency class
+          is treated as an overload signal as well, so the limit settles at the saturation point
+          of the backend instead of at the point where it starts rejecting requests; the baseline
+          is the median of the last ``latency_window`` latencies, so the usual spread of answer
+          lengths is part of it and a single short answer does not set it
+    Decreases are applied at most once per ``cooldown`` seconds so that one burst of failures
+    only halves the window once.
+
+    Queued requests wait in priority lanes (see lanes.py) served by weighted fair queuing:
+    while several lanes are backlogged each one gets slots in proportion to its weight,
+    an idle lane does not bank credit, and a lane alone in the queue gets every slot.
+
+    With ``group_by_prefix`` a freed slot goes to the oldest request of the chosen lane sharing
+    the prompt prefix of the last dispatched one, so requests hitting the same prefix cache of the
+    backend run back to back. The lane head is never bypassed once it waited ``prefix_max_wait``.
+    """
+
+    def __init__(
+        self,
+        *,
+        initial_limit: int = 16,
+        min_limit: int = 1,
+        max_limit: int = 256,
+        increase: float = 1.0,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 2.0,
+        ewma_alpha: float = 0.2,
+        latency_window: int = 256,
+        cooldown: float = 1.0,
+        group_by_prefix: bool = False,
+        prefix_max_wait: float = 0.5,
+        lane_weights: Optional[Dict[str, float]] = None,
+    ):
+        if not 0 < decrease_factor < 1:
+            raise ValueError("decrease_factor must be in (0, 1)")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.ewma_alpha = ewma_alpha
+        self.latency_window = latency_window
+        self.cooldown = cooldown
+        self.group_by_prefix = group_by_prefix
+        self.prefix_max_wait = prefix_max_wait
+        self.lane_weights = {**DEFAULT_LANE_WEIGHTS, **(lane_weights or {})}
+
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._in_flight = 0
+        self._lanes: Dict[str, _Lane] = {}
+        self._queued = 0
+        self._virtual_time = 0.0
+        self._last_decrease = 0.0
+        self._last_prefix: Optional[str] = None
+        # per latency class (e.g. generation profile): smoothed latency, recent latencies and their median
+        self._latency: Dict[str, float] = {}
+        self._samples: Dict[str, Deque[float]] = {}
+        self._baseline: Dict[str, float] = {}
+
+        self.successes = 0
+        self.overloads = 0
+        self.decreases = 0
+        self.total_wait_time = 0.0
+        self.prefix_grouped = 0
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    def _lane(self, name: str) -> _Lane:
+        lane = self._lanes.get(name)
+        if lane is None:
+            lane = _Lane(weight=float(self.lane_weights.get(name, 1.0)))
+            self._lanes[name] = lane
+        return lane
+
+    async def acquire(self, prefix_key: Optional[str] = None, lane: Optional[str] = None):
+        lane_state = self._lane(lane or DEFAULT_LANE)
+        if self._in_flight < self.limit and not self._queued:
+            self._in_flight += 1
+            self._last_prefix = prefix_key or self._last_prefix
+            lane_state.dispatched += 1
+            return
+        start_tag = max(self._virtual_time, lane_state.last_finish_tag)
+        waiter = _Waiter(
+            future=asyncio.get_running_loop().create_future(),
+            lane=lane or DEFAULT_LANE,
+            prefix_key=prefix_key,
+            start_tag=start_tag,
+            finish_tag=start_tag + 1.0 / max(lane_state.weight, 1e-6),
+        )
+        lane_state.last_finish_tag = waiter.finish_tag
+        lane_state.waiters.append(waiter)
+        self._queued += 1
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # the slot was granted right before the cancellation arrived
+                self.release()
+            else:
+                try:
+                    lane_state.waiters.remove(waiter)
+                    self._queued -= 1
+                except ValueError:
+                    pass
+            raise
+        waited = time.monotonic() - waiter.enqueued_at
+        self.total_wait_time += waited
+        lane_state.total_wait_time += waited
+        lane_state.max_wait_time = max(lane_state.max_wait_time, waited)
+
+    def try_acquire(self, lane: Optional[str] = None) -> bool:
+        """Take a slot only if one is free right now and nobody is queued (e.g. for a hedge)."""
+        if self._in_flight >= self.limit or self._queued:
+            return False
+        self._in_flight += 1
+        self._lane(lane or DEFAULT_LANE).dispatched += 1
+        return True
+
+    def release(self):
+        self._in_flight -= 1
+        self._wake_waiters()
+
+    def _next_waiter(self) -> _Waiter:
+        # weighted fair queuing: the lane whose head has the smallest virtual finish time
+        lane = min(
+            (lane for lane in self._lanes.values() if lane.waiters),
+            key=lambda lane: lane.waiters[0].finish_tag,
+        )
+        head = lane.waiters[0]
+        chosen = head
+        if (
+            self.group_by_prefix
+            and self._last_prefix is not None
+            and head.prefix_key != self._last_prefix
+            and time.monotonic() - head.enqueued_at < self.prefix_max_wait
+        ):
+            for waiter in lane.waiters:
+                if waiter.prefix_key == self._last_prefix and not waiter.future.done():
+                    chosen = waiter
+                    self.prefix_grouped += 1
+                    break
+        lane.waiters.remove(chosen)
+        self._queued -= 1
+        self._virtual_time = max(self._virtual_time, head.start_tag)
+        return chosen
+
+    def _wake_waiters(self):
+        while self._queued and self._in_flight < self.limit:
+            waiter = self._next_waiter()
+            if waiter.future.done():
+                continue
+            self._in_flight += 1
+            self._last_prefix = waiter.prefix_key or self._last_prefix
+            self._lanes[waiter.lane].dispatched += 1
+            waiter.future.set_result(None)
+
+    def on_success(self, latency: float, latency_class: str = "default"):
+        self.successes += 1
+        smoothed = self._latency.get(latency_class)
+        smoothed = latency if smoothed is None else (
+            self.ewma_alpha * latency + (1 - self.ewma_alpha) * smoothed
+        )
+        self._latency[latency_class] = smoothed
+
+        samples = self._samples.get(latency_class)
+        if samples is None:
+            samples = self._samples[latency_class] = deque(maxlen=max(self.latency_window, 1))
+        samples.append(latency)
+        # a permanently slower backend moves the median within one window, it is not punished forever
+        baseline = self._baseline[latency_class] = sorted(samples)[len(samples) // 2]
+
+        if len(samples) >= min(_MIN_BASELINE_SAMPLES, samples.maxlen) and smoothed > baseline * self.latency_tolerance:
+            self._decrease("latency %.2fs > %.1fx baseline %.2fs" % (smoothed, self.latency_tolerance, baseline))
+        else:
+            self._limit = min(self.max_limit, self._limit + self.increase / max(self._limit, 1.0))
+            self._wake_waiters()
+
+    def on_overload(self, reason: str = "overload"):
+        self.overloads += 1
+        self._decrease(reason)
+
+    def _decrease(self, reason: str):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        old_limit = self.limit
+        self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+        self.decreases += 1
+        logger.info("LLM concurrency limit %d -> %d (%s)", old_limit, self.limit, reason)
+
+    @asynccontextmanager
+    async def slot(self, prefix_key: Optional[str] = None, lane: Optional[str] = None):
+        """Hold one concurrency slot for the duration of the block."""
+        await self.acquire(prefix_key, lane)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "queue_depth": self._queued,
+            "successes": self.successes,
+            "overloads": self.overloads,
+            "decreases": self.decreases,
+            "total_wait_time": self.total_wait_time,
+            "prefix_grouped": self.prefix_grouped,
+            "latency": dict(self._latency),
+            "latency_baseline": dict(self._baseline),
+            "lanes": {name: lane.to_dict() for name, lane in self._lanes.items()},
+        }
@@ -0,0 +1,82 @@
+import math
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+
+class HedgingPolicy:
+    """
+    When to send a duplicate (hedge) of a slow LLM request.
+
+    A request still running after the ``percentile`` latency of its latency class (generation
+    profile) gets a hedge, the first response wins and the other one is cancelled.
+    Until ``min_samples`` latencies of a class are known no hedge is sent for it.
+    Hedges are capped to ``max_extra_load`` of the requests, so a backend that is slow across
+    the board does not get its load multiplied.
+    """
+
+    def __init__(
+        self,
+        *,
+        percentile: float = 0.95,
+        max_extra_load: float = 0.05,
+        min_delay: float = 0.5,
+        window: int = 200,
+        min_samples: int = 20,
+    ):
+        if not 0 < percentile < 1:
+            raise ValueError("percentile must be in (0, 1)")
+        self.percentile = percentile
+        self.max_extra_load = max_extra_load
+        self.min_delay = min_delay
+        self.window = window
+        self.min_samples = min_samples
+        self._latencies: Dict[str, Deque[float]] = {}
+
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.budget_denied = 0
+
+    def record(self, latency: float, latency_class: str = "default"):
+        samples = self._latencies.get(latency_class)
+        if samples is None:
+            samples = self._latencies[latency_class] = deque(maxlen=self.window)
+        samples.append(latency)
+
+    def delay(self, latency_class: str = "default") -> Optional[float]:
+        """Seconds to wait before hedging a request of ``latency_class``, None to never hedge it."""
+        self.requests += 1
+        return self.delay_of(latency_class)
+
+    def delay_of(self, latency_class: str) -> Optional[float]:
+        """Current hedge delay of ``latency_class`` without counting a request."""
+        samples = self._latencies.get(latency_class)
+        if samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, math.ceil(self.percentile * len(ordered)) - 1)
+        return max(self.min_delay, ordered[index])
+
+    def try_hedge(self) -> bool:
+        """Take one hedge from the extra-load budget."""
+        if self.hedges + 1 > self.max_extra_load * self.requests:
+            self.budget_denied += 1
+            return False
+        self.hedges += 1
+        return True
+
+    def record_win(self):
+        self.hedge_wins += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_rate": self.hedges / self.requests if self.requests else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "win_rate": self.hedge_wins / self.hedges if self.hedges else 0.0,
+            "budget_denied": self.budget_denied,
+            "delays": {
+                latency_class: self.delay_of(latency_class) for latency_class in self._latencies
+            },
+        }
@@ -0,0 +1,53 @@
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+INTERACTIVE_LANE = "interactive"
+BUILD_LANE = "build"
+BULK_LANE = "bulk"
+DEFAULT_LANE = BUILD_LANE
+
+# share of the LLM capacity of each lane when all of them have queued requests
+DEFAULT_LANE_WEIGHTS: Dict[str, float] = {
+    INTERACTIVE_LANE: 8.0,
+    BUILD_LANE: 4.0,
+    BULK_LANE: 1.0,
+}
+
+_current_lane: ContextVar[Optional[str]] = ContextVar("pycra_llm_lane", default=None)
+
+
+def current_lane() -> str:
+    """Lane of the LLM calls made from the current task."""
+    return _current_lane.get() or DEFAULT_LANE
+
+
+@contextmanager
+def llm_lane(lane: str, override: bool = True):
+    """
+    Tag the LLM calls made inside the block (and the tasks it spawns) with ``lane``.
+    With ``override=False`` a lane already set by the caller, e.g. the API route, is kept.
+    """
+    if not override and _current_lane.get() is not None:
+        yield
+        return
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+def with_llm_lane(lane: str, override: bool = False):
+    """Decorator form of ``llm_lane`` for async service entry points."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with llm_lane(lane, override=override):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -1,85 +1,95 @@
 import asyncio
 import time
-from datetime import datetime, timedelta
+from typing import Optional
 
 from pycra.utils.logger import llm_logger as logger
 
+
+class TokenBucket:
+    """
+    Async token bucket, continuously refilled at ``rate`` tokens per second up to ``capacity``.
+
+    Waiters are released in FIFO order: ``asyncio.Lock`` wakes waiters in the order they arrived,
+    and the holder sleeps just long enough for the tokens it needs to accumulate.
+    The balance may go negative after ``refund`` with a negative amount, which makes
+    the following waiters pay the debt back. The bucket starts with ``initial`` tokens (full by default).
+    """
+
+    def __init__(self, capacity: float, rate: float, initial: Optional[float] = None):
+        if capacity <= 0 or rate <= 0:
+            raise ValueError("capacity and rate of the token bucket must be positive")
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self._tokens = float(capacity) if initial is None else min(float(initial), self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """
+        Take ``amount`` tokens, waiting until they are available.
+        Requests larger than the capacity are clamped so they can eventually pass.
+
+        :return: seconds spent waiting
+        """
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        async with self._lock:
+            self._refill()
+            while self._tokens < amount:
+                delay = (amount - self._tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self._tokens -= amount
+        return waited
+
+    def refund(self, amount: float):
+        """Give back (positive) or additionally charge (negative) ``amount`` tokens."""
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + amount)
+
+
 class RPM:
+    """Requests-per-minute limiter."""
+
     def __init__(self, rpm: int = 1000):
         self.rpm = rpm
-        self.record = {"rpm_slot": self.get_minute_slot(), "counter": 0}
-
-    @staticmethod
-    def get_minute_slot():
-        current_time = time.time()
-        dt_object = datetime.fromtimestamp(current_time)
-        total_minutes_since_midnight = dt_object.hour * 60 + dt_object.minute
-        return total_minutes_since_midnight
+        # a full bucket plus a minute of refill would admit twice the limit in the first minute
+        self.bucket = TokenBucket(capacity=rpm, rate=rpm / 60.0, initial=rpm / 60.0)
 
     async def wait(self, silent=False):
-        current = time.time()
-        dt_object = datetime.fromtimestamp(current)
-        minute_slot = self.get_minute_slot()
-
-        if self.record["rpm_slot"] == minute_slot:
-            # check RPM exceed
-            if self.record["counter"] >= self.rpm:
-                # wait until next minute
-                next_minute = dt_object.replace(second=0, microsecond=0) + timedelta(
-                    minutes=1
-                )
-                _next = next_minute.timestamp()
-                sleep_time = abs(_next - current)
-                if not silent:
-                    logger.info("RPM sleep %s", sleep_time)
-                await asyncio.sleep(sleep_time)
-
-                self.record = {"rpm_slot": self.get_minute_slot(), "counter": 0}
-        else:
-            self.record = {"rpm_slot": self.get_minute_slot(), "counter": 0}
-        self.record["counter"] += 1
-
-        if not silent:
-            logger.debug(self.record)
+        waited = await self.bucket.acquire(1)
+        if waited > 0 and not silent:
+            logger.info("RPM sleep %.3f", waited)
 
 
 class TPM:
+    """Tokens-per-minute limiter."""
+
     def __init__(self, tpm: int = 20000):
         self.tpm = tpm
-        self.record = {"tpm_slot": self.get_minute_slot(), "counter": 0}
-
-    @staticmethod
-    def get_minute_slot():
-        current_time = time.time()
-        dt_object = datetime.fromtimestamp(current_time)
-        total_minutes_since_midnight = dt_object.hour * 60 + dt_object.minute
-        return total_minutes_since_midnight
+        self.bucket = TokenBucket(capacity=tpm, rate=tpm / 60.0, initial=tpm / 60.0)
 
     async def wait(self, token_count, silent=False):
-        current = time.time()
-        dt_object = datetime.fromtimestamp(current)
-        minute_slot = self.get_minute_slot()
-
-        # get next slot, skip
-        if self.record["tpm_slot"] != minute_slot:
-            self.record = {"tpm_slot": minute_slot, "counter": token_count}
-            return
-
-        # check RPM exceed
-        old_counter = self.record["counter"]
-        self.record["counter"] += token_count
-        if self.record["counter"] > self.tpm:
-            logger.info("Current TPM: %s, limit: %s", old_counter, self.tpm)
-            # wait until next minute
-            next_minute = dt_object.replace(second=0, microsecond=0) + timedelta(
-                minutes=1
-            )
-            _next = next_minute.timestamp()
-            sleep_time = abs(_next - current)
-            logger.warning("TPM limit exceeded, wait %s seconds", sleep_time)
-            await asyncio.sleep(sleep_time)
-
-            self.record = {"tpm_slot": self.get_minute_slot(), "counter": token_count}
-
-        if not silent:
-            logger.debug(self.record)
+        waited = await self.bucket.acquire(token_count)
+        if waited > 0 and not silent:
+            logger.info("TPM sleep %.3f for %s tokens, limit: %s", waited, token_count, self.tpm)
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: int):
+        """
+        Correct the reservation made by ``wait`` with the usage reported by the backend.
+        Over-estimation is returned to the bucket, under-estimation is charged.
+        """
+        self.bucket.refund(estimated_tokens - actual_tokens)
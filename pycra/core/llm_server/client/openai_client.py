@@ -1,6 +1,12 @@
+import asyncio
 import math
-from typing import Any, Dict, List, Optional
+import time
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
 
+import httpx
+import numpy as np
 import openai
 from openai import APIConnectionError, APITimeoutError, AsyncOpenAI, RateLimitError
 from tenacity import (
@@ -12,7 +18,15 @@ from tenacity import (
 
 from .base_llm_client import BaseLLMClient
 from pycra.core.llm_server.tokenizer import Token
+from pycra.utils.logger import llm_logger as logger
+from pycra.utils.request_context import check_request
+from .cache import BaseResponseCache, compute_request_fingerprint
+from .hedging import HedgingPolicy
+from .lanes import current_lane
 from .limitter import RPM, TPM
+from .scoring import completion_prompt_tokens, completion_topk_row, topk_arrays
+from .single_flight import SingleFlight
+from .usage import UsageCounter, usage_meter
 
 
 def get_top_response_tokens(response: openai.ChatCompletion) -> List[Token]:
@@ -41,6 +55,15 @@ class OpenAIClient(BaseLLMClient):
         request_limit: bool = False,
         rpm: Optional[RPM] = None,
         tpm: Optional[TPM] = None,
+        cache: Optional[BaseResponseCache] = None,
+        cache_nondeterministic: bool = False,
+        stream_usage: bool = True,
+        single_flight: Optional[SingleFlight] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+        hedging: Optional[HedgingPolicy] = None,
+        scoring_endpoint: str = "chat",
+        scoring_batch_size: int = 32,
+        scoring_concurrency: int = 16,
         **kwargs: Any,
     ):
         super().__init__(**kwargs)
@@ -51,42 +74,247 @@ class OpenAIClient(BaseLLMClient):
         self.seed = seed
         self.topk_per_token = topk_per_token
 
-        self.token_usage: list = []
+        # usage totals of this client, per profile / stage / request see client.usage
+        self.usage = UsageCounter()
         self.request_limit = request_limit
         self.rpm = rpm or RPM()
         self.tpm = tpm or TPM()
 
+        # response cache, by default only greedy / seeded requests are served from it
+        self.cache = cache
+        self.cache_nondeterministic = cache_nondeterministic
+        # ask for the usage chunk at the end of streams (stream_options.include_usage)
+        self.stream_usage = stream_usage
+        # coalesce concurrent identical requests (same rule as the cache: deterministic ones only)
+        self.single_flight = single_flight
+        # shared pooled transport (see llm_server.transport), None lets the SDK create its own
+        self.http_client = http_client
+        # duplicate slow requests (opt-in), see HedgingPolicy
+        self.hedging = hedging
+        # batched scoring (generate_topk_batch): "completions" sends up to scoring_batch_size raw
+        # prompts per legacy text completion request, "chat" one chat request per prompt
+        self.scoring_endpoint = scoring_endpoint
+        self.scoring_batch_size = scoring_batch_size
+        self.scoring_concurrency = scoring_concurrency
+
         self.__post_init__()
 
     def __post_init__(self):
         assert self.api_key is not None, "Please provide api key to access openai api."
         self.client = AsyncOpenAI(
-            api_key=self.api_key or "dummy", base_url=self.base_url
+            api_key=self.api_key or "dummy", base_url=self.base_url, http_client=self.http_client
         )
 
-    def _pre_generate(self, text: str, history: List[str]) -> Dict:
+    def _pre_generate(
+        self, text: str, history: List[str], profile: Optional[str] = None
+    ) -> Dict:
         kwargs = {
             "temperature": self.temperature,
             "top_p": self.top_p,
             "max_tokens": self.max_tokens,
         }
+        generation_profile = self.get_profile(profile)
+        if generation_profile is not None:
+            generation_profile.apply(kwargs)
         if self.seed:
             kwargs["seed"] = self.seed
         if self.json_mode:
             kwargs["response_format"] = {"type": "json_object"}
 
+        # static content first, so consecutive calls share the longest possible prompt prefix
         messages = []
         if self.system_prompt:
             messages.append({"role": "system", "content": self.system_prompt})
-        messages.append({"role": "user", "content": text})
-
         if history:
             assert len(history) % 2 == 0, "History should have even number of elements."
-            messages = history + messages
+            messages += history
+        messages.append({"role": "user", "content": text})
 
         kwargs["messages"] = messages
         return kwargs
 
+    def _request_key(self, kwargs: Dict, **extra: Any) -> Optional[str]:
+        """
+        Return the fingerprint of the request, or None if two identical requests may legitimately
+        get different answers, in which case the request bypasses the cache and single flight.
+        """
+        deterministic = kwargs.get("temperature") == 0 or kwargs.get("seed") is not None
+        if not deterministic and not self.cache_nondeterministic:
+            return None
+        return compute_request_fingerprint(
+            self.model_name,
+            kwargs["messages"],
+            temperature=kwargs.get("temperature"),
+            top_p=kwargs.get("top_p"),
+            max_tokens=kwargs.get("max_tokens"),
+            seed=kwargs.get("seed"),
+            stop=kwargs.get("stop"),
+            response_format=kwargs.get("response_format"),
+            **extra,
+        )
+
+    async def _create_completion(
+        self, kwargs: Dict, used_replicas: Optional[set] = None
+    ) -> openai.ChatCompletion:
+        """
+        Send one chat completion request to the backend, or a legacy text completion request
+        if ``kwargs`` carries a ``prompt`` (batched scoring).
+        ``used_replicas`` collects the replicas serving copies of the same request,
+        clients with several backends avoid them when possible.
+        """
+        if "prompt" in kwargs:
+            return await self.client.completions.create(model=self.model_name, **kwargs)
+        return await self.client.chat.completions.create(  # pylint: disable=E1125
+            model=self.model_name, **kwargs
+        )
+
+    @staticmethod
+    def _is_overload_error(e: Exception) -> bool:
+        if isinstance(e, (RateLimitError, APITimeoutError)):
+            return True
+        return isinstance(e, openai.APIStatusError) and e.status_code == 503
+
+    @asynccontextmanager
+    async def _governed_slot(
+        self, latency_class: str = "default", prefix_key: Optional[str] = None
+    ):
+        """Hold a slot of the shared concurrency governor, if any, and feed it the outcome."""
+        # do not send requests for an API request that already timed out or was abandoned
+        check_request()
+        controller = self.concurrency_controller
+        if controller is None:
+            yield
+            return
+        async with controller.slot(prefix_key=prefix_key, lane=current_lane()):
+            check_request()
+            start = time.monotonic()
+            try:
+                yield
+            except Exception as e:  # pylint: disable=broad-except
+                if self._is_overload_error(e):
+                    controller.on_overload(type(e).__name__)
+                raise
+            controller.on_success(time.monotonic() - start, latency_class)
+
+    async def _governed_completion(
+        self, kwargs: Dict, latency_class: str = "default", prefix_key: Optional[str] = None
+    ) -> openai.ChatCompletion:
+        """Send the request through the shared concurrency governor, if any."""
+        async with self._governed_slot(latency_class, prefix_key):
+            return await self._hedged_completion(kwargs, latency_class)
+
+    async def _hedged_completion(
+        self, kwargs: Dict, latency_class: str = "default"
+    ) -> openai.ChatCompletion:
+        """Send the request, and a duplicate to another replica if it is slow (see HedgingPolicy)."""
+        if self.hedging is None:
+            return await self._create_completion(kwargs)
+        return await self._hedged(
+            lambda used_replicas: self._create_completion(kwargs, used_replicas), latency_class
+        )
+
+    async def _hedged(
+        self,
+        send: Callable[[set], Awaitable[Any]],
+        latency_class: str,
+        discard: Optional[Callable[[Any], Awaitable[None]]] = None,
+    ) -> Any:
+        """
+        Race ``send`` against a copy sent once the hedging delay of ``latency_class`` passed.
+        ``discard`` releases the result of a copy that succeeded but lost (e.g. closes its stream).
+        The copy takes a slot of the concurrency governor, if any, without waiting for one:
+        no free slot, no hedge, and the governor sees the outcome of the copy too.
+        """
+        policy = self.hedging
+        start = time.monotonic()
+        delay = policy.delay(latency_class)
+        used_replicas: set = set()
+        primary = asyncio.ensure_future(send(used_replicas))
+        tasks = {primary}
+        winner = None
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self._try_hedge_slot():
+                    tasks.add(asyncio.ensure_future(self._governed_hedge(send, used_replicas, latency_class)))
+            pending = set(tasks)
+            while True:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((t for t in done if t.exception() is None), None)
+                if winner is not None or done == pending:
+                    break
+                # the first copy failed, wait for the other one
+                pending -= done
+            if winner is None:
+                raise next(iter(done)).exception()
+            if winner is not primary:
+                policy.record_win()
+            policy.record(time.monotonic() - start, latency_class)
+            return winner.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif (
+                    task is not winner and discard is not None
+                    and not task.cancelled() and task.exception() is None
+                ):
+                    await discard(task.result())
+
+    def _try_hedge_slot(self) -> bool:
+        """A free governor slot (when governed) and the hedging budget for one more copy."""
+        controller = self.concurrency_controller
+        if controller is not None and not controller.try_acquire(current_lane()):
+            return False
+        if not self.hedging.try_hedge():
+            if controller is not None:
+                controller.release()
+            return False
+        return True
+
+    async def _governed_hedge(self, send: Callable[[set], Awaitable[Any]], used_replicas: set, latency_class: str) -> Any:
+        """Send the hedge copy in the slot taken by _try_hedge_slot, and report its outcome."""
+        controller = self.concurrency_controller
+        if controller is None:
+            return await send(used_replicas)
+        start = time.monotonic()
+        try:
+            result = await send(used_replicas)
+            controller.on_success(time.monotonic() - start, latency_class)
+            return result
+        except Exception as e:  # pylint: disable=broad-except
+            if self._is_overload_error(e):
+                controller.on_overload(type(e).__name__)
+            raise
+        finally:
+            controller.release()
+
+    async def _reserve_tokens(self, kwargs: Dict) -> int:
+        """Estimate the tokens of the request and wait for the RPM / TPM limiters."""
+        if "prompt" in kwargs:
+            # text completion, one completion per prompt
+            prompts = kwargs["prompt"] if isinstance(kwargs["prompt"], list) else [kwargs["prompt"]]
+            completions = len(prompts)
+        else:
+            prompts = [message["content"] for message in kwargs["messages"]]
+            completions = 1
+        # system prompt and template prefixes are counted once, see tokenizer.count_cache
+        prompt_tokens = sum(self.tokenizer.estimate_tokens(prompt) for prompt in prompts)
+        estimated_tokens = prompt_tokens + kwargs["max_tokens"] * completions
+
+        if self.request_limit:
+            await self.rpm.wait(silent=True)
+            await self.tpm.wait(estimated_tokens, silent=True)
+        return estimated_tokens
+
+    def _record_usage(self, usage: Any, estimated_tokens: Optional[int], profile: str = "default"):
+        if self.request_limit and estimated_tokens is not None:
+            self.tpm.reconcile(estimated_tokens, usage.total_tokens)
+        prompt_tokens = usage.prompt_tokens or 0
+        completion_tokens = usage.completion_tokens or 0
+        self.usage.add(prompt_tokens, completion_tokens, usage.total_tokens)
+        usage_meter().record(profile, prompt_tokens, completion_tokens, usage.total_tokens)
+
     @retry(
         stop=stop_after_attempt(5),
         wait=wait_exponential(multiplier=1, min=4, max=10),
@@ -101,16 +329,17 @@ class OpenAIClient(BaseLLMClient):
         **extra: Any,
     ) -> List[Token]:
         kwargs = self._pre_generate(text, history)
-        if self.topk_per_token > 0:
+        top_k = extra.get("top_k") or self.topk_per_token
+        if top_k > 0:
             kwargs["logprobs"] = True
-            kwargs["top_logprobs"] = self.topk_per_token
+            kwargs["top_logprobs"] = top_k
 
         # Limit max_tokens to 1 to avoid long completions
         kwargs["max_tokens"] = 1
 
-        completion = await self.client.chat.completions.create(  # pylint: disable=E1125
-            model=self.model_name, **kwargs
-        )
+        completion = await self._governed_completion(kwargs, latency_class="topk")
+        if getattr(completion, "usage", None):
+            self._record_usage(completion.usage, None, "topk")
 
         tokens = get_top_response_tokens(completion)
 
@@ -129,32 +358,237 @@ class OpenAIClient(BaseLLMClient):
         history: Optional[List[str]] = None,
         **extra: Any,
     ) -> str:
-        kwargs = self._pre_generate(text, history)
+        kwargs = self._pre_generate(text, history, profile=extra.get("profile"))
+        latency_class = extra.get("profile") or "default"
+        prefix_key = extra.get("prompt_prefix")
 
-        prompt_tokens = 0
-        for message in kwargs["messages"]:
-            prompt_tokens += len(self.tokenizer.encode(message["content"]))
-        estimated_tokens = prompt_tokens + kwargs["max_tokens"]
+        request_key = self._request_key(kwargs)
+        if request_key is not None and self.cache is not None:
+            cached = await self.cache.get(request_key)
+            if cached is not None:
+                return cached
 
-        if self.request_limit:
-            await self.rpm.wait(silent=True)
-            await self.tpm.wait(estimated_tokens, silent=True)
+        if request_key is not None and self.single_flight is not None:
+            return await self.single_flight.do(
+                request_key,
+                lambda: self._generate(kwargs, request_key, latency_class, prefix_key),
+            )
+        return await self._generate(kwargs, request_key, latency_class, prefix_key)
 
-        completion = await self.client.chat.completions.create(  # pylint: disable=E1125
-            model=self.model_name, **kwargs
+    async def _generate(
+        self,
+        kwargs: Dict,
+        request_key: Optional[str],
+        latency_class: str,
+        prefix_key: Optional[str] = None,
+    ) -> str:
+        estimated_tokens = await self._reserve_tokens(kwargs)
+
+        completion = await self._governed_completion(
+            kwargs, latency_class=latency_class, prefix_key=prefix_key
+        )
+        if getattr(completion, "usage", None):
+            self._record_usage(completion.usage, estimated_tokens, latency_class)
+        answer = self.filter_think_tags(completion.choices[0].message.content)
+        if request_key is not None and self.cache is not None:
+            await self.cache.set(request_key, answer)
+        return answer
+
+    @retry(
+        stop=stop_after_attempt(5),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_exception_type(
+            (RateLimitError, APIConnectionError, APITimeoutError)
+        ),
+    )
+    async def _open_stream(self, kwargs: Dict, latency_class: str = "default") -> Tuple[openai.AsyncStream, Any]:
+        """
+        Open a streamed completion and read its first chunk (None for an empty stream).
+        With hedging, a stream still silent after the hedging delay of its time to first chunk
+        gets a copy, the first one to produce a chunk is kept and the other one closed.
+        """
+        if self.hedging is None:
+            return await self._first_chunk(kwargs)
+        return await self._hedged(
+            lambda used_replicas: self._first_chunk(kwargs, used_replicas),
+            f"{latency_class}:first_chunk",
+            discard=lambda opened: opened[0].close(),
         )
-        if hasattr(completion, "usage"):
-            self.token_usage.append(
-                {
-                    "prompt_tokens": completion.usage.prompt_tokens,
-                    "completion_tokens": completion.usage.completion_tokens,
-                    "total_tokens": completion.usage.total_tokens,
-                }
+
+    async def _first_chunk(self, kwargs: Dict, used_replicas: Optional[set] = None) -> Tuple[openai.AsyncStream, Any]:
+        stream = await self._create_completion(kwargs, used_replicas)
+        try:
+            return stream, await stream.__anext__()
+        except StopAsyncIteration:
+            return stream, None
+        except BaseException:
+            await stream.close()
+            raise
+
+    @staticmethod
+    async def _stream_chunks(first: Any, stream: openai.AsyncStream) -> AsyncIterator[Any]:
+        if first is not None:
+            yield first
+        async for chunk in stream:
+            yield chunk
+
+    @staticmethod
+    def _find_marker(text: str, markers: List[str], start: int = 0) -> Optional[int]:
+        positions = [p for p in (text.find(m, start) for m in markers) if p >= 0]
+        return min(positions) if positions else None
+
+    async def generate_answer_stream(
+        self,
+        text: str,
+        history: Optional[List[str]] = None,
+        stop_markers: Optional[List[str]] = None,
+        **extra: Any,
+    ) -> AsyncIterator[str]:
+        """
+        Stream the answer piece by piece.
+        With ``stop_markers`` the stream is closed as soon as one of the markers is generated,
+        which saves the decode time of everything the model would emit after it.
+        Unlike generate_answer, think tags are not filtered from the streamed pieces.
+        """
+        kwargs = self._pre_generate(text, history, profile=extra.get("profile"))
+        markers = [m for m in (stop_markers or []) if m]
+
+        cache_key = self._request_key(kwargs, stop_markers=markers or None)
+        if self.cache is None:
+            cache_key = None
+        if cache_key is not None:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        estimated_tokens = await self._reserve_tokens(kwargs)
+        kwargs["stream"] = True
+        if self.stream_usage:
+            kwargs["stream_options"] = {"include_usage": True}
+
+        # keep back the tail that may be the beginning of a marker split across chunks
+        hold = max((len(m) for m in markers), default=1) - 1
+        buffer = ""
+        emitted = 0
+        usage = None
+        async with self._governed_slot(
+            extra.get("profile") or "default", extra.get("prompt_prefix")
+        ):
+            stream, first = await self._open_stream(kwargs, extra.get("profile") or "default")
+            chunks = self._stream_chunks(first, stream)
+            try:
+                async for chunk in chunks:
+                    if getattr(chunk, "usage", None):
+                        usage = chunk.usage
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    buffer += chunk.choices[0].delta.content
+                    cut = self._find_marker(buffer, markers, start=max(0, emitted - hold))
+                    if cut is not None:
+                        buffer = buffer[:cut]
+                        break
+                    if len(buffer) - hold > emitted:
+                        yield buffer[emitted:len(buffer) - hold]
+                        emitted = len(buffer) - hold
+            finally:
+                await chunks.aclose()
+                await stream.close()
+        if len(buffer) > emitted:
+            yield buffer[emitted:]
+
+        if usage is None:
+            # stopped early or the backend does not report usage on streams
+            completion_tokens = self.tokenizer.count_tokens(buffer)
+            prompt_tokens = estimated_tokens - kwargs["max_tokens"]
+            usage = SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
             )
-        return self.filter_think_tags(completion.choices[0].message.content)
+        self._record_usage(usage, estimated_tokens, extra.get("profile") or "default")
+        if cache_key is not None:
+            await self.cache.set(cache_key, self.filter_think_tags(buffer))
+
+    @retry(
+        stop=stop_after_attempt(5),
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_exception_type(
+            (RateLimitError, APIConnectionError, APITimeoutError)
+        ),
+    )
+    async def _complete_prompts(self, prompts: List[str], latency_class: str, **params: Any) -> List[Any]:
+        """Score several raw prompts with one legacy text completion request, choices in prompt order."""
+        kwargs = {"prompt": prompts, "temperature": 0.0, "max_tokens": 1, **params}
+        estimated_tokens = await self._reserve_tokens(kwargs)
+        completion = await self._governed_completion(kwargs, latency_class=latency_class)
+        if getattr(completion, "usage", None):
+            self._record_usage(completion.usage, estimated_tokens, latency_class)
+        return sorted(completion.choices, key=lambda choice: choice.index)
+
+    async def _complete_prompt_batches(
+        self, texts: Sequence[str], latency_class: str, max_concurrency: Optional[int] = None, **params: Any
+    ) -> List[Any]:
+        """Text completion choices of all ``texts``, scoring_batch_size prompts per request."""
+        size = max(1, self.scoring_batch_size)
+        semaphore = asyncio.Semaphore(max_concurrency or self.scoring_concurrency)
+
+        async def complete(batch: List[str]):
+            async with semaphore:
+                return await self._complete_prompts(batch, latency_class, **params)
+
+        batches = [list(texts[i:i + size]) for i in range(0, len(texts), size)]
+        results = await asyncio.gather(*[complete(batch) for batch in batches])
+        return [choice for choices in results for choice in choices]
+
+    async def generate_topk_batch(
+        self, texts: Sequence[str], top_k: Optional[int] = None, max_concurrency: Optional[int] = None,
+        **extra: Any
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k candidates of the next token for many prompts, see BaseLLMClient.generate_topk_batch.
+        With scoring_endpoint "completions" the prompts are sent raw (no chat template) in batches
+        of scoring_batch_size per request; without a completions endpoint it falls back to chat.
+        """
+        top_k = top_k or self.topk_per_token
+        if self.scoring_endpoint == "completions" and not extra.get("history"):
+            try:
+                choices = await self._complete_prompt_batches(
+                    texts, "topk", max_concurrency, logprobs=top_k
+                )
+                return topk_arrays([completion_topk_row(choice) for choice in choices], top_k)
+            except openai.NotFoundError:
+                # the client is shared, every later scoring call of the process goes through chat
+                logger.warning(
+                    "The LLM backend has no completions endpoint, scoring through chat completions "
+                    "from now on (set llm.scoring.endpoint to chat)"
+                )
+                self.scoring_endpoint = "chat"
+        return await super().generate_topk_batch(
+            texts, top_k=top_k, max_concurrency=max_concurrency or self.scoring_concurrency, **extra
+        )
 
     async def generate_inputs_prob(
         self, text: str, history: Optional[List[str]] = None, **extra: Any
     ) -> List[Token]:
-        """Generate probabilities for each token in the input."""
-        raise NotImplementedError
+        """
+        Generate probabilities for each token in the input.
+        Uses the legacy completions endpoint with ``echo=True``, the text is scored raw (no chat
+        template), so there is no history. The first token has no probability and is left out.
+        """
+        if history:
+            raise ValueError("generate_inputs_prob scores a raw text, history is not supported")
+        (choice,) = await self._complete_prompts([text], "inputs_prob", echo=True, logprobs=1)
+        return completion_prompt_tokens(choice, text)
+
+    async def generate_inputs_prob_batch(
+        self, texts: Sequence[str], max_concurrency: Optional[int] = None, **extra: Any
+    ) -> List[np.ndarray]:
+        """Probabilities of the tokens of each text, scoring_batch_size texts per request."""
+        choices = await self._complete_prompt_batches(
+            texts, "inputs_prob", max_concurrency, echo=True, logprobs=1
+        )
+        return [
+            np.array([t.prob for t in completion_prompt_tokens(choice, text)], dtype=np.float64)
+            for choice, text in zip(choices, texts)
+        ]
@@ -0,0 +1,52 @@
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class GenerationProfile:
+    """
+    Generation parameters of one kind of call site.
+    Fields left as None fall back to the client defaults.
+    """
+
+    name: str
+    max_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+    top_p: Optional[float] = None
+    stop: Optional[Tuple[str, ...]] = None
+
+    def apply(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Override the request parameters in ``kwargs`` with this profile."""
+        if self.max_tokens is not None:
+            kwargs["max_tokens"] = self.max_tokens
+        if self.temperature is not None:
+            kwargs["temperature"] = self.temperature
+        if self.top_p is not None:
+            kwargs["top_p"] = self.top_p
+        if self.stop:
+            kwargs["stop"] = list(self.stop)
+        return kwargs
+
+    def update(self, **overrides: Any) -> "GenerationProfile":
+        overrides = {k: v for k, v in overrides.items() if v is not None}
+        if "stop" in overrides:
+            overrides["stop"] = tuple(overrides["stop"])
+        return replace(self, **overrides)
+
+
+DEFAULT_GENERATION_PROFILES: Dict[str, GenerationProfile] = {
+    # kg: first extraction pass of a chunk, LLMFactory adds the KG delimiters as stops
+    "extraction": GenerationProfile("extraction", max_tokens=4096, temperature=0.0),
+    # kg: gleaning CONTINUE / CONTINUE_OR_STOP turn
+    "glean_continue": GenerationProfile("glean_continue", max_tokens=4096, temperature=0.0),
+    # kg: IF_LOOP yes/no probe, a few tokens leave room for quotes or a leading space
+    "loop_probe": GenerationProfile("loop_probe", max_tokens=4, temperature=0.0),
+    # kg: entity / relation description summary
+    "summary": GenerationProfile("summary", max_tokens=512, temperature=0.0),
+    # kg: several entity / relation summaries in one answer (BatchedSummarizer)
+    "summary_batch": GenerationProfile("summary_batch", max_tokens=8192, temperature=0.0),
+    # selfqa: rephrasing of a sub graph into an answer text
+    "qa_rephrase": GenerationProfile("qa_rephrase", max_tokens=2048),
+    # selfqa: CoT template design and CoT answer
+    "cot": GenerationProfile("cot", max_tokens=4096),
+}
@@ -0,0 +1,225 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import openai
+from openai import APIConnectionError, AsyncOpenAI
+
+from pycra.utils.logger import llm_logger as logger
+from .openai_client import OpenAIClient
+
+
+@dataclass
+class Replica:
+    """One OpenAI-compatible backend (lmdeploy / vLLM server) and its runtime statistics."""
+
+    base_url: str
+    client: AsyncOpenAI = field(repr=False)
+    outstanding: int = 0
+    ewma_latency: Optional[float] = None
+    consecutive_failures: int = 0
+    ejected_until: float = 0.0
+    total_requests: int = 0
+    total_failures: int = 0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+    def record_success(self, latency: float, alpha: float):
+        self.total_requests += 1
+        self.consecutive_failures = 0
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = alpha * latency + (1 - alpha) * self.ewma_latency
+
+    def record_failure(self, max_failures: int, eject_seconds: float):
+        self.total_requests += 1
+        self.total_failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= max_failures:
+            self.eject(eject_seconds)
+
+    def eject(self, eject_seconds: float):
+        if self.healthy:
+            logger.warning("Ejecting LLM replica %s for %.1fs", self.base_url, eject_seconds)
+        self.ejected_until = time.monotonic() + eject_seconds
+
+    def reinstate(self):
+        if not self.healthy:
+            logger.info("LLM replica %s is healthy again", self.base_url)
+        self.ejected_until = 0.0
+        self.consecutive_failures = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "ewma_latency": self.ewma_latency,
+            "total_requests": self.total_requests,
+            "total_failures": self.total_failures,
+        }
+
+
+class MultiReplicaOpenAIClient(OpenAIClient):
+    """
+    OpenAIClient load balancing over several replicas serving the same model.
+
+    routing:
+        - "least_outstanding": replica with the fewest in-flight requests, ties broken by latency
+        - "ewma": replica with the lowest EWMA latency weighted by its in-flight requests
+
+    Replicas failing ``max_failures`` times in a row (connection errors / timeouts) are ejected for
+    ``eject_seconds``; a background probe (``GET /models``) ejects dead replicas and brings recovered
+    ones back. A request failing with a connection error is retried on another replica.
+    """
+
+    ROUTING_POLICIES = ("least_outstanding", "ewma")
+
+    def __init__(
+        self,
+        *,
+        base_urls: List[str],
+        routing: str = "least_outstanding",
+        ewma_alpha: float = 0.3,
+        max_failures: int = 3,
+        eject_seconds: float = 30.0,
+        health_check_interval: float = 10.0,
+        health_check_timeout: float = 5.0,
+        **kwargs: Any,
+    ):
+        if not base_urls:
+            raise ValueError("MultiReplicaOpenAIClient needs at least one base_url")
+        if routing not in self.ROUTING_POLICIES:
+            raise ValueError(
+                f"Unsupported routing policy: {routing}. "
+                f"Supported policies are: {list(self.ROUTING_POLICIES)}"
+            )
+        self.base_urls = list(base_urls)
+        self.routing = routing
+        self.ewma_alpha = ewma_alpha
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self.replicas: List[Replica] = []
+        self._health_task: Optional[asyncio.Task] = None
+        kwargs.setdefault("base_url", self.base_urls[0])
+        super().__init__(**kwargs)
+
+    def __post_init__(self):
+        assert self.api_key is not None, "Please provide api key to access openai api."
+        # failover is done across replicas, so the SDK must not retry on the same replica
+        self.replicas = [
+            Replica(
+                base_url=url,
+                client=AsyncOpenAI(
+                    api_key=self.api_key, base_url=url, max_retries=0, http_client=self.http_client
+                ),
+            )
+            for url in self.base_urls
+        ]
+        self.client = self.replicas[0].client
+
+    def _pick_replica(self, exclude: set) -> Optional[Replica]:
+        candidates = [r for r in self.replicas if r.base_url not in exclude]
+        if not candidates:
+            return None
+        healthy = [r for r in candidates if r.healthy]
+        # every replica is ejected: try the one that comes back first instead of failing outright
+        if not healthy:
+            return min(candidates, key=lambda r: r.ejected_until)
+
+        # replicas without samples yet are assumed to be as fast as the average known one
+        known = [r.ewma_latency for r in self.replicas if r.ewma_latency is not None]
+        default_latency = sum(known) / len(known) if known else 1.0
+
+        def latency(r: Replica) -> float:
+            return r.ewma_latency if r.ewma_latency is not None else default_latency
+
+        if self.routing == "ewma":
+            return min(healthy, key=lambda r: latency(r) * (r.outstanding + 1))
+        return min(healthy, key=lambda r: (r.outstanding, latency(r)))
+
+    async def _send_to_replica(self, replica: Replica, kwargs: Dict) -> openai.ChatCompletion:
+        replica.outstanding += 1
+        start = time.monotonic()
+        try:
+            if "prompt" in kwargs:
+                completion = await replica.client.completions.create(model=self.model_name, **kwargs)
+            else:
+                completion = await replica.client.chat.completions.create(  # pylint: disable=E1125
+                    model=self.model_name, **kwargs
+                )
+        except APIConnectionError:
+            replica.record_failure(self.max_failures, self.eject_seconds)
+            raise
+        finally:
+            replica.outstanding -= 1
+        replica.record_success(time.monotonic() - start, self.ewma_alpha)
+        return completion
+
+    async def _create_completion(
+        self, kwargs: Dict, used_replicas: Optional[set] = None
+    ) -> openai.ChatCompletion:
+        self._ensure_health_checks()
+        tried = set()
+        last_error: Optional[Exception] = None
+        while True:
+            # prefer replicas not already serving a copy of this request (hedging)
+            replica = self._pick_replica(exclude=tried | (used_replicas or set()))
+            if replica is None:
+                replica = self._pick_replica(exclude=tried)
+            if replica is None:
+                break
+            tried.add(replica.base_url)
+            if used_replicas is not None:
+                used_replicas.add(replica.base_url)
+            try:
+                return await self._send_to_replica(replica, kwargs)
+            except APIConnectionError as e:  # APITimeoutError is a subclass
+                logger.warning(
+                    "LLM replica %s failed: %s, retrying on another replica",
+                    replica.base_url,
+                    e,
+                )
+                last_error = e
+        raise last_error
+
+    def _ensure_health_checks(self):
+        if self.health_check_interval <= 0:
+            return
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_check_loop())
+
+    async def _probe(self, replica: Replica):
+        try:
+            await asyncio.wait_for(
+                replica.client.models.list(), timeout=self.health_check_timeout
+            )
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning("Health probe of LLM replica %s failed: %s", replica.base_url, e)
+            replica.eject(self.eject_seconds)
+        else:
+            replica.reinstate()
+
+    async def _health_check_loop(self):
+        while True:
+            await asyncio.gather(*[self._probe(r) for r in self.replicas])
+            await asyncio.sleep(self.health_check_interval)
+
+    def replica_stats(self) -> List[Dict[str, Any]]:
+        return [r.to_dict() for r in self.replicas]
+
+    async def aclose(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        if self.http_client is not None:
+            # the shared transport belongs to LLMFactory
+            return
+        for replica in self.replicas:
+            await replica.client.close()
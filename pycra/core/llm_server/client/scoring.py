@@ -0,0 +1,63 @@
+import math
+from typing import Any, List, Sequence, Tuple
+
+import numpy as np
+
+from pycra.core.llm_server.tokenizer import Token
+
+
+def topk_arrays(rows: Sequence[Sequence[Tuple[str, float]]], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pack the top-k (token, prob) candidates of many prompts into two (n_prompts, k) arrays.
+    Rows with fewer than k candidates are padded with "" / 0.0.
+    """
+    tokens = np.full((len(rows), k), "", dtype=object)
+    probs = np.zeros((len(rows), k), dtype=np.float64)
+    for i, row in enumerate(rows):
+        for j, (token, prob) in enumerate(row[:k]):
+            tokens[i, j] = token
+            probs[i, j] = prob
+    return tokens, probs
+
+
+def candidate_probs(tokens: np.ndarray, probs: np.ndarray, candidates: Sequence[str]) -> np.ndarray:
+    """
+    Probability of each candidate answer, shape (n_prompts, n_candidates).
+    Top-k tokens are matched case-insensitively and without surrounding whitespace,
+    so " Yes", "yes" and "YES" all count for the "yes" candidate.
+    """
+    normalized = np.char.lower(np.char.strip(tokens.astype(str)))
+    columns = [np.where(normalized == c.strip().lower(), probs, 0.0).sum(axis=1) for c in candidates]
+    return np.stack(columns, axis=1) if columns else np.zeros((len(tokens), 0))
+
+
+def tokens_to_topk_row(tokens: List[Token]) -> List[Tuple[str, float]]:
+    """Top candidates of the first generated token, as returned by generate_topk_per_token."""
+    if not tokens:
+        return []
+    first = tokens[0]
+    return [(t.text, t.prob) for t in first.top_candidates] or [(first.text, first.prob)]
+
+
+def completion_topk_row(choice: Any) -> List[Tuple[str, float]]:
+    """Top candidates of the first generated token of a text completion choice."""
+    logprobs = getattr(choice, "logprobs", None)
+    if logprobs is None or not logprobs.top_logprobs:
+        return []
+    top = logprobs.top_logprobs[0] or {}
+    return sorted(((token, math.exp(lp)) for token, lp in top.items()), key=lambda x: -x[1])
+
+
+def completion_prompt_tokens(choice: Any, prompt: str) -> List[Token]:
+    """
+    Tokens of the prompt with their probabilities, from an ``echo=True`` text completion choice.
+    Generated tokens (text offset past the prompt) and the first prompt token, which has no
+    probability, are left out.
+    """
+    logprobs = choice.logprobs
+    offsets = logprobs.text_offset or [0] * len(logprobs.tokens)
+    return [
+        Token(token, math.exp(lp))
+        for token, lp, offset in zip(logprobs.tokens, logprobs.token_logprobs, offsets)
+        if lp is not None and offset < len(prompt)
+    ]
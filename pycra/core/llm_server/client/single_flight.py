@@ -0,0 +1,95 @@
+import asyncio
+import contextvars
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Set, TypeVar
+
+from pycra.utils.request_context import (
+    DEADLINE_EXCEEDED, RequestCancelled, check_request, current_request, detach_request
+)
+from .usage import RequestUsage, current_usage, share_usage
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Call:
+    task: asyncio.Future
+    waiters: int = 0
+    # usage of the requests waiting for the call, its tokens are accounted to each of them
+    requests: Set[RequestUsage] = field(default_factory=set)
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution.
+
+    The first caller of a key starts the call, callers arriving while it is in flight await
+    the same result (or exception). The shared call runs detached from the API request of the
+    caller that started it: each caller applies its own deadline while waiting, and the call
+    is cancelled only when every caller waiting for it is gone. Its tokens are accounted to
+    every request waiting for it; it keeps the lane of the first caller, the slot being
+    requested when the call starts. Nothing is remembered once the call finishes, that is the
+    job of the response cache.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.calls = 0
+        self.deduplicated = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def _forget(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        # the deadline of this caller, not of the one that started the call
+        check_request()
+        self.calls += 1
+        call = self._calls.get(key)
+        if call is None:
+            requests: Set[RequestUsage] = set()
+            context = contextvars.copy_context()
+            context.run(detach_request)
+            context.run(share_usage, requests)
+            call = _Call(task=asyncio.get_running_loop().create_task(fn(), context=context), requests=requests)
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+        else:
+            self.deduplicated += 1
+
+        usage = current_usage()
+        if usage is not None:
+            call.requests.add(usage)
+        call.waiters += 1
+        done = False
+        try:
+            request = current_request()
+            timeout = request.remaining() if request is not None else None
+            try:
+                # shield: a cancelled or timed out caller must not cancel the call the others are waiting for
+                result = await asyncio.wait_for(asyncio.shield(call.task), timeout)
+            except asyncio.TimeoutError:
+                if call.task.done():
+                    raise
+                check_request()
+                raise RequestCancelled(DEADLINE_EXCEEDED) from None
+            done = True
+            return result
+        finally:
+            call.waiters -= 1
+            if not done and usage is not None:
+                call.requests.discard(usage)
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+                self._forget(key, call)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "deduplicated": self.deduplicated,
+            "in_flight": len(self._calls),
+        }
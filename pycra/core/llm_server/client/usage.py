@@ -0,0 +1,239 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+# upper bounds of the token histograms, the last bucket is +Inf
+TOKEN_BUCKETS: Tuple[int, ...] = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+UNSCOPED = "unscoped"
+
+
+class TokenHistogram:
+    """Token counts per fixed bucket, constant memory whatever the number of calls."""
+
+    def __init__(self, buckets: Tuple[int, ...] = TOKEN_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value: int):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(upper bound, calls at or below it) pairs, the Prometheus histogram layout."""
+        total, result = 0, []
+        for bound, count in zip([str(b) for b in self.buckets] + ["+Inf"], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class UsageCounter:
+    """Calls and prompt / completion tokens, with the token distributions per call."""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.total_tokens = 0
+        self.prompt_histogram = TokenHistogram()
+        self.completion_histogram = TokenHistogram()
+
+    def add(self, prompt_tokens: int, completion_tokens: int, total_tokens: Optional[int] = None):
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.total_tokens += total_tokens if total_tokens is not None else prompt_tokens + completion_tokens
+        self.prompt_histogram.observe(prompt_tokens)
+        self.completion_histogram.observe(completion_tokens)
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+        }
+
+
+class RequestUsage:
+    """Token usage of one request (contract build, self qa job), split by stage and profile."""
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.total = UsageCounter()
+        self.by_stage: Dict[str, UsageCounter] = {}
+        self.by_profile: Dict[str, UsageCounter] = {}
+
+    def add(self, profile: str, stage: str, prompt_tokens: int, completion_tokens: int, total_tokens: int):
+        self.total.add(prompt_tokens, completion_tokens, total_tokens)
+        for key, counters in ((stage, self.by_stage), (profile, self.by_profile)):
+            counters.setdefault(key, UsageCounter()).add(prompt_tokens, completion_tokens, total_tokens)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            **self.total.to_dict(),
+            "by_stage": {stage: counter.to_dict() for stage, counter in self.by_stage.items()},
+            "by_profile": {profile: counter.to_dict() for profile, counter in self.by_profile.items()},
+        }
+
+
+@dataclass(frozen=True)
+class _UsageLabels:
+    request: Optional[RequestUsage] = None
+    stage: Optional[str] = None
+    # requests sharing the calls of the context (see share_usage), instead of ``request``
+    shared: Optional[Set[RequestUsage]] = None
+
+
+_usage_labels: ContextVar[_UsageLabels] = ContextVar("pycra_llm_usage", default=_UsageLabels())
+
+
+class UsageMeter:
+    """
+    Process-wide token usage accounting with a fixed memory footprint.
+
+    Usage is aggregated per (profile, stage): both label sets are small and fixed by the code.
+    Per request usage is kept for the last ``max_requests`` requests only (LRU), so a long-running
+    API process does not grow with the number of builds it served.
+    """
+
+    def __init__(self, max_requests: int = 1024):
+        self.max_requests = max_requests
+        self.started_at = time.time()
+        self.total = UsageCounter()
+        self.by_key: Dict[Tuple[str, str], UsageCounter] = {}
+        self._requests: "OrderedDict[str, RequestUsage]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, profile: str, prompt_tokens: int, completion_tokens: int, total_tokens: Optional[int] = None):
+        """Account one completion to the profile and to the stage / request of the calling task."""
+        labels = _usage_labels.get()
+        stage = labels.stage or UNSCOPED
+        if total_tokens is None:
+            total_tokens = prompt_tokens + completion_tokens
+        with self._lock:
+            self.total.add(prompt_tokens, completion_tokens, total_tokens)
+            counter = self.by_key.get((profile, stage))
+            if counter is None:
+                counter = self.by_key[(profile, stage)] = UsageCounter()
+            counter.add(prompt_tokens, completion_tokens, total_tokens)
+            if labels.shared is not None:
+                requests = list(labels.shared)
+            else:
+                requests = [labels.request] if labels.request is not None else []
+            for request in requests:
+                request.add(profile, stage, prompt_tokens, completion_tokens, total_tokens)
+
+    def open_request(self, request_id: str) -> RequestUsage:
+        with self._lock:
+            request = self._requests.pop(request_id, None) or RequestUsage(request_id)
+            self._requests[request_id] = request
+            while len(self._requests) > max(self.max_requests, 0):
+                self._requests.popitem(last=False)
+            return request
+
+    def request_usage(self, request_id: str) -> Optional[Dict[str, Any]]:
+        request = self._requests.get(request_id)
+        return request.to_dict() if request is not None else None
+
+    def resize(self, max_requests: int):
+        with self._lock:
+            self.max_requests = max_requests
+            while len(self._requests) > max(max_requests, 0):
+                self._requests.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        by_profile: Dict[str, Dict[str, int]] = {}
+        by_stage: Dict[str, Dict[str, int]] = {}
+        for (profile, stage), counter in list(self.by_key.items()):
+            for key, groups in ((profile, by_profile), (stage, by_stage)):
+                group = groups.setdefault(key, {})
+                for name, value in counter.to_dict().items():
+                    group[name] = group.get(name, 0) + value
+        return {
+            "since": self.started_at,
+            **self.total.to_dict(),
+            "by_profile": by_profile,
+            "by_stage": by_stage,
+            "recent_requests": list(self._requests.keys())[-20:],
+        }
+
+    def prometheus(self, prefix: str = "pycra_llm") -> str:
+        """Usage counters and token histograms in the Prometheus text exposition format."""
+        items = sorted(self.by_key.items())
+        lines: List[str] = []
+        for name in ("calls", "prompt_tokens", "completion_tokens"):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            for (profile, stage), counter in items:
+                lines.append(f'{prefix}_{name}_total{{profile="{profile}",stage="{stage}"}} {getattr(counter, name)}')
+        for name, attribute in (("prompt_tokens", "prompt_histogram"), ("completion_tokens", "completion_histogram")):
+            metric = f"{prefix}_{name}_per_call"
+            lines.append(f"# TYPE {metric} histogram")
+            for (profile, stage), counter in items:
+                histogram = getattr(counter, attribute)
+                labels = f'profile="{profile}",stage="{stage}"'
+                for bound, count in histogram.cumulative():
+                    lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f"{metric}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+_usage_meter = UsageMeter()
+
+
+def usage_meter() -> UsageMeter:
+    """Usage meter shared by every LLM client of the process."""
+    return _usage_meter
+
+
+def current_usage() -> Optional[RequestUsage]:
+    """Usage of the request the current task works for, None outside of ``usage_scope``."""
+    return _usage_labels.get().request
+
+
+@contextmanager
+def usage_scope(request_id: str, stage: Optional[str] = None) -> Iterator[RequestUsage]:
+    """
+    Account the LLM calls made inside the block (and the tasks it spawns) to ``request_id``,
+    e.g. the contract id of a build. The usage is readable while the block runs and after.
+    """
+    request = _usage_meter.open_request(request_id)
+    token = _usage_labels.set(_UsageLabels(request=request, stage=stage))
+    try:
+        yield request
+    finally:
+        request.finished_at = time.time()
+        _usage_labels.reset(token)
+
+
+def share_usage(requests: Set[RequestUsage]):
+    """
+    Account the LLM calls of the current context to every request of ``requests``, and once to the
+    process totals. For a call shared by several requests (SingleFlight), the set is filled with
+    the requests waiting for it while it runs.
+    """
+    _usage_labels.set(_UsageLabels(stage=_usage_labels.get().stage, shared=requests))
+
+
+@contextmanager
+def usage_stage(stage: str):
+    """Label the LLM calls made inside the block with a pipeline stage (extraction, merge, ...)."""
+    token = _usage_labels.set(_UsageLabels(request=_usage_labels.get().request, stage=stage))
+    try:
+        yield
+    finally:
+        _usage_labels.reset(token)
@@ -1,11 +1,37 @@
-from typing import Optional
+from typing import Any, Dict, Optional
+import httpx
 from langchain_openai import ChatOpenAI
 from langchain_core.language_models import BaseChatModel
 
 from pycra import settings
+from pycra.core.templates.kg import KG_EXTRACTION_PROMPT
 from pycra.utils.logger import llm_logger as logger
-from .tokenizer import Tokenizer
-from .client import BaseLLMClient, OpenAIClient
+from .tokenizer import Tokenizer, token_count_cache
+from .client import (
+    BaseLLMClient, OpenAIClient, MultiReplicaOpenAIClient, BaseResponseCache, SQLiteResponseCache,
+    RPM, TPM, AIMDConcurrencyController, SingleFlight,
+    BatchLLMClient, OpenAIBatchExecutor, LocalBatchExecutor, HedgingPolicy, usage_meter
+)
+from .client.profiles import DEFAULT_GENERATION_PROFILES, GenerationProfile
+from .replay import LLMRecorder
+from .transport import build_http_client, http_client_stats
+
+_COMPLETION_DELIMITER = KG_EXTRACTION_PROMPT["FORMAT"]["completion_delimiter"]
+_NO_MORE_DELIMITER = KG_EXTRACTION_PROMPT["FORMAT"]["no_more_delimiter"]
+# stop sequences of the kg profiles, the answer is complete once the model writes a delimiter
+_KG_PROFILE_STOPS = {
+    "extraction": (_COMPLETION_DELIMITER,),
+    "glean_continue": (_COMPLETION_DELIMITER, _NO_MORE_DELIMITER),
+    "summary_batch": (_COMPLETION_DELIMITER,),
+}
+
+_response_cache: Optional[BaseResponseCache] = None
+_concurrency_controller: Optional[AIMDConcurrencyController] = None
+_single_flight: Optional[SingleFlight] = None
+_hedging_policy: Optional[HedgingPolicy] = None
+_recorder: Optional[LLMRecorder] = None
+_async_http_client: Optional[httpx.AsyncClient] = None
+_sync_http_client: Optional[httpx.Client] = None
 
 class LLMFactory:
     """
@@ -44,7 +70,9 @@ class LLMFactory:
                 model=final_model,
                 temperature=final_temp,
                 api_key=api_key,
-                base_url=base_url
+                base_url=base_url,
+                http_client=LLMFactory.create_http_client(),
+                http_async_client=LLMFactory.create_async_http_client()
             )
             
         elif provider == "azure":
@@ -59,6 +87,8 @@ class LLMFactory:
                 temperature=final_temp,
                 api_key=provider_settings.api_key,
                 base_url=provider_settings.endpoint, # Often azure uses specific endpoint structure
+                http_client=LLMFactory.create_http_client(),
+                http_async_client=LLMFactory.create_async_http_client(),
                 # additional azure params...
             )
             
@@ -82,14 +112,48 @@ class LLMFactory:
             api_key = llm_config.api_key
             base_url = llm_config.base_url
             tokenizer_instanece = Tokenizer(
-            model_name=final_model
+            model_name=llm_config.tokenizer or final_model
         )
-            return OpenAIClient(
+            token_count_cache().resize(llm_config.token_count_cache_size)
+            usage_meter().resize(llm_config.usage_max_requests)
+            cache_config = llm_config.cache
+            client_kwargs = dict(
                 model_name=final_model,
                 api_key=api_key,
                 base_url=base_url,
-                tokenizer=tokenizer_instanece
+                tokenizer=tokenizer_instanece,
+                request_limit=llm_config.request_limit,
+                rpm=RPM(llm_config.rpm),
+                tpm=TPM(llm_config.tpm),
+                cache=LLMFactory.create_response_cache(),
+                cache_nondeterministic=bool(cache_config and cache_config.cache_nondeterministic),
+                profiles=LLMFactory.create_generation_profiles(),
+                concurrency_controller=LLMFactory.create_concurrency_controller(),
+                single_flight=LLMFactory.create_single_flight(),
+                http_client=LLMFactory.create_async_http_client(),
+                hedging=LLMFactory.create_hedging_policy(),
+                **LLMFactory._scoring_options(),
             )
+            batch_config = llm_config.batch
+            replica_config = llm_config.replicas
+            if batch_config and batch_config.enabled:
+                llm_client = LLMFactory.create_batch_llm_cli(client_kwargs)
+            elif replica_config and replica_config.base_urls:
+                logger.info(f"Initializing multi-replica LLM client: {replica_config.base_urls}")
+                llm_client = MultiReplicaOpenAIClient(
+                    base_urls=replica_config.base_urls,
+                    routing=replica_config.routing,
+                    max_failures=replica_config.max_failures,
+                    eject_seconds=replica_config.eject_seconds,
+                    health_check_interval=replica_config.health_check_interval,
+                    **client_kwargs
+                )
+            else:
+                llm_client = OpenAIClient(**client_kwargs)
+            recorder = LLMFactory.create_recorder()
+            if recorder is not None:
+                recorder.attach(llm_client)
+            return llm_client
 
         elif provider == "azure":
             raise NotImplementedError
@@ -98,6 +162,234 @@ class LLMFactory:
             raise ValueError(f"Unsupported LLM provider: {provider}")
 
 
+    @staticmethod
+    def create_batch_llm_cli(client_kwargs: Dict) -> BatchLLMClient:
+        """
+        Batch mode client, requests are queued and submitted as batch files
+        """
+        batch_config = settings.llm.batch
+        # waiting for a batch must not hold rate limit tokens or concurrency slots
+        batch_kwargs = dict(client_kwargs, request_limit=False, concurrency_controller=None, hedging=None)
+        executor = None
+        if batch_config.executor == "local":
+            executor = LocalBatchExecutor(
+                OpenAIClient(**client_kwargs), max_concurrency=batch_config.local_concurrency
+            )
+        elif batch_config.executor != "openai":
+            raise ValueError(f"Unsupported batch executor: {batch_config.executor}")
+        logger.info(f"Initializing batch LLM client: executor={batch_config.executor}, work_dir={batch_config.work_dir}")
+        llm_cli = BatchLLMClient(
+            work_dir=batch_config.work_dir,
+            flush_interval=batch_config.flush_interval,
+            max_batch_size=batch_config.max_batch_size,
+            poll_interval=batch_config.poll_interval,
+            **batch_kwargs
+        )
+        if executor is None:
+            executor = OpenAIBatchExecutor(llm_cli.client, completion_window=batch_config.completion_window)
+        llm_cli.executor = executor
+        return llm_cli
+
+    @staticmethod
+    def _http_client_options() -> Optional[Dict[str, Any]]:
+        http_config = settings.llm.http
+        if http_config is None:
+            return {}
+        if not http_config.enabled:
+            return None
+        return http_config.model_dump(exclude={"enabled"})
+
+    @staticmethod
+    def create_async_http_client() -> Optional[httpx.AsyncClient]:
+        """
+        Process-wide pooled async HTTP client of the LLM / embedding clients, None if disabled in llm.yaml
+        """
+        global _async_http_client
+        options = LLMFactory._http_client_options()
+        if options is None:
+            return None
+        if _async_http_client is None or _async_http_client.is_closed:
+            logger.info(f"Initializing shared LLM HTTP transport: {options}")
+            _async_http_client = build_http_client(**options)
+        return _async_http_client
+
+    @staticmethod
+    def create_http_client() -> Optional[httpx.Client]:
+        """
+        Process-wide pooled sync HTTP client of the LangChain models, None if disabled in llm.yaml
+        """
+        global _sync_http_client
+        options = LLMFactory._http_client_options()
+        if options is None:
+            return None
+        if _sync_http_client is None or _sync_http_client.is_closed:
+            _sync_http_client = build_http_client(sync=True, **options)
+        return _sync_http_client
+
+    @staticmethod
+    def http_stats() -> Dict[str, Any]:
+        """
+        Connection reuse of the shared HTTP transport
+        """
+        return {
+            "async": http_client_stats(_async_http_client),
+            "sync": http_client_stats(_sync_http_client),
+        }
+
+    @staticmethod
+    def concurrency_stats() -> Optional[Dict[str, Any]]:
+        """
+        Limit, in-flight requests and per-lane queue waits of the concurrency governor
+        """
+        if _concurrency_controller is None:
+            return None
+        return _concurrency_controller.stats()
+
+    @staticmethod
+    async def aclose_http_clients():
+        global _async_http_client, _sync_http_client
+        if _async_http_client is not None:
+            await _async_http_client.aclose()
+            _async_http_client = None
+        if _sync_http_client is not None:
+            _sync_http_client.close()
+            _sync_http_client = None
+
+    @staticmethod
+    def create_generation_profiles() -> Dict[str, GenerationProfile]:
+        """
+        Default generation profiles with the KG stop delimiters, merged with the overrides in llm.yaml
+        """
+        profiles = dict(DEFAULT_GENERATION_PROFILES)
+        for name, stop in _KG_PROFILE_STOPS.items():
+            profiles[name] = profiles[name].update(stop=stop)
+        for name, profile_config in (settings.llm.profiles or {}).items():
+            base = profiles.get(name, GenerationProfile(name))
+            profiles[name] = base.update(**profile_config.model_dump())
+        return profiles
+
+    @staticmethod
+    def create_concurrency_controller() -> Optional[AIMDConcurrencyController]:
+        """
+        Process-wide AIMD concurrency governor, None if disabled in llm.yaml
+        """
+        global _concurrency_controller
+        concurrency_config = settings.llm.concurrency
+        if not concurrency_config or not concurrency_config.enabled:
+            return None
+        if _concurrency_controller is None:
+            _concurrency_controller = AIMDConcurrencyController(
+                initial_limit=concurrency_config.initial_limit,
+                min_limit=concurrency_config.min_limit,
+                max_limit=concurrency_config.max_limit,
+                decrease_factor=concurrency_config.decrease_factor,
+                latency_tolerance=concurrency_config.latency_tolerance,
+                latency_window=concurrency_config.latency_window,
+                group_by_prefix=concurrency_config.group_by_prefix,
+                prefix_max_wait=concurrency_config.prefix_max_wait,
+                lane_weights=concurrency_config.lane_weights,
+            )
+        return _concurrency_controller
+
+    @staticmethod
+    def create_single_flight() -> Optional[SingleFlight]:
+        """
+        Process-wide coalescing of identical in-flight LLM requests, None if disabled in llm.yaml
+        """
+        global _single_flight
+        if not settings.llm.single_flight:
+            return None
+        if _single_flight is None:
+            _single_flight = SingleFlight()
+        return _single_flight
+
+    @staticmethod
+    def _scoring_options() -> Dict[str, Any]:
+        scoring_config = settings.llm.scoring
+        if scoring_config is None:
+            return {}
+        return {
+            "scoring_endpoint": scoring_config.endpoint,
+            "scoring_batch_size": scoring_config.batch_size,
+            "scoring_concurrency": scoring_config.max_concurrency,
+        }
+
+    @staticmethod
+    def create_recorder() -> Optional[LLMRecorder]:
+        """
+        Process-wide recorder of the LLM requests (replay server input), None if disabled in llm.yaml
+        """
+        global _recorder
+        record_config = settings.llm.record
+        if not record_config or not record_config.enabled:
+            return None
+        if _recorder is None:
+            _recorder = LLMRecorder(record_config.path)
+        return _recorder
+
+    @staticmethod
+    def create_hedging_policy() -> Optional[HedgingPolicy]:
+        """
+        Process-wide hedged request policy, None if disabled in llm.yaml
+        """
+        global _hedging_policy
+        hedging_config = settings.llm.hedging
+        if not hedging_config or not hedging_config.enabled:
+            return None
+        if _hedging_policy is None:
+            _hedging_policy = HedgingPolicy(**hedging_config.model_dump(exclude={"enabled"}))
+        return _hedging_policy
+
+    @staticmethod
+    def hedging_stats() -> Optional[Dict[str, Any]]:
+        """
+        Hedge count, hedge win rate and current hedge delays
+        """
+        if _hedging_policy is None:
+            return None
+        return _hedging_policy.stats()
+
+    @staticmethod
+    def token_count_stats() -> Dict[str, Any]:
+        """
+        Entries, hit rate and evictions of the token count cache
+        """
+        return token_count_cache().stats()
+
+    @staticmethod
+    def usage_stats(request_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Token usage of the process per profile and stage, or of one request (None if unknown / evicted)
+        """
+        if request_id is not None:
+            return usage_meter().request_usage(request_id)
+        return usage_meter().stats()
+
+    @staticmethod
+    def usage_metrics() -> str:
+        """
+        Token usage counters and histograms in the Prometheus text format
+        """
+        return usage_meter().prometheus()
+
+    @staticmethod
+    def create_response_cache() -> Optional[BaseResponseCache]:
+        """
+        Process-wide LLM response cache, None if disabled in llm.yaml
+        """
+        global _response_cache
+        cache_config = settings.llm.cache
+        if not cache_config or not cache_config.enabled:
+            return None
+        if _response_cache is None:
+            logger.info(f"Initializing LLM response cache: path={cache_config.path}")
+            _response_cache = SQLiteResponseCache(
+                cache_config.path,
+                ttl_seconds=cache_config.ttl_seconds,
+                max_size_bytes=cache_config.max_size_mb * 1024 * 1024,
+            )
+        return _response_cache
+
     @staticmethod
     def create_embedding_model():
         """
@@ -113,7 +405,9 @@ class LLMFactory:
         if emb_config.provider == "openai":
             # Assuming shared API key or from env
             return OpenAIEmbeddings(
-                model=emb_config.model_name
+                model=emb_config.model_name,
+                http_client=LLMFactory.create_http_client(),
+                http_async_client=LLMFactory.create_async_http_client()
             )
         else:
             raise ValueError(f"Unsupported embedding provider: {emb_config.provider}")
@@ -0,0 +1,2 @@
+from .recorder import LLMRecorder, replay_key
+from .server import FaultInjector, LatencyModel, ReplayStore, create_replay_app
@@ -0,0 +1,130 @@
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import openai
+
+from pycra.core.llm_server.client.cache import compute_request_fingerprint
+from pycra.utils.logger import llm_logger as logger
+
+# request fields that do not change the answer
+_TRANSPORT_FIELDS = ("model", "stream", "stream_options", "user")
+
+
+def replay_key(body: Dict[str, Any]) -> str:
+    """Key of a chat / text completion request, the same for the recorder and the replay server."""
+    params = {k: v for k, v in body.items() if k not in _TRANSPORT_FIELDS and k != "messages"}
+    return compute_request_fingerprint("", body.get("messages"), **params)
+
+
+def _to_dict(value: Any) -> Any:
+    return value.model_dump() if hasattr(value, "model_dump") else value
+
+
+class _RecordingStream:
+    """Pass the chunks of a streamed completion through and record their content and timing."""
+
+    def __init__(self, stream: openai.AsyncStream, start: float, on_done: Callable[[Dict[str, Any]], None]):
+        self._stream = stream
+        self._start = start
+        self._on_done = on_done
+        self._chunks: List[str] = []
+        self._offsets: List[float] = []
+        self._usage: Optional[Dict[str, Any]] = None
+        self._done = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        async for chunk in self._stream:
+            if getattr(chunk, "usage", None):
+                self._usage = _to_dict(chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                self._chunks.append(chunk.choices[0].delta.content)
+                self._offsets.append(time.monotonic() - self._start)
+            yield chunk
+        self._finish(truncated=False)
+
+    async def close(self):
+        await self._stream.close()
+        # closed before the end, e.g. at a stop marker
+        self._finish(truncated=True)
+
+    def _finish(self, truncated: bool):
+        if self._done:
+            return
+        self._done = True
+        self._on_done(
+            {
+                "chunks": self._chunks,
+                "chunk_offsets": self._offsets,
+                "ttft": self._offsets[0] if self._offsets else None,
+                "latency": time.monotonic() - self._start,
+                "usage": self._usage,
+                "truncated": truncated,
+            }
+        )
+
+
+class LLMRecorder:
+    """
+    Record the requests of an LLM client with their responses, latency and token usage into a JSONL
+    file, the input of the replay server (see replay.server) for reproducible performance tests.
+
+    ``attach`` wraps the ``_create_completion`` hook of the client instance, so every request,
+    streamed or not, goes through the recorder whatever client class sends it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self.records = 0
+        self.errors = 0
+
+    def attach(self, llm_client: Any) -> Any:
+        send = llm_client._create_completion
+
+        async def recorded_completion(kwargs: Dict, used_replicas: Optional[set] = None):
+            start = time.monotonic()
+            try:
+                response = await send(kwargs, used_replicas)
+            except Exception as e:  # pylint: disable=broad-except
+                self.write(kwargs, latency=time.monotonic() - start, error={
+                    "type": type(e).__name__,
+                    "status_code": getattr(e, "status_code", None),
+                    "message": str(e),
+                })
+                raise
+            if kwargs.get("stream"):
+                return _RecordingStream(response, start, lambda result: self.write(kwargs, stream=True, **result))
+            self.write(
+                kwargs,
+                response=_to_dict(response),
+                latency=time.monotonic() - start,
+                usage=_to_dict(getattr(response, "usage", None)),
+            )
+            return response
+
+        llm_client._create_completion = recorded_completion
+        logger.info(f"Recording the LLM requests of {type(llm_client).__name__} to {self.path}")
+        return llm_client
+
+    def write(self, request: Dict[str, Any], **result: Any):
+        record = {
+            "key": replay_key(request),
+            "endpoint": "completions" if "prompt" in request else "chat.completions",
+            "request": request,
+            "time": time.time(),
+            **result,
+        }
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self._file.flush()
+        self.records += 1
+        if result.get("error"):
+            self.errors += 1
+
+    def close(self):
+        self._file.close()
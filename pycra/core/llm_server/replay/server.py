@@ -0,0 +1,355 @@
+"""
+OpenAI-compatible stand-in server replaying an LLMRecorder recording.
+
+    python -m pycra.core.llm_server.replay.server --recording cra/replay/llm_recording.jsonl \
+        --latency recorded --rate-limit-rate 0.02 --max-concurrency 32 --port 8100
+
+Point llm.base_url at http://127.0.0.1:8100/v1 to run KgBuilder / GenerateService against it.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from pycra.core.llm_server.client.limitter import TokenBucket
+from pycra.core.llm_server.replay.recorder import replay_key
+from pycra.utils.logger import llm_logger as logger
+
+LATENCY_MODES = ("recorded", "fixed", "lognormal", "tokens")
+
+
+def _usage_tokens(record: Dict[str, Any]) -> Tuple[int, int]:
+    usage = record.get("usage") or {}
+    return usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0
+
+
+class ReplayStore:
+    """
+    Recorded responses indexed by request key. Identical requests recorded several times are
+    replayed in turn. A request never recorded gets a random recording of the same endpoint
+    with ``on_miss="sample"``, or a 404 with ``on_miss="error"``.
+    """
+
+    def __init__(self, records: List[Dict[str, Any]], on_miss: str = "sample", seed: Optional[int] = None):
+        self.records = [r for r in records if not r.get("error") and (r.get("response") or r.get("stream"))]
+        self.on_miss = on_miss
+        self._by_key: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._by_endpoint: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for record in self.records:
+            self._by_key[record["key"]].append(record)
+            self._by_endpoint[record["endpoint"]].append(record)
+        self._turns: Dict[str, int] = defaultdict(int)
+        self._random = random.Random(seed)
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, path: str, **kwargs: Any) -> "ReplayStore":
+        with open(path, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        return cls(records, **kwargs)
+
+    def lookup(self, endpoint: str, body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        key = replay_key(body)
+        candidates = self._by_key.get(key)
+        if candidates:
+            self.hits += 1
+            turn = self._turns[key]
+            self._turns[key] += 1
+            return candidates[turn % len(candidates)]
+        self.misses += 1
+        if self.on_miss == "sample" and self._by_endpoint.get(endpoint):
+            return self._random.choice(self._by_endpoint[endpoint])
+        return None
+
+
+class LatencyModel:
+    """
+    Latency of a replayed response, as (time to first token, total latency).
+    recorded:  the measured latencies of the recording times ``scale``
+    fixed:     ``fixed`` seconds
+    lognormal: drawn from a log-normal distribution fitted to the recorded latencies
+    tokens:    prompt_tokens / prefill_tps + completion_tokens / decode_tps
+    Every mode but recorded gets a multiplicative ``jitter`` noise.
+    """
+
+    def __init__(
+        self,
+        mode: str = "recorded",
+        *,
+        scale: float = 1.0,
+        fixed: float = 0.5,
+        prefill_tps: float = 5000.0,
+        decode_tps: float = 50.0,
+        jitter: float = 0.1,
+        seed: Optional[int] = None,
+    ):
+        if mode not in LATENCY_MODES:
+            raise ValueError(f"Unsupported latency mode: {mode}, expected one of {LATENCY_MODES}")
+        self.mode = mode
+        self.scale = scale
+        self.fixed = fixed
+        self.prefill_tps = prefill_tps
+        self.decode_tps = decode_tps
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._mu = 0.0
+        self._sigma = 0.0
+
+    def fit(self, records: List[Dict[str, Any]]) -> "LatencyModel":
+        logs = [math.log(r["latency"]) for r in records if r.get("latency")]
+        if logs:
+            self._mu = sum(logs) / len(logs)
+            self._sigma = math.sqrt(sum((x - self._mu) ** 2 for x in logs) / len(logs))
+        return self
+
+    def _noise(self) -> float:
+        return max(0.0, 1.0 + self._random.uniform(-self.jitter, self.jitter))
+
+    def sample(self, record: Dict[str, Any]) -> Tuple[float, float]:
+        latency = record.get("latency") or 0.0
+        ttft = record.get("ttft")
+        ttft_share = ttft / latency if ttft is not None and latency else 0.1
+        if self.mode == "recorded":
+            return ttft_share * latency * self.scale, latency * self.scale
+        if self.mode == "fixed":
+            total = self.fixed * self._noise()
+        elif self.mode == "lognormal":
+            total = self._random.lognormvariate(self._mu, self._sigma) * self.scale
+        else:
+            prompt_tokens, completion_tokens = _usage_tokens(record)
+            first = prompt_tokens / self.prefill_tps * self._noise()
+            return first, first + completion_tokens / self.decode_tps * self._noise()
+        return ttft_share * total, total
+
+
+class FaultInjector:
+    """Fail a share of the requests like an overloaded backend: 429, 503 or a hang past the client timeout."""
+
+    def __init__(
+        self,
+        rate_limit_rate: float = 0.0,
+        server_error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        timeout_seconds: float = 600.0,
+        seed: Optional[int] = None,
+    ):
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self._random = random.Random(seed)
+        self.injected: Dict[str, int] = defaultdict(int)
+
+    async def inject(self) -> Optional[JSONResponse]:
+        draw = self._random.random()
+        if draw < self.rate_limit_rate:
+            self.injected["rate_limit"] += 1
+            return JSONResponse(
+                status_code=429, content={"error": {"message": "Rate limit exceeded (injected)", "type": "rate_limit"}}
+            )
+        draw -= self.rate_limit_rate
+        if draw < self.server_error_rate:
+            self.injected["server_error"] += 1
+            return JSONResponse(
+                status_code=503, content={"error": {"message": "Server overloaded (injected)", "type": "overloaded"}}
+            )
+        draw -= self.server_error_rate
+        if draw < self.timeout_rate:
+            self.injected["timeout"] += 1
+            await asyncio.sleep(self.timeout_seconds)
+            return JSONResponse(status_code=504, content={"error": {"message": "Timeout (injected)"}})
+        return None
+
+
+def _stream_chunk(record: Dict[str, Any], model: str, content: Optional[str] = None, usage: Any = None) -> str:
+    if record.get("endpoint") == "completions":
+        obj, choice = "text_completion", {"index": 0, "text": content, "finish_reason": None}
+    else:
+        obj, choice = "chat.completion.chunk", {"index": 0, "delta": {"content": content}, "finish_reason": None}
+    chunk = {
+        "id": f"replay-{record['key'][:12]}",
+        "object": obj,
+        "created": int(time.time()),
+        "model": model,
+        "choices": [] if content is None else [choice],
+    }
+    if usage is not None:
+        chunk["usage"] = usage
+    return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+
+def _recorded_pieces(record: Dict[str, Any]) -> List[str]:
+    if record.get("chunks") is not None:
+        return record["chunks"]
+    # non streamed recording replayed as a stream, a few characters per chunk
+    choice = record["response"]["choices"][0]
+    if record.get("endpoint") == "completions":
+        content = choice.get("text") or ""
+    else:
+        content = choice["message"]["content"] or ""
+    return [content[i:i + 4] for i in range(0, len(content), 4)]
+
+
+def _recorded_response(record: Dict[str, Any], model: str) -> Dict[str, Any]:
+    if record.get("response") is not None:
+        return {**record["response"], "model": model}
+    # streamed recording replayed as one response
+    return {
+        "id": f"replay-{record['key'][:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": "".join(record.get("chunks") or [])},
+        }],
+        "usage": record.get("usage"),
+    }
+
+
+def create_replay_app(
+    store: ReplayStore,
+    latency: Optional[LatencyModel] = None,
+    faults: Optional[FaultInjector] = None,
+    max_concurrency: int = 0,
+    tokens_per_second: float = 0.0,
+) -> FastAPI:
+    """
+    Replay server app. ``max_concurrency`` requests are served at once (0: unbounded), the others
+    queue like on a saturated backend, and ``tokens_per_second`` caps the completion tokens
+    produced per second across all requests (0: unbounded).
+    """
+    latency = latency or LatencyModel().fit(store.records)
+    faults = faults or FaultInjector()
+    semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+    decode_budget = TokenBucket(capacity=tokens_per_second, rate=tokens_per_second) if tokens_per_second > 0 else None
+    stats = {"requests": 0, "in_flight": 0, "served": 0}
+
+    app = FastAPI(title="pycra LLM replay server")
+
+    async def _throttle(record: Dict[str, Any]):
+        if decode_budget is not None:
+            await decode_budget.acquire(max(1, _usage_tokens(record)[1]))
+
+    async def _stream(record: Dict[str, Any], model: str, ttft: float, total: float):
+        pieces = _recorded_pieces(record)
+        await asyncio.sleep(ttft)
+        gap = (total - ttft) / max(1, len(pieces) - 1)
+        for i, piece in enumerate(pieces):
+            if i:
+                await asyncio.sleep(gap)
+            yield _stream_chunk(record, model, piece)
+        yield _stream_chunk(record, model, usage=record.get("usage") or (record.get("response") or {}).get("usage"))
+        yield "data: [DONE]\n\n"
+
+    async def _serve(endpoint: str, request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        # faults are injected inside a slot: a hanging request occupies the backend like a real one
+        if semaphore is not None:
+            await semaphore.acquire()
+        stats["in_flight"] += 1
+
+        def release(served: bool = True):
+            stats["in_flight"] -= 1
+            stats["served"] += served
+            if semaphore is not None:
+                semaphore.release()
+
+        handed_off = served = False
+        try:
+            fault = await faults.inject()
+            if fault is not None:
+                return fault
+            record = store.lookup(endpoint, body)
+            if record is None:
+                return JSONResponse(status_code=404, content={"error": {"message": "Request not in the recording"}})
+            served = True
+            model = body.get("model", "replay")
+            ttft, total = latency.sample(record)
+            await _throttle(record)
+            if body.get("stream"):
+                # the slot is held until the stream is fully sent
+                async def stream_and_release():
+                    try:
+                        async for event in _stream(record, model, ttft, total):
+                            yield event
+                    finally:
+                        release()
+
+                handed_off = True
+                return StreamingResponse(stream_and_release(), media_type="text/event-stream")
+            await asyncio.sleep(total)
+            if endpoint == "completions":
+                return {**record["response"], "model": model}
+            return _recorded_response(record, model)
+        finally:
+            if not handed_off:
+                release(served)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        return await _serve("chat.completions", request)
+
+    @app.post("/v1/completions")
+    async def completions(request: Request):
+        return await _serve("completions", request)
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "replay", "object": "model", "created": 0, "owned_by": "pycra"}]}
+
+    @app.get("/stats")
+    async def replay_stats():
+        return {**stats, "hits": store.hits, "misses": store.misses, "faults": dict(faults.injected)}
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="OpenAI-compatible server replaying an LLM recording")
+    parser.add_argument("--recording", required=True, help="JSONL file written by LLMRecorder")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--on-miss", default="sample", choices=("sample", "error"))
+    parser.add_argument("--latency", default="recorded", choices=LATENCY_MODES)
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    parser.add_argument("--fixed-latency", type=float, default=0.5)
+    parser.add_argument("--prefill-tps", type=float, default=5000.0)
+    parser.add_argument("--decode-tps", type=float, default=50.0)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered 429")
+    parser.add_argument("--server-error-rate", type=float, default=0.0, help="share of requests answered 503")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="share of requests that hang")
+    parser.add_argument("--timeout-seconds", type=float, default=600.0)
+    parser.add_argument("--max-concurrency", type=int, default=0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    store = ReplayStore.load(args.recording, on_miss=args.on_miss, seed=args.seed)
+    latency = LatencyModel(
+        args.latency, scale=args.latency_scale, fixed=args.fixed_latency, prefill_tps=args.prefill_tps,
+        decode_tps=args.decode_tps, jitter=args.jitter, seed=args.seed,
+    ).fit(store.records)
+    faults = FaultInjector(
+        args.rate_limit_rate, args.server_error_rate, args.timeout_rate, args.timeout_seconds, seed=args.seed
+    )
+    logger.info(f"Replaying {len(store.records)} recorded LLM responses from {args.recording}")
+    app = create_replay_app(store, latency, faults, args.max_concurrency, args.tokens_per_second)
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,40 +2,53 @@ from .base_tokenizer import BaseTokenizer
 from .datatypes import Token
 from .tiktoken_tokenizer import TiktokenTokenizer
 from .hf_tokenizer import HFTokenizer
+from .registry import get_tokenizer, register_tokenizer, resolve_tokenizer
+from .count_cache import TokenCountCache, token_count_cache, register_static_segment
 
-from typing import List
+from typing import List, Optional, Sequence
 from dataclasses import dataclass, field
-try:
-    from transformers import AutoTokenizer
-    _HF_AVAILABLE = True
-except ImportError:
-    _HF_AVAILABLE = False
+
 
 def get_tokenizer_impl(tokenizer_name: str = "cl100k_base") -> BaseTokenizer:
-    return TiktokenTokenizer(model_name=tokenizer_name)
+    return get_tokenizer(tokenizer_name)
 
 @dataclass
 class Tokenizer(BaseTokenizer):
     """
     Encapsulates different tokenization implementations based on the specified model name.
+    The implementation is resolved by the tokenizer registry (tiktoken encoding or HF tokenizer
+    of the model), loaded on first use and shared by every Tokenizer of the same model.
+    Token counts go through the process-wide token count cache.
     """
 
     model_name: str = "cl100k_base"
-    _impl: BaseTokenizer = field(init=False, repr=False)
+    _impl: Optional[BaseTokenizer] = field(default=None, init=False, repr=False)
 
     def __post_init__(self):
         if not self.model_name:
             raise ValueError("TOKENIZER_MODEL must be specified in the ENV variables.")
-        # TODO tokenizer impl的tokenizer_name传参可能有些问题
-        # 具体来说, tokenizer_name的默认值是bpe编码的, 如果这里直接传qwen30b就会报错
-        # 遇到bbpe怎么办呢? 后面考虑做一个映射规则
-        self._impl = get_tokenizer_impl()
+
+    @property
+    def impl(self) -> BaseTokenizer:
+        if self._impl is None:
+            self._impl = get_tokenizer_impl(self.model_name)
+        return self._impl
 
     def encode(self, text: str) -> List[int]:
-        return self._impl.encode(text)
+        return self.impl.encode(text)
 
     def decode(self, token_ids: List[int]) -> str:
-        return self._impl.decode(token_ids)
+        return self.impl.decode(token_ids)
 
     def count_tokens(self, text: str) -> int:
-        return self._impl.count_tokens(text)
\ No newline at end of file
+        # implementations are shared process-wide, so their id identifies the vocabulary
+        return token_count_cache().count(id(self.impl), text, self.impl.count_tokens)
+
+    def estimate_tokens(self, text: str) -> int:
+        return token_count_cache().estimate(id(self.impl), text, self.impl.count_tokens)
+
+    def encode_batch(self, texts: Sequence[str]) -> List[List[int]]:
+        return self.impl.encode_batch(texts)
+
+    def count_tokens_batch(self, texts: Sequence[str]) -> List[int]:
+        return token_count_cache().count_batch(id(self.impl), texts, self.impl.count_tokens_batch)
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import List
+from typing import List, Sequence
 
 
 @dataclass
@@ -22,6 +22,17 @@ class BaseTokenizer(ABC):
     def count_tokens(self, text: str) -> int:
         return len(self.encode(text))
 
+    def estimate_tokens(self, text: str) -> int:
+        """Token count of a prompt for rate limiting and logging, may be approximate."""
+        return self.count_tokens(text)
+
+    def encode_batch(self, texts: Sequence[str]) -> List[List[int]]:
+        """Encode many texts at once, backends override it with a parallel implementation."""
+        return [self.encode(text) for text in texts]
+
+    def count_tokens_batch(self, texts: Sequence[str]) -> List[int]:
+        return [len(ids) for ids in self.encode_batch(texts)]
+
     def chunk_by_token_size(
         self,
         content: str,
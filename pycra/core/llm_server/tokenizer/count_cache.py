@@ -0,0 +1,135 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Sequence, Tuple
+
+DEFAULT_MAX_ENTRIES = 65536
+
+
+def content_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class TokenCountCache:
+    """
+    Bounded LRU of token counts keyed by (tokenizer, content hash).
+
+    Only the 16 byte digest of a text is kept, not the text itself, so hot strings (system
+    prompt, templates, chunks and descriptions counted again at every merge) cost one hash
+    instead of a full tokenization. Static template segments registered with
+    ``register_segment`` let ``estimate`` count a prompt as cached segment + variable rest.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._counts: "OrderedDict[Tuple[Hashable, bytes], int]" = OrderedDict()
+        self._segments: List[str] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.segment_hits = 0
+
+    def _get(self, key: Tuple[Hashable, bytes]):
+        with self._lock:
+            count = self._counts.get(key)
+            if count is None:
+                self.misses += 1
+                return None
+            self._counts.move_to_end(key)
+            self.hits += 1
+            return count
+
+    def _put(self, key: Tuple[Hashable, bytes], count: int):
+        with self._lock:
+            self._counts[key] = count
+            self._counts.move_to_end(key)
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+                self.evictions += 1
+
+    def count(self, namespace: Hashable, text: str, counter: Callable[[str], int]) -> int:
+        """Token count of ``text``, ``counter`` is only called on a miss."""
+        if self.max_entries <= 0:
+            return counter(text)
+        key = (namespace, content_hash(text))
+        count = self._get(key)
+        if count is None:
+            count = counter(text)
+            self._put(key, count)
+        return count
+
+    def count_batch(
+        self, namespace: Hashable, texts: Sequence[str], counter_batch: Callable[[Sequence[str]], List[int]]
+    ) -> List[int]:
+        """Token counts of many texts, the misses are counted in one ``counter_batch`` call."""
+        if self.max_entries <= 0:
+            return counter_batch(texts)
+        keys = [(namespace, content_hash(text)) for text in texts]
+        counts = [self._get(key) for key in keys]
+        missing = [i for i, count in enumerate(counts) if count is None]
+        if missing:
+            for i, count in zip(missing, counter_batch([texts[i] for i in missing])):
+                counts[i] = count
+                self._put(keys[i], count)
+        return counts
+
+    def register_segment(self, segment: str):
+        """Register a static prompt segment (template prefix, system prompt) for ``estimate``."""
+        if not segment:
+            return
+        with self._lock:
+            if segment in self._segments:
+                return
+            # longest first, so the most specific segment matches; a new list keeps ``estimate`` lock free
+            self._segments = sorted(self._segments + [segment], key=len, reverse=True)
+
+    def estimate(self, namespace: Hashable, text: str, counter: Callable[[str], int]) -> int:
+        """
+        Token count estimate of a prompt: a registered segment at the start of ``text`` is counted
+        from the cache, only the variable rest is tokenized. Tokens merged across the boundary
+        may make the estimate off by one, fine for rate limiting and logging, use ``count`` for
+        exact counts.
+        """
+        for segment in self._segments:
+            if len(segment) < len(text) and text.startswith(segment):
+                self.segment_hits += 1
+                return self.count(namespace, segment, counter) + counter(text[len(segment):])
+        return self.count(namespace, text, counter)
+
+    def resize(self, max_entries: int):
+        with self._lock:
+            self.max_entries = max_entries
+            while len(self._counts) > max(max_entries, 0):
+                self._counts.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+            self.hits = self.misses = self.evictions = self.segment_hits = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._counts),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "segments": len(self._segments),
+            "segment_hits": self.segment_hits,
+        }
+
+
+_token_count_cache = TokenCountCache()
+
+
+def token_count_cache() -> TokenCountCache:
+    """Token count cache shared by every Tokenizer of the process."""
+    return _token_count_cache
+
+
+def register_static_segment(segment: str):
+    _token_count_cache.register_segment(segment)
@@ -1,18 +1,42 @@
 from dataclasses import dataclass
-from typing import List
-
-from transformers import AutoTokenizer
+from functools import lru_cache
+from typing import Any, List, Sequence
 
 from .base_tokenizer import BaseTokenizer
 
 
+@lru_cache(maxsize=None)
+def _load_auto_tokenizer(model_name: str) -> Any:
+    """Load a HF tokenizer once per process, the instances of HFTokenizer share it."""
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(model_name)
+
+
 @dataclass
 class HFTokenizer(BaseTokenizer):
     def __post_init__(self):
-        self.enc = AutoTokenizer.from_pretrained(self.model_name)
+        self.enc = _load_auto_tokenizer(self.model_name)
+        # rust tokenizer of fast tokenizers, counts without building python id lists
+        self._backend = getattr(self.enc, "backend_tokenizer", None)
 
     def encode(self, text: str) -> List[int]:
         return self.enc.encode(text, add_special_tokens=False)
 
     def decode(self, token_ids: List[int]) -> str:
         return self.enc.decode(token_ids, skip_special_tokens=True)
+
+    def count_tokens(self, text: str) -> int:
+        if self._backend is None:
+            return len(self.encode(text))
+        return len(self._backend.encode(text, add_special_tokens=False))
+
+    def encode_batch(self, texts: Sequence[str]) -> List[List[int]]:
+        if self._backend is None:
+            return [self.encode(text) for text in texts]
+        return [encoding.ids for encoding in self._backend.encode_batch(list(texts), add_special_tokens=False)]
+
+    def count_tokens_batch(self, texts: Sequence[str]) -> List[int]:
+        if self._backend is None:
+            return [len(ids) for ids in self.encode_batch(texts)]
+        return [len(encoding) for encoding in self._backend.encode_batch(list(texts), add_special_tokens=False)]
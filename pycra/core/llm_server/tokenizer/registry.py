@@ -0,0 +1,91 @@
+import os
+import re
+import threading
+from typing import Dict, List, Tuple
+
+from pycra.utils.logger import llm_logger as logger
+
+from .base_tokenizer import BaseTokenizer
+from .tiktoken_tokenizer import TiktokenTokenizer
+
+DEFAULT_ENCODING = "cl100k_base"
+TIKTOKEN_ENCODINGS = ("cl100k_base", "o200k_base", "p50k_base", "r50k_base", "gpt2")
+
+# (model name pattern, backend, tokenizer name), the first match wins
+# served model aliases (e.g. qwen30b of lmdeploy / vLLM) are matched loosely on purpose
+_TOKENIZER_RULES: List[Tuple[re.Pattern, str, str]] = [
+    (re.compile(p, re.IGNORECASE), backend, name)
+    for p, backend, name in [
+        (r"^(gpt-4o|gpt-4\.1|gpt-5|o1|o3|o4)", "tiktoken", "o200k_base"),
+        (r"^(gpt-4|gpt-3\.5|text-embedding-3|text-embedding-ada)", "tiktoken", "cl100k_base"),
+        (r"qwen-?3|qwen30b|qwen-30b", "hf", "Qwen/Qwen3-30B-A3B"),
+        (r"qwen-?2\.5|qwq", "hf", "Qwen/Qwen2.5-7B-Instruct"),
+        (r"qwen-?2", "hf", "Qwen/Qwen2-7B-Instruct"),
+        (r"deepseek", "hf", "deepseek-ai/DeepSeek-V3"),
+        (r"glm-?4", "hf", "THUDM/glm-4-9b-chat"),
+        (r"bge-m3", "hf", "BAAI/bge-m3"),
+    ]
+]
+
+_tokenizers: Dict[Tuple[str, str], BaseTokenizer] = {}
+_lock = threading.RLock()
+
+
+def register_tokenizer(pattern: str, backend: str, name: str):
+    """Map model names matching ``pattern`` to a tiktoken encoding or a HF tokenizer (repo id or path)."""
+    if backend not in ("tiktoken", "hf"):
+        raise ValueError(f"Unsupported tokenizer backend: {backend}")
+    _TOKENIZER_RULES.insert(0, (re.compile(pattern, re.IGNORECASE), backend, name))
+
+
+def resolve_tokenizer(model_name: str) -> Tuple[str, str]:
+    """(backend, tokenizer name) of a model name, a tiktoken encoding, a HF repo id or a local path."""
+    if model_name in TIKTOKEN_ENCODINGS:
+        return "tiktoken", model_name
+    for pattern, backend, name in _TOKENIZER_RULES:
+        if pattern.search(model_name):
+            if backend == "hf" and "/" in model_name:
+                # an explicit repo id or path wins over the family default
+                return "hf", model_name
+            return backend, name
+    if os.path.isdir(model_name) or "/" in model_name:
+        # local tokenizer directory or HF repo id
+        return "hf", model_name
+    return "tiktoken", DEFAULT_ENCODING
+
+
+def _load(backend: str, name: str) -> BaseTokenizer:
+    if backend == "tiktoken":
+        return TiktokenTokenizer(model_name=name)
+    from .hf_tokenizer import HFTokenizer
+
+    return HFTokenizer(model_name=name)
+
+
+def get_tokenizer(model_name: str) -> BaseTokenizer:
+    """
+    Shared tokenizer of a model, loaded on first use and reused by every client of the process.
+    A HF tokenizer that cannot be loaded (offline, transformers missing) falls back to cl100k_base,
+    token counts are then approximate.
+    """
+    key = resolve_tokenizer(model_name)
+    tokenizer = _tokenizers.get(key)
+    if tokenizer is not None:
+        return tokenizer
+    with _lock:
+        tokenizer = _tokenizers.get(key)
+        if tokenizer is None:
+            backend, name = key
+            try:
+                tokenizer = _load(backend, name)
+                logger.info(f"Loaded {backend} tokenizer {name} for model {model_name}")
+            except Exception as e:  # pylint: disable=broad-except
+                if key == ("tiktoken", DEFAULT_ENCODING):
+                    raise
+                logger.warning(
+                    f"Cannot load {backend} tokenizer {name} for model {model_name}: {e}, "
+                    f"falling back to {DEFAULT_ENCODING}, token counts are approximate"
+                )
+                tokenizer = get_tokenizer(DEFAULT_ENCODING)
+            _tokenizers[key] = tokenizer
+    return tokenizer
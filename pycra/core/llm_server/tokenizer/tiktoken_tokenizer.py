@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import List
+from typing import List, Sequence
 
 import tiktoken
 
@@ -9,10 +9,15 @@ from .base_tokenizer import BaseTokenizer
 @dataclass
 class TiktokenTokenizer(BaseTokenizer):
     def __post_init__(self):
+        # tiktoken caches the encodings itself, instances share them
         self.enc = tiktoken.get_encoding(self.model_name)
 
     def encode(self, text: str) -> List[int]:
-        return self.enc.encode(text)
+        # special tokens in documents are plain text, encode() would raise on them
+        return self.enc.encode_ordinary(text)
 
     def decode(self, token_ids: List[int]) -> str:
         return self.enc.decode(token_ids)
+
+    def encode_batch(self, texts: Sequence[str]) -> List[List[int]]:
+        return self.enc.encode_ordinary_batch(list(texts))
@@ -0,0 +1,135 @@
+import importlib.util
+import time
+import weakref
+from typing import Any, Dict, Optional, Union
+
+import httpx
+
+from pycra.utils.logger import llm_logger as logger
+
+
+class TransportMetrics:
+    """
+    Connection reuse counters of a pooled transport.
+    A request served over a network stream not seen before opened a new connection.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.errors = 0
+        self.started_at = time.monotonic()
+        self._streams = weakref.WeakSet()
+
+    def record(self, response: httpx.Response):
+        self.requests += 1
+        stream = response.extensions.get("network_stream")
+        if stream is None:
+            return
+        try:
+            if stream not in self._streams:
+                self._streams.add(stream)
+                self.new_connections += 1
+        except TypeError:
+            # not weak-referenceable, count as reused rather than guessing
+            pass
+
+    def to_dict(self) -> Dict[str, Any]:
+        reused = max(0, self.requests - self.new_connections)
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": reused,
+            "reuse_ratio": reused / self.requests if self.requests else 0.0,
+            "errors": self.errors,
+            "uptime": time.monotonic() - self.started_at,
+        }
+
+
+class MeteredAsyncTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.metrics = TransportMetrics()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        try:
+            response = await super().handle_async_request(request)
+        except httpx.TransportError:
+            self.metrics.errors += 1
+            raise
+        self.metrics.record(response)
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.metrics.to_dict(), "open_connections": len(self._pool.connections)}
+
+
+class MeteredTransport(httpx.HTTPTransport):
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.metrics = TransportMetrics()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        try:
+            response = super().handle_request(request)
+        except httpx.TransportError:
+            self.metrics.errors += 1
+            raise
+        self.metrics.record(response)
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.metrics.to_dict(), "open_connections": len(self._pool.connections)}
+
+
+def _transport_options(
+    max_connections: int,
+    max_keepalive_connections: int,
+    keepalive_expiry: float,
+    http2: bool,
+) -> Dict[str, Any]:
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP/2 requested for the LLM transport but the h2 package is missing, using HTTP/1.1")
+        http2 = False
+    return {
+        "limits": httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        ),
+        "http2": http2,
+    }
+
+
+def build_http_client(
+    *,
+    max_connections: int = 512,
+    max_keepalive_connections: int = 128,
+    keepalive_expiry: float = 30.0,
+    http2: bool = False,
+    connect_timeout: float = 10.0,
+    read_timeout: float = 600.0,
+    write_timeout: float = 30.0,
+    pool_timeout: float = 60.0,
+    sync: bool = False,
+) -> Union[httpx.AsyncClient, httpx.Client]:
+    """
+    Build a pooled httpx client (async, or sync with ``sync=True``) on a metered transport.
+    The pool limits also bound the number of concurrent connections to the LLM backends.
+    """
+    timeout = httpx.Timeout(
+        connect=connect_timeout, read=read_timeout, write=write_timeout, pool=pool_timeout
+    )
+    options = _transport_options(max_connections, max_keepalive_connections, keepalive_expiry, http2)
+    if sync:
+        return httpx.Client(transport=MeteredTransport(**options), timeout=timeout, follow_redirects=True)
+    return httpx.AsyncClient(
+        transport=MeteredAsyncTransport(**options), timeout=timeout, follow_redirects=True
+    )
+
+
+def http_client_stats(client: Optional[Union[httpx.AsyncClient, httpx.Client]]) -> Optional[Dict[str, Any]]:
+    transport = getattr(client, "_transport", None)
+    if not isinstance(transport, (MeteredAsyncTransport, MeteredTransport)):
+        return None
+    return transport.stats()
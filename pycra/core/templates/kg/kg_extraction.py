@@ -290,20 +290,41 @@ Answer YES | NO if there are still entities and relationships that need to be ad
 
 IF_LOOP_ZH: str = """看起来可能仍然遗漏了一些实体和关系。如果仍有实体和关系需要添加，请回答YES | NO。"""
 
+# one-call gleaning: extends the extraction or answers the no-more delimiter
+CONTINUE_OR_STOP_EN: str = """Some entities and relationships may have been missed in the last extraction.  \
+If so, add them below using the same format. If nothing was missed, answer only {no_more_delimiter}
+"""
+
+CONTINUE_OR_STOP_ZH: str = """上一次的提取中可能遗漏了一些实体和关系。如果有遗漏，请在下面使用相同的格式添加它们；如果没有遗漏，请只回答{no_more_delimiter}"""
+
+# compact gleaning history: stands in for the transcript of the previous answers
+EXTRACTED_EN: str = """Entities extracted so far: {entity_names}
+Relationships extracted so far: {relation_pairs}
+"""
+
+EXTRACTED_ZH: str = """已提取的实体：{entity_names}
+已提取的关系：{relation_pairs}
+"""
+
 KG_EXTRACTION_PROMPT: dict = {
     "en": {
         "TEMPLATE": TEMPLATE_EN,
         "CONTINUE": CONTINUE_EN,
         "IF_LOOP": IF_LOOP_EN,
+        "CONTINUE_OR_STOP": CONTINUE_OR_STOP_EN,
+        "EXTRACTED": EXTRACTED_EN,
     },
     "zh": {
         "TEMPLATE": TEMPLATE_ZH,
         "CONTINUE": CONTINUE_ZH,
         "IF_LOOP": IF_LOOP_ZH,
+        "CONTINUE_OR_STOP": CONTINUE_OR_STOP_ZH,
+        "EXTRACTED": EXTRACTED_ZH,
     },
     "FORMAT": {
         "tuple_delimiter": "<|>",
         "record_delimiter": "##",
-        "completion_delimiter": "<|COMPLETE|>"
+        "completion_delimiter": "<|COMPLETE|>",
+        "no_more_delimiter": "<|NO_MORE|>"
     },
 }
\ No newline at end of file
@@ -28,13 +28,66 @@ TEMPLATE_ZH = """你是一个NLP专家，负责根据以下提供的数据生成
 输出：
 """
 
+BATCH_TEMPLATE_EN = """You are an NLP expert responsible for generating comprehensive summaries of the data provided below.
+Every item gives one entity or relationship, and a list of descriptions, all related to that entity or relationship.
+For each item, please concatenate all of its descriptions into a single, comprehensive description. Make sure to include information collected from all the descriptions of the item.
+If the provided descriptions are contradictory, please resolve the contradictions and provide a single, coherent summary.
+Make sure it is written in third person, and include the entity names so we the have full context.
+Never mix the descriptions of different items.
+Use {language} as output language.
+Answer every item in the given order, each summary starting with the marker of its item:
+<|ITEM 1|> summary of item 1
+<|ITEM 2|> summary of item 2
+and end the answer with {completion_delimiter}
+
+#######
+-Data-
+{items}
+#######
+Output:
+"""
+
+BATCH_TEMPLATE_ZH = """你是一个NLP专家，负责根据以下提供的数据生成综合摘要。
+每一项给定一个实体或关系，以及一系列描述，所有描述都与该实体或关系相关。
+对每一项，请将它的所有描述整合成一个综合描述。确保包含该项所有描述中收集的信息。
+如果提供的描述是矛盾的，请解决这些矛盾并提供一个连贯的总结。
+确保以第三人称写作，并包含实体名称，以便我们有完整的上下文。
+不要混用不同项的描述。
+使用{language}作为输出语言。
+按给定顺序回答每一项，每个摘要以该项的标记开头：
+<|ITEM 1|> 第1项的摘要
+<|ITEM 2|> 第2项的摘要
+回答以{completion_delimiter}结束
+
+#######
+-数据-
+{items}
+#######
+输出：
+"""
+
+# one item of the batch templates
+BATCH_ITEM_EN = """<|ITEM {index}|>
+Entities: {entity_name}
+Description List: {description_list}
+"""
+
+BATCH_ITEM_ZH = """<|ITEM {index}|>
+实体：{entity_name}
+描述列表：{description_list}
+"""
+
 
 KG_SUMMARIZATION_PROMPT = {
     "Chinese": {
-        "TEMPLATE": TEMPLATE_ZH
+        "TEMPLATE": TEMPLATE_ZH,
+        "BATCH_TEMPLATE": BATCH_TEMPLATE_ZH,
+        "BATCH_ITEM": BATCH_ITEM_ZH,
     },
     "English": {
-        "TEMPLATE": TEMPLATE_EN
+        "TEMPLATE": TEMPLATE_EN,
+        "BATCH_TEMPLATE": BATCH_TEMPLATE_EN,
+        "BATCH_ITEM": BATCH_ITEM_EN,
     },
     "FORMAT": {
         "language": "English",
@@ -0,0 +1,31 @@
+from hashlib import md5
+from typing import Any, Sequence
+
+from pycra.core.llm_server.tokenizer.count_cache import register_static_segment
+
+
+class PrefixTemplate:
+    """
+    Prompt template split into a static prefix and a variable suffix.
+
+    The static fields are formatted once, so every prompt built from the template starts with
+    the very same bytes. Prefix caching of lmdeploy / vLLM only reuses the KV cache of a prefix
+    that is byte-identical, so the variable fields must come last in the template.
+    ``prefix_key`` identifies the prefix for prefix-aware scheduling, the prefix is registered
+    with the token count cache so token estimates only tokenize the variable suffix.
+    """
+
+    def __init__(self, template: str, variable_fields: Sequence[str], **static_fields: Any):
+        positions = [template.find("{" + field + "}") for field in variable_fields]
+        if not positions or min(positions) < 0:
+            raise ValueError(f"Template does not contain all variable fields: {list(variable_fields)}")
+        first = min(positions)
+        self.variable_fields = tuple(variable_fields)
+        self.static_fields = static_fields
+        self.prefix = template[:first].format(**static_fields)
+        self.suffix_template = template[first:]
+        self.prefix_key = md5(self.prefix.encode()).hexdigest()
+        register_static_segment(self.prefix)
+
+    def format(self, **variables: Any) -> str:
+        return self.prefix + self.suffix_template.format(**self.static_fields, **variables)
@@ -64,6 +64,32 @@ def split_string_by_multi_markers(content: str, markers: list[str]) -> list[str]
     results = re.split("|".join(re.escape(marker) for marker in markers), content)
     return [r.strip() for r in results if r.strip()]
 
+class RecordStreamParser:
+    """
+    Split streamed LLM output into records incrementally.
+    ``feed`` returns the records completed by the new piece, ``close`` the last pending one.
+    Content of <think> blocks is skipped.
+    """
+
+    def __init__(self, markers: list[str], think_tag: str = "think"):
+        self._pattern = re.compile("|".join(re.escape(m) for m in markers if m))
+        self._think_open = f"<{think_tag}>"
+        self._think_pattern = re.compile(rf"<{think_tag}>.*?</{think_tag}>", re.DOTALL)
+        self._buffer = ""
+
+    def feed(self, piece: str) -> list[str]:
+        self._buffer = self._think_pattern.sub("", self._buffer + piece)
+        # an unclosed think block holds back everything after it
+        head, think_open, tail = self._buffer.partition(self._think_open)
+        parts = self._pattern.split(head)
+        self._buffer = parts.pop() + think_open + tail
+        return [p.strip() for p in parts if p.strip()]
+
+    def close(self) -> list[str]:
+        rest = self._buffer.split(self._think_open, 1)[0].strip()
+        self._buffer = ""
+        return [rest] if rest else []
+
 def clean_str(input: Any) -> str:
     """Clean an input string by removing HTML escapes, control characters, and other unwanted characters."""
     # If we get non-string input, just give it back
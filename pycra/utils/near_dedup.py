@@ -0,0 +1,80 @@
+import hashlib
+import re
+from typing import List, Sequence
+
+import numpy as np
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WHITESPACE = re.compile(r"\s+")
+_CJK = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]")
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+def char_shingles(text: str, size: int = 3, cjk_size: int = 2) -> set:
+    """
+    Character n-grams of a text, lower-cased and with whitespace collapsed.
+    Character shingles need no word segmentation, so they work for Chinese as well as English;
+    a CJK character carries about as much as a short word, mostly CJK texts use ``cjk_size``.
+    """
+    text = _WHITESPACE.sub(" ", text.lower()).strip()
+    if len(_CJK.findall(text)) * 2 > len(text):
+        size = cjk_size
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class MinHasher:
+    """
+    MinHash signatures of character shingle sets, the share of equal signature slots of two
+    texts estimates the Jaccard similarity of their shingles. Seeded, so signatures are stable
+    across processes (unlike the built-in hash of str).
+    """
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 3, cjk_shingle_size: int = 2, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.cjk_shingle_size = cjk_shingle_size
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, int(_MAX_HASH), size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, int(_MAX_HASH), size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        shingles = char_shingles(text, self.shingle_size, self.cjk_shingle_size)
+        if not shingles:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles],
+            dtype=np.uint64,
+        )
+        # (a * h + b) mod p for every permutation and shingle, the min over the shingles
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+    def signatures(self, texts: Sequence[str]) -> np.ndarray:
+        return np.stack([self.signature(text) for text in texts]) if texts else np.zeros((0, self.num_perm), np.uint64)
+
+
+_default_hasher = MinHasher()
+
+
+def collapse_near_duplicates(texts: Sequence[str], threshold: float, hasher: MinHasher = None) -> List[str]:
+    """
+    Drop the texts whose estimated shingle Jaccard similarity with a kept text reaches ``threshold``.
+    Texts quoting different numbers (amounts, dates, days) are never collapsed, they state different
+    facts however close their wording. Longer texts are considered first, so the most detailed
+    phrasing of a fact is the one kept; the result keeps the input order.
+    """
+    if threshold <= 0 or len(texts) < 2:
+        return list(texts)
+    hasher = hasher or _default_hasher
+    signatures = hasher.signatures(texts)
+    numbers = [tuple(_NUMBER.findall(text)) for text in texts]
+    kept: List[int] = []
+    for i in sorted(range(len(texts)), key=lambda i: -len(texts[i])):
+        candidates = [k for k in kept if numbers[k] == numbers[i]]
+        if candidates and (signatures[candidates] == signatures[i]).mean(axis=1).max() >= threshold:
+            continue
+        kept.append(i)
+    return [texts[i] for i in sorted(kept)]
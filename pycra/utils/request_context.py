@@ -0,0 +1,130 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from pycra.utils.logger import logger
+
+DEADLINE_EXCEEDED = "deadline exceeded"
+CLIENT_DISCONNECTED = "client disconnected"
+
+
+class RequestCancelled(Exception):
+    """The API request owning the work timed out or its client went away."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class RequestContext:
+    """
+    Deadline and cancellation state of one API request.
+    It is bound to a ContextVar, so the tasks spawned while serving the request
+    (run_concurrent, LLM calls) see it without passing it around.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, name: Optional[str] = None):
+        self.name = name
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.reason: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def cancelled(self) -> bool:
+        if self.reason is None and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel(DEADLINE_EXCEEDED)
+        return self.reason is not None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, None without a deadline."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def cancel(self, reason: str = "cancelled"):
+        """Cancel the request task, and with it every task and LLM call it is waiting on."""
+        if self.reason is not None:
+            return
+        self.reason = reason
+        logger.warning(f"{self.name or 'Request'} cancelled: {reason}")
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def check(self):
+        """Raise RequestCancelled if the request should stop, call it between units of work."""
+        if self.cancelled:
+            raise RequestCancelled(self.reason)
+
+
+_current_request: ContextVar[Optional[RequestContext]] = ContextVar("pycra_request_context", default=None)
+
+
+def current_request() -> Optional[RequestContext]:
+    return _current_request.get()
+
+
+def detach_request():
+    """
+    Unbind the request from the current context, for work shared by several requests
+    (see SingleFlight): it must not stop when the request that happened to start it does.
+    """
+    _current_request.set(None)
+
+
+def check_request():
+    """Raise RequestCancelled if the current request timed out or was abandoned."""
+    context = _current_request.get()
+    if context is not None:
+        context.check()
+
+
+async def _watch_disconnect(context: RequestContext, request: Any, interval: float):
+    while context.reason is None:
+        if await request.is_disconnected():
+            context.cancel(CLIENT_DISCONNECTED)
+            return
+        await asyncio.sleep(interval)
+
+
+@asynccontextmanager
+async def request_scope(
+    timeout: Optional[float] = None,
+    request: Any = None,
+    name: Optional[str] = None,
+    disconnect_poll_interval: float = 1.0,
+):
+    """
+    Run the block under a request deadline.
+    When ``timeout`` expires or the starlette ``request`` client disconnects, the task running
+    the block is cancelled, outstanding LLM calls are aborted and RequestCancelled is raised.
+    """
+    context = RequestContext(timeout, name=name)
+    context._task = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+    deadline_handle = None
+    if context.deadline is not None:
+        deadline_handle = loop.call_later(timeout, context.cancel, DEADLINE_EXCEEDED)
+    watcher = None
+    if request is not None:
+        watcher = asyncio.create_task(_watch_disconnect(context, request, disconnect_poll_interval))
+
+    token = _current_request.set(context)
+    try:
+        try:
+            yield context
+        except asyncio.CancelledError:
+            if context.reason is None:
+                raise
+        # our own cancellation (also when the block swallowed it), surface it as an error the route can answer
+        if context.reason is not None:
+            if context._task.cancelling():
+                context._task.uncancel()
+            raise RequestCancelled(context.reason) from None
+    finally:
+        _current_request.reset(token)
+        if deadline_handle is not None:
+            deadline_handle.cancel()
+        if watcher is not None:
+            watcher.cancel()
@@ -2,6 +2,7 @@ import asyncio
 from typing import Awaitable, Callable, List, Optional, TypeVar
 from tqdm.asyncio import tqdm as tqdm_async
 from pycra.utils.logger import logger
+from pycra.utils.request_context import RequestCancelled, check_request
 
 T = TypeVar("T")
 R = TypeVar("R")
@@ -13,6 +14,7 @@ async def run_concurrent(
     desc: str = "processing",
     unit: str = "item",
 ) -> List[R]:
+    check_request()
     tasks = [asyncio.create_task(coro_fn(it)) for it in items]
 
     completed_count = 0
@@ -20,18 +22,29 @@ async def run_concurrent(
 
     pbar = tqdm_async(total=len(items), desc=desc, unit=unit)
 
-    for future in asyncio.as_completed(tasks):
-        try:
-            result = await future
-            results.append(result)
-        except Exception as e:  # pylint: disable=broad-except
-            logger.exception("Task failed: %s", e)
-            # even if failed, record it to keep results consistent with tasks
-            results.append(e)
-
-        completed_count += 1
-        pbar.update(1)
-    pbar.close()
+    try:
+        for future in asyncio.as_completed(tasks):
+            try:
+                result = await future
+                results.append(result)
+            except RequestCancelled:
+                raise
+            except Exception as e:  # pylint: disable=broad-except
+                logger.exception("Task failed: %s", e)
+                # even if failed, record it to keep results consistent with tasks
+                results.append(e)
+
+            completed_count += 1
+            pbar.update(1)
+    finally:
+        # on cancellation (request deadline, client gone) do not leave the other tasks running
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                # mark the exception as retrieved, it is superseded by the cancellation
+                task.exception()
+        pbar.close()
 
     # filter out exceptions
     results = [res for res in results if not isinstance(res, Exception)]
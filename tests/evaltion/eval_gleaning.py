@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @File    : eval_gleaning.py
+# @Description: latency and token cost of the KG gleaning strategies against the configured LLM backend
+#
+# usage:
+#   python tests/evaltion/eval_gleaning.py --input contract.md --chunks 16 --max-loop 3 --glean-history full
+#
+# Every strategy (kg.glean_strategy) extracts the same chunks, the report shows per chunk latency,
+# LLM calls and prompt / completion tokens, and the savings relative to if_loop.
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List
+
+from pycra.core.document_processing import Chunk
+from pycra.core.knowledge_graph.service import GLEAN_HISTORIES, GLEAN_STRATEGIES, KgBuilder
+from pycra.core.llm_server import LLMFactory
+
+
+async def run_strategy(strategy: str, chunks: List[Chunk], max_loop: int, glean_history: str) -> Dict[str, float]:
+    llm_client = LLMFactory.create_llm_cli()
+    llm_client.cache = None
+    llm_client.single_flight = None
+    builder = KgBuilder(llm_client)
+    builder.glean_strategy = strategy
+    builder.max_loop = max_loop
+    builder.glean_history = glean_history
+
+    async def extract(chunk: Chunk):
+        start = time.perf_counter()
+        nodes, edges = await builder.local_perception_recognition(chunk)
+        return time.perf_counter() - start, len(nodes) + len(edges)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[extract(chunk) for chunk in chunks])
+    wall = time.perf_counter() - start
+    latencies = sorted(latency for latency, _ in results)
+    usage = llm_client.usage
+    return {
+        "latency_mean": statistics.mean(latencies),
+        "latency_p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "wall": wall,
+        "calls": usage.calls,
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "records": sum(count for _, count in results),
+    }
+
+
+def load_chunks(path: str, chunk_chars: int, count: int) -> List[Chunk]:
+    if not path:
+        texts = [
+            f"Party A shall pay Party B the amount of {i * 100} yuan before day {i % 28 + 1}. "
+            f"Party B shall deliver the goods to the warehouse of Party A within {i % 10 + 1} days."
+            for i in range(count)
+        ]
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+        texts = [content[i:i + chunk_chars] for i in range(0, len(content), chunk_chars)][:count]
+    return [Chunk(id=f"chunk-{i}", content=text) for i, text in enumerate(texts)]
+
+
+def _saving(value: float, baseline: float) -> str:
+    return f"{(1 - value / baseline) * 100:+.0f}%" if baseline else "-"
+
+
+async def run_all(args: argparse.Namespace):
+    chunks = load_chunks(args.input, args.chunk_chars, args.chunks)
+    results = {}
+    print(f"{'strategy':<20}{'mean':>9}{'p95':>9}{'wall':>9}{'calls':>7}{'prompt':>10}{'compl':>9}{'records':>9}")
+    for strategy in args.strategies:
+        result = results[strategy] = await run_strategy(strategy, chunks, args.max_loop, args.glean_history)
+        print(
+            f"{strategy:<20}{result['latency_mean']:>9.2f}{result['latency_p95']:>9.2f}{result['wall']:>9.2f}"
+            f"{result['calls']:>7d}{result['prompt_tokens']:>10d}{result['completion_tokens']:>9d}{result['records']:>9d}"
+        )
+    baseline = results.get("if_loop")
+    if baseline is None:
+        return
+    print("\nsavings relative to if_loop")
+    for strategy, result in results.items():
+        if strategy == "if_loop":
+            continue
+        print(
+            f"{strategy:<20}latency {_saving(result['latency_mean'], baseline['latency_mean'])}  "
+            f"calls {_saving(result['calls'], baseline['calls'])}  "
+            f"prompt tokens {_saving(result['prompt_tokens'], baseline['prompt_tokens'])}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and token cost of the KG gleaning strategies")
+    parser.add_argument("--input", default="", help="markdown file to cut into chunks, synthetic chunks if empty")
+    parser.add_argument("--chunk-chars", type=int, default=1500)
+    parser.add_argument("--chunks", type=int, default=16)
+    parser.add_argument("--max-loop", type=int, default=3)
+    parser.add_argument("--glean-history", default="full", choices=GLEAN_HISTORIES)
+    parser.add_argument("--strategies", nargs="+", default=list(GLEAN_STRATEGIES), choices=GLEAN_STRATEGIES)
+    args = parser.parse_args()
+
+    asyncio.run(run_all(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @File    : eval_kv_storage.py
+# @Description: JsonKVStorage vs SQLiteKVStorage on chunk-like records
+#
+# usage:
+#   python tests/evaltion/eval_kv_storage.py --keys 100000 --batch 1000 --work-dir /tmp/kv_bench
+#
+# Operations timed for every storage:
+#   load          open the storage (the JSON file is parsed whole, SQLite opens lazily)
+#   upsert_all    insert every key then commit (index_done_callback)
+#   get_by_ids    random batches of keys
+#   projection    the same batches with fields={"tokens", "full_doc_id"}
+#   filter_keys   all the keys plus as many unknown ones
+#   update_small  upsert 100 keys then commit, the cost of one incremental build
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import time
+from typing import Callable, Dict, List
+
+from pycra.core.knowledge_graph.graph_store import BaseKVStorage, JsonKVStorage, SQLiteKVStorage
+
+STORAGES: Dict[str, Callable[[str], BaseKVStorage]] = {
+    "json": lambda work_dir: JsonKVStorage(work_dir, namespace="bench"),
+    "sqlite": lambda work_dir: SQLiteKVStorage(work_dir, namespace="bench"),
+}
+
+
+def make_records(count: int) -> Dict[str, dict]:
+    rng = random.Random(0)
+    return {
+        f"bench-chunk-{i:08d}": {
+            "content": " ".join(rng.choice(("party", "payment", "delivery", "clause", "amount")) for _ in range(80)),
+            "tokens": rng.randint(200, 1024),
+            "full_doc_id": f"md-{i // 100}",
+            "chunk_order_index": i % 100,
+        }
+        for i in range(count)
+    }
+
+
+async def timed(fn) -> float:
+    start = time.perf_counter()
+    await fn()
+    return time.perf_counter() - start
+
+
+async def run_storage(name: str, work_dir: str, records: Dict[str, dict], batch: int, rounds: int) -> Dict[str, float]:
+    shutil.rmtree(work_dir, ignore_errors=True)
+    keys = list(records)
+    storage = STORAGES[name](work_dir)
+    result = {}
+
+    async def upsert_all():
+        await storage.upsert(records)
+        await storage.index_done_callback()
+
+    result["upsert_all"] = await timed(upsert_all)
+
+    start = time.perf_counter()
+    storage = STORAGES[name](work_dir)
+    await storage.get_by_ids(keys[:1])
+    result["load"] = time.perf_counter() - start
+
+    rng = random.Random(1)
+    batches = [rng.sample(keys, batch) for _ in range(rounds)]
+
+    async def get_batches():
+        for ids in batches:
+            await storage.get_by_ids(ids)
+
+    async def project_batches():
+        for ids in batches:
+            await storage.get_by_ids(ids, fields={"tokens", "full_doc_id"})
+
+    result["get_by_ids"] = await timed(get_batches) / rounds
+    result["projection"] = await timed(project_batches) / rounds
+    result["filter_keys"] = await timed(lambda: storage.filter_keys(keys + [f"unknown-{i}" for i in range(len(keys))]))
+
+    async def update_small():
+        await storage.upsert({key: {**records[key], "tokens": 0} for key in keys[:100]})
+        await storage.index_done_callback()
+
+    result["update_small"] = await timed(update_small)
+    result["size_mb"] = sum(
+        os.path.getsize(os.path.join(work_dir, f)) for f in os.listdir(work_dir)
+    ) / 1024 / 1024
+    return result
+
+
+async def run_all(args: argparse.Namespace):
+    records = make_records(args.keys)
+    columns: List[str] = ["load", "upsert_all", "get_by_ids", "projection", "filter_keys", "update_small"]
+    print(f"{args.keys} keys, get_by_ids batches of {args.batch} (seconds, get_by_ids / projection per batch)")
+    print(f"{'storage':<10}" + "".join(f"{c:>14}" for c in columns) + f"{'size_mb':>10}")
+    for name in args.storages:
+        result = await run_storage(name, os.path.join(args.work_dir, name), records, args.batch, args.rounds)
+        print(f"{name:<10}" + "".join(f"{result[c]:>14.4f}" for c in columns) + f"{result['size_mb']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JsonKVStorage vs SQLiteKVStorage")
+    parser.add_argument("--keys", type=int, default=100000)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--work-dir", default="cra/bench/kv_storage")
+    parser.add_argument("--storages", nargs="+", default=list(STORAGES), choices=list(STORAGES))
+    args = parser.parse_args()
+
+    asyncio.run(run_all(args))
+
+
+if __name__ == "__main__":
+    main()
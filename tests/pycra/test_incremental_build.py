@@ -0,0 +1,69 @@
+import asyncio
+import re
+from dataclasses import dataclass
+
+from pycra import settings
+from pycra.core.knowledge_graph.service import KgBuilder
+from pycra.core.llm_server.tokenizer import BaseTokenizer
+
+
+@dataclass
+class CharTokenizer(BaseTokenizer):
+    model_name: str = "char"
+
+    def encode(self, text):
+        return [ord(c) for c in text]
+
+    def decode(self, ids):
+        return "".join(map(chr, ids))
+
+
+class FakeLLM:
+    """Extracts one entity per contract, named after the upper case word of the chunk."""
+
+    tokenizer = CharTokenizer()
+
+    async def generate_answer(self, text, history=None, **extra):
+        name = re.findall(r"\b[A-Z]{4,}\b", text)[-1]
+        return f'("entity"<|>{name}<|>PARTY<|>{name} signs the contract)<|COMPLETE|>'
+
+    @staticmethod
+    def filter_think_tags(text):
+        return text
+
+
+def test_anonymous_incremental_builds_do_not_share_a_graph(tmp_path, monkeypatch):
+    for name, value in {
+        "working_dir": str(tmp_path), "incremental": True, "pipeline_merge": False,
+        "stream_extraction": False, "max_loop": 0, "summary_batch_size": 1, "kv_storage": "json",
+    }.items():
+        monkeypatch.setattr(settings.kg, name, value)
+    builder = KgBuilder(FakeLLM())
+
+    async def build(text):
+        nodes, _, namespace = await builder.build_graph(md_content=text)
+        return {node_id for node_id, _ in nodes}, namespace
+
+    nodes_a, namespace_a = asyncio.run(build("The seller is ALPHA."))
+    nodes_b, namespace_b = asyncio.run(build("The seller is BRAVO."))
+
+    assert namespace_a != namespace_b
+    assert nodes_a == {"ALPHA"}
+    assert nodes_b == {"BRAVO"}
+    assert not builder._contract_locks
+
+
+def test_incremental_builds_of_a_contract_share_its_graph(tmp_path, monkeypatch):
+    for name, value in {
+        "working_dir": str(tmp_path), "incremental": True, "pipeline_merge": False,
+        "stream_extraction": False, "max_loop": 0, "summary_batch_size": 1, "kv_storage": "sqlite",
+    }.items():
+        monkeypatch.setattr(settings.kg, name, value)
+    builder = KgBuilder(FakeLLM())
+
+    _, _, namespace_a = asyncio.run(builder.build_graph(md_content="The seller is ALPHA.", contract_id="c1"))
+    nodes, _, namespace_b = asyncio.run(builder.build_graph(md_content="The seller is BRAVO.", contract_id="c1"))
+
+    assert namespace_a == namespace_b
+    assert {node_id for node_id, _ in nodes} == {"BRAVO"}
+    assert not builder._contract_locks